@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+
+# Copyright 2016 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""CLI to execute many pipelines locally in one process.
+
+Usage: execute_batch.py [-h] [--workers WORKERS] [--report REPORT]
+                        manifest
+
+positional arguments:
+  manifest           YAML file listing the pipeline jobs to run
+
+optional arguments:
+  -h, --help         show this help message and exit
+  --workers WORKERS  Maximum number of jobs running concurrently
+  --report REPORT    File to write the per-job status and timing to, as JSON
+
+The manifest is a list of jobs. Each job names its pipeline and takes the
+same arguments as execute_pipeline.py:
+
+  - name: logging-python
+    pipeline_name: PythonGapicClientPipeline
+    config: ../googleapis/gapic/api/artman_logging.yaml:common|python,
+            ../googleapis/gapic/lang/common.yaml:default|python
+    pipeline_kwargs: {auto_merge: false}
+  - pipeline_name: AllLanguagesGapicClientPipeline
+    config: ../googleapis/gapic/api/artman_pubsub.yaml:common,
+            ../googleapis/gapic/lang/common.yaml:default
+    languages: java,python,go
+    engine: parallel
+
+The jobs share the process, so parsed config files and toolkit lookups are
+only paid once for the whole batch, and the toolkit tasks of all the jobs
+share a warm gradle daemon. The jobs run on threads, which
+relies on the tasks never changing the working directory of the process:
+commands which run in another directory get it as their cwd instead.
+"""
+
+import argparse
+import json
+import sys
+import time
+import traceback
+import yaml
+
+from multiprocessing.pool import ThreadPool
+
+import execute_pipeline
+
+# Job keys which are passed to execute_pipeline.py as flags.
+_JOB_FLAGS = ['config', 'reporoot', 'local_repo', 'engine', 'workers',
+              'languages', 'trace']
+
+
+def main(args):
+    flags = _CreateArgumentParser().parse_args(args=args)
+    with open(flags.manifest) as manifest_file:
+        jobs = yaml.load(manifest_file) or []
+
+    pool = ThreadPool(flags.workers)
+    try:
+        results = pool.map(_run_job, jobs)
+    finally:
+        pool.close()
+        pool.join()
+
+    _print_report(results)
+    if flags.report:
+        with open(flags.report, 'w') as report_file:
+            json.dump(results, report_file, indent=2)
+    if any(result['status'] != 'SUCCESS' for result in results):
+        sys.exit(1)
+
+
+def _CreateArgumentParser():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        'manifest',
+        type=str,
+        help='YAML file listing the pipeline jobs to run')
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=4,
+        help='Maximum number of jobs running concurrently')
+    parser.add_argument(
+        '--report',
+        type=str,
+        default=None,
+        help='File to write the per-job status and timing to, as JSON')
+    return parser
+
+
+def _job_args(job):
+    """Converts a manifest job into execute_pipeline.py arguments."""
+    if 'pipeline_name' not in job:
+        raise ValueError('pipeline_name must be provided')
+    args = ['--pipeline_kwargs', str(job.get('pipeline_kwargs', {}))]
+    for flag in _JOB_FLAGS:
+        if flag in job:
+            args += ['--' + flag, str(job[flag])]
+    return args + [job['pipeline_name']]
+
+
+def _run_job(job):
+    result = {'name': job.get('name', job.get('pipeline_name')),
+              'status': 'SUCCESS',
+              'error': None}
+    start = time.time()
+    try:
+        execute_pipeline.main(_job_args(job))
+    except Exception as e:
+        traceback.print_exc()
+        result['status'] = 'FAILURE'
+        result['error'] = '%s: %s' % (type(e).__name__, e)
+    result['elapsed_secs'] = round(time.time() - start, 3)
+    return result
+
+
+def _print_report(results):
+    print 'Batch summary:'
+    for result in results:
+        print '  %-40s %-8s %10.3fs' % (
+            result['name'], result['status'], result['elapsed_secs'])
+        if result['error']:
+            print '    ' + result['error']
+    failed = len([r for r in results if r['status'] != 'SUCCESS'])
+    print '%d jobs, %d failed' % (len(results), failed)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
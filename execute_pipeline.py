@@ -18,6 +18,9 @@
 
 Usage: execute_pipeline.py [-h] [--remote_mode]
                            [--pipeline_kwargs PIPELINE_KWARGS]
+                           [--engine {serial,parallel}] [--workers WORKERS]
+                           [--languages LANGUAGES] [--clear_gradle_cache]
+                           [--trace TRACE] [--output_root OUTPUT_ROOT]
                            pipeline_name
 
 positional arguments:
@@ -28,50 +31,76 @@ optional arguments:
   --remote_mode         When specified, the pipeline will be executed remotely
   --pipeline_kwargs PIPELINE_KWARGS
                         pipeline_kwargs string, e.g. "{'sleep_secs':3, 'id':1}"
+  --engine {serial,parallel}
+                        The taskflow engine used for local execution (the
+                        parallel engine only runs the language branches of
+                        AllLanguagesGapicClientPipeline concurrently)
+  --workers WORKERS     Maximum number of concurrent tasks of the parallel
+                        engine
+  --languages LANGUAGES
+                        Comma-delimited list of languages for the
+                        AllLanguagesGapicClientPipeline
+  --clear_gradle_cache  Clear the cached results of the toolkit gradle lookups
+  --trace TRACE         File to write the timing trace of a local run to
+  --output_root OUTPUT_ROOT
+                        Directory the results of a remote execution are
+                        extracted to (defaults to --reporoot)
 
 Example:
 
   python execute_pipeline.py --pipeline_kwargs "{'sleep_secs':4}" SamplePipeline
 
+  python execute_pipeline.py --config api.yaml:common,lang.yaml:default
+      --languages java,python,go --engine parallel
+      AllLanguagesGapicClientPipeline
+
 """
 
 import sys
 import argparse
 import ast
-import base64
 import os
-import tempfile
 import time
 import uuid
 import yaml
 
-from gcloud import storage
-from gcloud import logging
-from taskflow import engines, task, states
+from taskflow import engines
 from pipeline.pipelines import pipeline_factory
-from pipeline.utils import job_util, pipeline_util
+from pipeline.utils import blob_store, task_utils, timeline
 
 
 def main(args):
-    pipeline_name, pipeline_kwargs, env, local_repo = _parse_args(args)
+    (pipeline_name, pipeline_kwargs, env, local_repo, engine_name,
+     workers, clear_gradle_cache, trace_path,
+     output_root) = _parse_args(args)
+
+    if clear_gradle_cache:
+        task_utils.clear_gradle_task_cache()
 
     if local_repo:
-        pipeline_kwargs = _load_local_repo(local_repo, **pipeline_kwargs)
+        pipeline_kwargs = _load_local_repo(local_repo, bool(env),
+                                           **pipeline_kwargs)
 
     if env:
+        # The remote mode modules import gcloud and the taskflow job and
+        # persistence backends, which local runs do not need.
+        from pipeline.utils import job_util, pipeline_util
         # Execute pipeline task remotely based on the specified env param.
         pipeline = pipeline_factory.make_pipeline(
             pipeline_name, True, **pipeline_kwargs)
-        jb = job_util.post_remote_pipeline_job_and_wait(pipeline, env)
-        task_details, flow_detail = job_util.fetch_job_status(jb, env)
+        with job_util.JobSession(env) as session:
+            jb = session.post(pipeline)
+            session.wait(jb)
+            task_details, flow_detail = session.result(jb)
 
         for task_detail in task_details:
             if task_detail.name == 'BlobUploadTask' and task_detail.results:
-                bucket_name, path, _ = task_detail.results
-                pipeline_util.download_from_gcs(
-                    bucket_name,
-                    path,
-                    os.path.join(tempfile.gettempdir(), 'artman-remote'))
+                bucket_name, path = task_detail.results
+                written, unchanged = pipeline_util.download_results(
+                    bucket_name, path, output_root,
+                    pipeline_kwargs.get('result_store'))
+                print 'Extracted the results into %s: %d files written, ' \
+                      '%d unchanged' % (output_root, written, unchanged)
 
         if flow_detail.state != 'SUCCESS':
             # Print the remote log if the pipeline execution completes but not
@@ -79,12 +108,18 @@ def main(args):
             _print_log(pipeline_kwargs['pipeline_id'])
 
     else:
+        # The parallel engine runs the pipeline as a graph flow, so that
+        # independent tasks can run concurrently.
         pipeline = pipeline_factory.make_pipeline(
-            pipeline_name, False, **pipeline_kwargs)
-        # Hardcoded to run pipeline in serial engine, though not necessarily.
-        engine = engines.load(pipeline.flow, engine='serial',
-                              store=pipeline.kwargs)
-        engine.run()
+            pipeline_name, False, parallel=(engine_name == 'parallel'),
+            **pipeline_kwargs)
+        engine = engines.load(pipeline.flow, engine=engine_name,
+                              store=pipeline.kwargs, max_workers=workers)
+        if trace_path:
+            with timeline.TimelineListener(engine, trace_path, pipeline_name):
+                engine.run()
+        else:
+            engine.run()
 
 
 def _CreateArgumentParser():
@@ -110,11 +145,21 @@ def _CreateArgumentParser():
         default='..',
         help='Root directory where the input, '
             + 'output, and tool repositories live')
+    parser.add_argument(
+        '--output_root',
+        type=str,
+        default=None,
+        help='Directory the results of a remote execution are extracted to, '
+             'with the layout of --reporoot in a local execution. Defaults to '
+             '--reporoot.')
     parser.add_argument(
         '--local_repo',
         type=str,
         default=None,
-        help='Directory where local proto and gapic configs lives.')
+        help='Directory where local proto and gapic configs lives. Its '
+             'files are uploaded to the blob store named by the blob_store '
+             'pipeline kwarg, or ARTMAN_BLOB_STORE for remote executions '
+             'and ~/.cache/artman/blobs for local ones.')
     parser.add_argument(
         '--env',
         type=str,
@@ -122,16 +167,64 @@ def _CreateArgumentParser():
         help='Environment for remote execution (valid value is \'remote\', and '
              'is case-insensitive. Pipeline will be executed locally if this '
              'flag is not provided.')
+    parser.add_argument(
+        '--engine',
+        type=str,
+        default='serial',
+        choices=['serial', 'parallel'],
+        help='The taskflow engine used for local execution. The parallel '
+             'engine only runs the language branches of '
+             'AllLanguagesGapicClientPipeline concurrently: the tasks of a '
+             'single language pipeline still run one after the other.')
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=None,
+        help='Maximum number of tasks the parallel engine runs concurrently.')
+    parser.add_argument(
+        '--languages',
+        type=str,
+        default=None,
+        help='Comma-delimited list of languages for the '
+             'AllLanguagesGapicClientPipeline, e.g. java,python,go. The '
+             'config sections named after each language are loaded on top of '
+             'the sections given by --config.')
+    parser.add_argument(
+        '--clear_gradle_cache',
+        action='store_true',
+        help='Clear the cached results of the toolkit gradle lookups (e.g. '
+             'the protobuf and gRPC plugin paths) before running.')
+    parser.add_argument(
+        '--trace',
+        type=str,
+        default=None,
+        help='File to write the timing trace of a local run to, in the '
+             'Chrome trace format (see chrome://tracing).')
     return parser
 
 
+# Parsed config files keyed by path and modification time, shared by all the
+# pipelines run by this process (see execute_batch.py).
+_config_file_cache = {}
+
+
+def _read_config_file(config_path):
+    key = (os.path.abspath(config_path), os.path.getmtime(config_path))
+    if key not in _config_file_cache:
+        with open(config_path) as config_file:
+            _config_file_cache[key] = yaml.load(config_file)
+    return _config_file_cache[key]
+
+
 def _load_config_spec(config_spec, repl_vars):
     (config_path, config_sections) = config_spec.strip().split(':')
     config_sections = config_sections.split('|')
     data = {}
-    with open(config_path) as config_file:
-        all_config_data = yaml.load(config_file)
+    all_config_data = _read_config_file(config_path)
     for section in config_sections:
+        if section not in all_config_data:
+            raise ValueError('Config %s has no section %s' % (config_path,
+                                                              section))
         data.update(all_config_data[section])
 
     repl_vars['THISDIR'] = os.path.dirname(config_path)
@@ -140,6 +233,24 @@ def _load_config_spec(config_spec, repl_vars):
     return data
 
 
+def _load_language_configs(config, languages, shared_args, repl_vars):
+    """Loads the config sections of each language.
+
+    Returns a dict mapping each language to the args which differ from the
+    shared args, as expected by AllLanguagesGapicClientPipeline.
+    """
+    language_kwargs = {}
+    for language in languages:
+        language_args = {}
+        for config_spec in (config.split(',') if config else []):
+            language_args.update(
+                _load_config_spec(config_spec + '|' + language, repl_vars))
+        language_kwargs[language] = dict(
+            (k, v) for (k, v) in language_args.iteritems()
+            if shared_args.get(k) != v)
+    return language_kwargs
+
+
 def _parse_args(args):
     parser = _CreateArgumentParser()
     flags = parser.parse_args(args=args)
@@ -165,8 +276,19 @@ def _parse_args(args):
           config_args = _load_config_spec(config_spec, repl_vars)
           pipeline_args.update(config_args)
 
+    if flags.languages:
+        pipeline_args['language_kwargs'] = _load_language_configs(
+            flags.config, flags.languages.split(','), pipeline_args,
+            repl_vars)
+
     cmd_args = ast.literal_eval(flags.pipeline_kwargs)
     pipeline_args.update(cmd_args)
+    if pipeline_args.get('resource_report'):
+        # Tells the commands of this pipeline apart from those of the other
+        # pipelines writing the same report.
+        pipeline_args.setdefault(
+            'resource_report_id',
+            pipeline_args.get('pipeline_id') or str(uuid.uuid4()))
     print 'Final args:'
     for (k, v) in pipeline_args.iteritems():
         print ' ', k, ':', v
@@ -174,7 +296,12 @@ def _parse_args(args):
     return (flags.pipeline_name,
             pipeline_args,
             flags.env.lower() if flags.env else None,
-            flags.local_repo)
+            flags.local_repo,
+            flags.engine,
+            flags.workers,
+            flags.clear_gradle_cache,
+            flags.trace,
+            flags.output_root or flags.reporoot)
 
 
 def _var_replace_config_data(data, repl_vars):
@@ -192,35 +319,21 @@ def _var_replace(in_str, repl_vars):
     return new_str
 
 
-def _load_local_repo(private_repo_root, **pipeline_kwargs):
-    files_dict = {}
-    for root, dirs, files in os.walk(private_repo_root):
-        for fname in files:
-            path = os.path.join(root, fname)
-            rel_path = os.path.relpath(path, private_repo_root)
-            with open(path, 'r') as f:
-                files_dict[_normalize_path(rel_path)] = base64.b64encode(f.read())
+def _load_local_repo(private_repo_root, remote_mode, **pipeline_kwargs):
+    """Uploads the files of private_repo_root to the blob store, skipping the
+    contents already stored, and passes their manifest to the pipeline.
 
-    pipeline_kwargs['files_dict'] = files_dict
+    Unless the blob_store kwarg names one, the store is DEFAULT_STORE for
+    remote runs, and the local LOCAL_STORE directory for local runs.
+    """
+    store_url = pipeline_kwargs.setdefault(
+        'blob_store',
+        blob_store.DEFAULT_STORE if remote_mode else blob_store.LOCAL_STORE)
+    pipeline_kwargs['files_manifest'] = blob_store.upload_tree(
+        blob_store.get_store(store_url), private_repo_root)
     return pipeline_kwargs
 
 
-def _normalize_path(path):
-    """Normalize the file path into one using slash as the seperator."""
-    parts = []
-    while True:
-        head, tail = os.path.split(path)
-        if head == path:
-            assert not tail
-            if path:
-                parts.append(head)
-            break
-        parts.append(tail)
-        path = head
-    parts.reverse()
-    return "/".join(parts)
-
-
 def _print_log(pipeline_id):
   # Fetch the cloud logging entry if the exection fails. Wait for 30 secs,
   # because it takes a while for the logging to become available.
@@ -228,6 +341,7 @@ def _print_log(pipeline_id):
         'fetching the log for remote pipeline execution.')
   time.sleep(30)
   try:
+      from gcloud import logging
       client = logging.Client()
       logger = client.logger(pipeline_id)
       entries, token = logger.list_entries()
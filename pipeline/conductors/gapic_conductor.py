@@ -17,32 +17,69 @@
 
 import contextlib
 import os
+import shutil
 
-from taskflow.conductors import backends as conductor_backends
+from taskflow.conductors.backends import impl_blocking
+from taskflow.conductors.backends import impl_nonblocking
 
+from pipeline.conductors import warmup
+from pipeline.tasks import prerequesites
 from pipeline.utils import backend_helper
+from pipeline.utils import timeline
+
+# Directory holding the workspace of every job, /tmp/artman/<pipeline id>, as
+# set by execute_pipeline.py for remote executions.
+WORKSPACE_ROOT = '/tmp/artman'
 
 
 # TODO(cbao): This is now a common conductor which will execute all pipeline
 # types. Turn this into an abstract class, and let its subclasses defines the
-# pipelines types they can execute. Task requirements needed by pipelines shall
-# be installed before conductor starts claiming jobs.
-def run(jobboard_name):
+# pipelines types they can execute.
+def run(jobboard_name, trace_dir=None,
+        max_jobs=1, executor_factory=None, warm_up=True,
+        install_requirements=False, pipeline_names=None,
+        strict_requirements=False):
+    """Claims and runs the jobs posted to jobboard_name, forever.
+
+    Unless warm_up is False, the requirements of the pipelines named
+    pipeline_names, the ones posted to jobboard_name (all the registered
+    pipelines by default), are checked (and installed if
+    install_requirements is True), and the toolkit and googleapis caches
+    primed, before the first job is claimed (see
+    pipeline.conductors.warmup). The requirements still missing are
+    reported as a warning, unless strict_requirements is True, in which case
+    a PrerequesiteError is raised and no job claimed.
+
+    With max_jobs greater than 1, or an executor_factory, up to max_jobs
+    jobs run concurrently on the futurist executor returned by
+    executor_factory() (a pool of max_jobs threads by default), and no job
+    is claimed while max_jobs are running. Every job works in its own
+    workspace under WORKSPACE_ROOT, which is removed once the job is
+    consumed or abandoned.
+    """
     conductor_id = os.getpid()
     print('Starting GAPIC conductor with pid: %s' % conductor_id)
+    if warm_up:
+        missing = warmup.warm_up(install=install_requirements,
+                                 pipeline_names=pipeline_names)
+        if missing and strict_requirements:
+            raise prerequesites.PrerequesiteError(
+                ', '.join(missing),
+                'Install them, e.g. with --install_requirements, or limit '
+                'the check to the pipelines served with --pipelines.')
     my_name = 'conductor-%s' % conductor_id
     persist_backend = backend_helper.default_persistence_backend()
     with contextlib.closing(persist_backend):
         with contextlib.closing(persist_backend.get_connection()) as conn:
             conn.upgrade()
-        jobboard = backend_helper.get_jobboard(my_name, jobboard_name)
+        jobboard = backend_helper.get_jobboard(
+            my_name, jobboard_name, persistence=persist_backend)
         jobboard.connect()
         with contextlib.closing(jobboard):
-            cond = conductor_backends.fetch('blocking',
-                                            my_name,
-                                            jobboard,
-                                            persistence=persist_backend,
-                                            engine='serial')
+            cond = _make_conductor(my_name, jobboard, persist_backend,
+                                   max_jobs, executor_factory, trace_dir)
+            cond.notifier.register('job_consumed', _cleanup_workspace)
+            cond.notifier.register('job_abandoned', _cleanup_workspace)
             # Run forever, and kill -9 or ctrl-c me...
             try:
                 print('Conductor %s is running' % my_name)
@@ -51,3 +88,72 @@ def run(jobboard_name):
                 print('Conductor %s is stopping' % my_name)
                 cond.stop()
                 cond.wait()
+
+
+def _make_conductor(name, jobboard, persist_backend, max_jobs,
+                    executor_factory, trace_dir=None):
+    if max_jobs == 1 and executor_factory is None:
+        cond = _BlockingConductor(name,
+                                  jobboard,
+                                  persistence=persist_backend,
+                                  engine='serial')
+    else:
+        # The nonblocking conductor only claims a job when fewer than
+        # max_jobs jobs are running.
+        cond = _NonBlockingConductor(name,
+                                     jobboard,
+                                     persistence=persist_backend,
+                                     engine='serial',
+                                     max_simultaneous_jobs=max_jobs,
+                                     executor_factory=executor_factory)
+    cond.trace_dir = trace_dir
+    return cond
+
+
+def _job_workspace(job):
+    """Returns the workspace of job, its repo_root under WORKSPACE_ROOT, or
+    None if it has none."""
+    for flow_detail in job.book or []:
+        kwargs = (flow_detail.meta or {}).get('factory', {}).get('kwargs', {})
+        repo_root = os.path.abspath(kwargs.get('repo_root') or '/')
+        if repo_root.startswith(WORKSPACE_ROOT + os.sep):
+            return repo_root
+    return None
+
+
+def _cleanup_workspace(event, details):
+    """Removes the workspace of a finished job, which its CleanupTempDirsTask
+    does not remove when the job fails."""
+    workspace = _job_workspace(details['job'])
+    if workspace:
+        shutil.rmtree(workspace, ignore_errors=True)
+
+
+class _TracingConductorMixin(object):
+    """Writes the timing trace of every job run by the conductor to
+    trace_dir/<job uuid>.json, when trace_dir is set.
+
+    The conductor registers the listeners of a job around its run, and
+    deregisters them however the job ends.
+    """
+
+    trace_dir = None
+
+    def _listeners_from_job(self, job, engine):
+        listeners = super(_TracingConductorMixin, self)._listeners_from_job(
+            job, engine)
+        if self.trace_dir:
+            listeners.append(timeline.TimelineListener(
+                engine, os.path.join(self.trace_dir, job.uuid + '.json'),
+                job.name))
+        return listeners
+
+
+class _BlockingConductor(_TracingConductorMixin,
+                         impl_blocking.BlockingConductor):
+    pass
+
+
+class _NonBlockingConductor(_TracingConductorMixin,
+                            impl_nonblocking.NonBlockingConductor):
+    pass
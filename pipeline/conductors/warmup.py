@@ -0,0 +1,142 @@
+# Copyright 2016 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Warm-up of a conductor, run before it claims jobs.
+
+The warm-up checks the task requirements of the pipelines served by the
+conductor (every registered pipeline by default), optionally installing the
+missing ones, and primes the caches which the
+first job of a fresh host would otherwise fill: the gradle lookups of the
+toolkit, the gradle daemon of the toolkit tasks, and the googleapis
+snapshot.
+"""
+
+import os
+import subprocess
+import traceback
+
+from taskflow.flow import Flow
+
+from pipeline.pipelines import pipeline_factory
+from pipeline.utils import googleapis_cache
+from pipeline.utils import path_resolver
+from pipeline.utils import task_utils
+
+# The gradle lookups of the tasks, whose results are cached by task_utils.
+_GRADLE_LOOKUPS = ['showProtobufPath', 'showGrpcJavaPluginPath',
+                   'showJavaFormatterPath']
+
+
+def warm_up(install=False, toolkit_path=None, googleapis_cache_dir=None,
+            pipeline_names=None):
+    """Checks the requirements of the pipelines named pipeline_names (all
+    the registered pipelines by default), installing the missing ones if
+    install is True, and primes the toolkit and googleapis caches.
+
+    toolkit_path and googleapis_cache_dir default to the TOOLKIT_HOME and
+    ARTMAN_GOOGLEAPIS_CACHE environment variables, and the corresponding
+    caches are not primed when they are not set. Returns the names of the
+    requirements which are still missing.
+    """
+    missing = check_requirements(install, pipeline_names)
+    if missing:
+        print 'WARNING: missing task requirements: %s' % ', '.join(missing)
+    toolkit_path = toolkit_path or os.environ.get('TOOLKIT_HOME')
+    if toolkit_path:
+        _prime(prime_toolkit, toolkit_path)
+    googleapis_cache_dir = (googleapis_cache_dir or
+                            os.environ.get('ARTMAN_GOOGLEAPIS_CACHE'))
+    if googleapis_cache_dir:
+        _prime(googleapis_cache.get_snapshot, googleapis_cache_dir)
+    return missing
+
+
+def pipeline_requirements(pipeline_names=None):
+    """Returns the requirement classes of the tasks of the pipelines named
+    pipeline_names (all the registered pipelines by default), sorted by name.
+
+    The flow of every pipeline is built as the conductor runs it, in remote
+    mode, with placeholder values for its required kwargs, so the tasks of
+    the branches enabled by optional kwargs (e.g. publish_env) are not
+    included.
+    """
+    if pipeline_names is None:
+        pipeline_names = [name for (name, _)
+                          in pipeline_factory.list_pipelines()]
+    requirements = set()
+    for pipeline_name in pipeline_names:
+        pipeline_class = pipeline_factory.get_pipeline_class(pipeline_name)
+        pipeline = pipeline_class(
+            remote_mode=True,
+            **dict((arg, '') for arg in pipeline_class.required_kwargs))
+        for task in _flow_tasks(pipeline.flow):
+            try:
+                requirements.update(task.validate())
+            except NotImplementedError:
+                # The tasks which do not implement validate have no
+                # requirements.
+                pass
+    return sorted(requirements, key=lambda r: r.__name__)
+
+
+def check_requirements(install=False, pipeline_names=None):
+    """Returns the names of the requirements of the pipelines named
+    pipeline_names (all by default) which are not installed, after installing
+    them if install is True."""
+    requirements = pipeline_requirements(pipeline_names)
+    # The executables of all the requirements are resolved in one batch.
+    locations = path_resolver.which_all(sorted(set(
+        name for requirement in requirements
+        for name in requirement.require())))
+    missing = []
+    for requirement in requirements:
+        if requirement.is_installed(locations):
+            continue
+        if install:
+            print 'Installing %s' % requirement.__name__
+            try:
+                requirement.install()
+            except Exception:
+                traceback.print_exc()
+            if requirement.is_installed():
+                continue
+        missing.append(requirement.__name__)
+    return missing
+
+
+def prime_toolkit(toolkit_path):
+    """Runs the gradle lookups of the tasks, so that their results are
+    cached, and starts the gradle daemon which runs the toolkit tasks."""
+    for task_name in _GRADLE_LOOKUPS:
+        task_utils.run_gradle_task(task_name, toolkit_path)
+    subprocess.check_output(
+        task_utils.gradle_command(toolkit_path, 'help', '-q'),
+        stderr=subprocess.STDOUT)
+
+
+def _prime(func, *args):
+    # A cache which cannot be primed is filled by the first job instead.
+    try:
+        func(*args)
+    except Exception:
+        traceback.print_exc()
+
+
+def _flow_tasks(flow):
+    for item in flow:
+        if isinstance(item, Flow):
+            for task in _flow_tasks(item):
+                yield task
+        else:
+            yield item
@@ -16,6 +16,7 @@
 """Base class for code generation pipelines."""
 
 import os
+import tempfile
 import time
 import uuid
 
@@ -28,18 +29,26 @@ from taskflow.patterns import linear_flow
 # TODO(garrettjones) fix required to be relative to pipeline.
 # Ideally this should just be computed dynamically based
 # on the pipeline's tasks.
+CODEGEN_REQUIRED = ['src_proto_path', 'import_proto_path', 'toolkit_path',
+                    'output_dir', 'api_name']
+
+
 def _validate_codegen_kwargs(extra_args, **kwargs):
-    required = ['src_proto_path', 'import_proto_path', 'toolkit_path',
-                'output_dir', 'language', 'api_name']
-    pipeline_util.validate_exists(required + extra_args, **kwargs)
+    # The language is set by the language specific pipelines.
+    pipeline_util.validate_exists(CODEGEN_REQUIRED + ['language'] + extra_args,
+                                  **kwargs)
 
 
 def _load_remote_parameters(kwargs):
     tmp_id = str(uuid.uuid4())
     filename = tmp_id + '.tar.gz'
-    kwargs['tarfile'] = filename
+    # The archive is written in the workspace of the job, which is removed
+    # with it, rather than in the working directory of the conductor.
+    archive = os.path.join(kwargs.get('repo_root') or tempfile.gettempdir(),
+                           filename)
+    kwargs['tarfile'] = archive
     kwargs['bucket_name'] = 'pipeline'
-    kwargs['src_path'] = filename
+    kwargs['src_path'] = archive
     kwargs['dest_path'] = time.strftime('%Y/%m/%d') + '/' + filename
     return kwargs
 
@@ -48,6 +57,8 @@ class CodeGenerationPipelineBase(pipeline_base.PipelineBase):
     """ Base class for GAPIC, gRPC, and Core code generation pipelines, and
         for GAPIC config generation pipeline"""
 
+    required_kwargs = CODEGEN_REQUIRED
+
     def __init__(self, remote_mode=False, **kwargs):
         if 'TOOLKIT_HOME' in os.environ:
             kwargs['toolkit_path'] = os.environ['TOOLKIT_HOME']
@@ -71,4 +82,6 @@ class CodeGenerationPipelineBase(pipeline_base.PipelineBase):
                                          inject=kwargs)]
 
     def validate_kwargs(self, **kwargs):
-        _validate_codegen_kwargs([], **kwargs)
+        extra_args = [arg for arg in self.required_kwargs
+                      if arg not in CODEGEN_REQUIRED]
+        _validate_codegen_kwargs(extra_args, **kwargs)
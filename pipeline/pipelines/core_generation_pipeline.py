@@ -45,6 +45,9 @@ class GoCoreProtoPipeline(code_generation_pipeline.CodeGenerationPipelineBase):
     set up.
     """
 
+    required_kwargs = code_generation_pipeline.CODEGEN_REQUIRED + [
+        'gapic_api_yaml', 'final_repo_dir']
+
     def __init__(self, **kwargs):
         kwargs['language'] = 'go'
         super(GoCoreProtoPipeline, self).__init__(**kwargs)
@@ -60,11 +63,6 @@ class GoCoreProtoPipeline(code_generation_pipeline.CodeGenerationPipelineBase):
                                                  inject=kwargs))
         return flow
 
-    def validate_kwargs(self, **kwargs):
-        code_generation_pipeline._validate_codegen_kwargs(
-            ['gapic_api_yaml', 'final_repo_dir'],
-            **kwargs)
-
 
 class CSharpCorePipeline(code_generation_pipeline.CodeGenerationPipelineBase):
 
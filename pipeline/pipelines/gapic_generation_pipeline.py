@@ -14,9 +14,12 @@
 
 """Pipelines that run GAPIC"""
 
+import os
+
 from pipeline.pipelines import code_generation_pipeline as code_gen
 from pipeline.tasks import gapic_tasks, format_tasks, protoc_tasks
 from pipeline.tasks import package_tasks
+from taskflow.patterns import linear_flow, unordered_flow
 
 
 # kwargs required by GAPIC code gen
@@ -43,27 +46,28 @@ class GapicConfigPipeline(code_gen.CodeGenerationPipelineBase):
 
 class GapicClientPipelineBase(code_gen.CodeGenerationPipelineBase):
 
+    required_kwargs = code_gen.CODEGEN_REQUIRED + _VGEN_REQUIRED
+
     def __init__(self, **kwargs):
         super(GapicClientPipelineBase, self).__init__(**kwargs)
 
-    def get_gapic_codegen_tasks(self, **kwargs):
-        return [protoc_tasks.ProtoDescGenTask('ProtoDesc', inject=kwargs),
-                gapic_tasks.GapicCodeGenTask('GapicCodegen', inject=kwargs),
+    @classmethod
+    def get_gapic_codegen_tasks(cls, **kwargs):
+        return [gapic_tasks.GapicCodeGenTask('GapicCodegen', inject=kwargs),
                 format_tasks.make_format_task(
                     kwargs['language'], 'GapicFormat', kwargs)]
 
-    def get_gapic_package_tasks(self, **kwargs):
+    @classmethod
+    def get_gapic_package_tasks(cls, **kwargs):
         return [gapic_tasks.GapicMergeTask('GapicMerge', inject=kwargs)]
 
     def do_build_flow(self, **kwargs):
         flow = super(GapicClientPipelineBase, self).do_build_flow(**kwargs)
+        flow.add(protoc_tasks.ProtoDescGenTask('ProtoDesc', inject=kwargs))
         flow.add(*self.get_gapic_codegen_tasks(**kwargs))
         flow.add(*self.get_gapic_package_tasks(**kwargs))
         return flow
 
-    def validate_kwargs(self, **kwargs):
-        code_gen._validate_codegen_kwargs(_VGEN_REQUIRED, **kwargs)
-
 
 class PythonGapicClientPipeline(GapicClientPipelineBase):
 
@@ -71,7 +75,8 @@ class PythonGapicClientPipeline(GapicClientPipelineBase):
         kwargs['language'] = 'python'
         super(PythonGapicClientPipeline, self).__init__(**kwargs)
 
-    def get_gapic_package_tasks(self, **kwargs):
+    @classmethod
+    def get_gapic_package_tasks(cls, **kwargs):
         return [gapic_tasks.GapicCopyTask('GapicCopy', inject=kwargs),
                 gapic_tasks.GapicPackmanTask('GapicPackman', inject=kwargs)]
 
@@ -82,7 +87,8 @@ class RubyGapicClientPipeline(GapicClientPipelineBase):
         kwargs['language'] = 'ruby'
         super(RubyGapicClientPipeline, self).__init__(**kwargs)
 
-    def get_gapic_package_tasks(self, **kwargs):
+    @classmethod
+    def get_gapic_package_tasks(cls, **kwargs):
         return [gapic_tasks.GapicMergeTask('GapicMerge', inject=kwargs),
                 gapic_tasks.GapicPackmanTask('GapicPackman', inject=kwargs),
                 package_tasks.GapicPackageDirTask('PackageDir',
@@ -97,7 +103,8 @@ class NodeJSGapicClientPipeline(GapicClientPipelineBase):
         kwargs['language'] = 'nodejs'
         super(NodeJSGapicClientPipeline, self).__init__(**kwargs)
 
-    def get_gapic_package_tasks(self, **kwargs):
+    @classmethod
+    def get_gapic_package_tasks(cls, **kwargs):
         return [gapic_tasks.GapicMergeTask('GapicMerge', inject=kwargs),
                 gapic_tasks.GapicPackmanTask('GapicPackman', inject=kwargs)]
 
@@ -122,7 +129,8 @@ class CSharpGapicClientPipeline(GapicClientPipelineBase):
         kwargs['language'] = 'csharp'
         super(CSharpGapicClientPipeline, self).__init__(**kwargs)
 
-    def get_gapic_package_tasks(self, **kwargs):
+    @classmethod
+    def get_gapic_package_tasks(cls, **kwargs):
         return []
 
 
@@ -131,3 +139,86 @@ class PhpGapicClientPipeline(GapicClientPipelineBase):
     def __init__(self, **kwargs):
         kwargs['language'] = 'php'
         super(PhpGapicClientPipeline, self).__init__(**kwargs)
+
+
+_LANGUAGE_PIPELINES = {
+    'python': PythonGapicClientPipeline,
+    'ruby': RubyGapicClientPipeline,
+    'nodejs': NodeJSGapicClientPipeline,
+    'java': JavaGapicClientPipeline,
+    'go': GoGapicClientPipeline,
+    'csharp': CSharpGapicClientPipeline,
+    'php': PhpGapicClientPipeline,
+}
+
+
+class AllLanguagesGapicClientPipeline(code_gen.CodeGenerationPipelineBase):
+    """Generates the GAPIC clients of several languages in one flow.
+
+    The googleapis directory and the descriptor set are prepared once, then
+    every language runs its codegen, format and package tasks in a separate
+    branch which writes to its own subdirectory of output_dir. The branches
+    are independent of each other, so the parallel engine runs them
+    concurrently.
+
+    The languages are given by language_kwargs, a dict mapping each language
+    to the kwargs overriding the shared ones for that language (e.g.
+    gapic_language_yaml and final_repo_dir). Each language must have its own
+    final_repo_dir.
+    """
+
+    required_kwargs = code_gen.CODEGEN_REQUIRED + ['language_kwargs']
+
+    def __init__(self, **kwargs):
+        kwargs['language'] = ''
+        super(AllLanguagesGapicClientPipeline, self).__init__(**kwargs)
+
+    def do_build_flow(self, **kwargs):
+        flow = super(AllLanguagesGapicClientPipeline, self).do_build_flow(
+            **kwargs)
+        flow.add(protoc_tasks.ProtoDescGenTask('ProtoDesc', inject=kwargs))
+        branches = unordered_flow.Flow('GapicLanguageBranches')
+        for language in sorted(kwargs['language_kwargs']):
+            branches.add(_make_language_branch(language, kwargs))
+        flow.add(branches)
+        return flow
+
+    def validate_kwargs(self, **kwargs):
+        super(AllLanguagesGapicClientPipeline, self).validate_kwargs(**kwargs)
+        # The languages writing each final repo dir. The branches run
+        # concurrently, so they must not merge into the same directory.
+        final_repo_languages = {}
+        for language in sorted(kwargs['language_kwargs']):
+            if language not in _LANGUAGE_PIPELINES:
+                raise ValueError('Unsupported GAPIC language: ' + language)
+            branch_kwargs = _language_branch_kwargs(language, kwargs)
+            code_gen._validate_codegen_kwargs(_VGEN_REQUIRED, **branch_kwargs)
+            final_repo_dir = os.path.normpath(branch_kwargs['final_repo_dir'])
+            if final_repo_dir in final_repo_languages:
+                raise ValueError(
+                    'Languages %s and %s share the final_repo_dir %s' % (
+                        final_repo_languages[final_repo_dir], language,
+                        final_repo_dir))
+            final_repo_languages[final_repo_dir] = language
+
+
+def _language_branch_kwargs(language, kwargs):
+    branch_kwargs = dict(kwargs)
+    del branch_kwargs['language_kwargs']
+    branch_kwargs['language'] = language
+    branch_kwargs['output_dir'] = os.path.join(kwargs['output_dir'], language)
+    branch_kwargs.update(kwargs['language_kwargs'][language])
+    return branch_kwargs
+
+
+def _make_language_branch(language, kwargs):
+    pipeline_cls = _LANGUAGE_PIPELINES[language]
+    branch_kwargs = _language_branch_kwargs(language, kwargs)
+    tasks = (pipeline_cls.get_gapic_codegen_tasks(**branch_kwargs) +
+             pipeline_cls.get_gapic_package_tasks(**branch_kwargs))
+    # Task names must be unique within a flow.
+    for task in tasks:
+        task.name = '%s-%s' % (task.name, language)
+    branch = linear_flow.Flow('GapicBranch-' + language)
+    branch.add(*tasks)
+    return branch
@@ -87,6 +87,9 @@ class GoGrpcClientPipeline(GrpcClientPipeline):
     which is taken care of by GoLangUpdateProtoImportsTask.
     """
 
+    required_kwargs = code_generation_pipeline.CODEGEN_REQUIRED + [
+        'gapic_api_yaml', 'final_repo_dir']
+
     def __init__(self, **kwargs):
         kwargs['language'] = 'go'
         super(GoGrpcClientPipeline, self).__init__(**kwargs)
@@ -100,11 +103,6 @@ class GoGrpcClientPipeline(GrpcClientPipeline):
             protoc_tasks.GoLangUpdateImportsTask('UpdateImports',
                                                  inject=kwargs)]
 
-    def validate_kwargs(self, **kwargs):
-        code_generation_pipeline._validate_codegen_kwargs(
-            ['gapic_api_yaml', 'final_repo_dir'],
-            **kwargs)
-
 
 class CSharpGrpcClientPipeline(GrpcClientPipeline):
 
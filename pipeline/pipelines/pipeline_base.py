@@ -15,17 +15,43 @@
 """Base class for pipeline."""
 
 from taskflow.flow import Flow
+from taskflow.patterns import graph_flow
 from taskflow.patterns import linear_flow
 
+# Pipeline classes keyed by class name, registered when they are defined.
+PIPELINES = {}
+
+
+class _PipelineMeta(type):
+
+    def __init__(cls, name, bases, attrs):
+        super(_PipelineMeta, cls).__init__(name, bases, attrs)
+        if any(isinstance(base, _PipelineMeta) for base in bases):
+            PIPELINES[name] = cls
+
 
 class PipelineBase(object):
     """Base class of pipeline.
 
-    Subclasses must implement validate_kwargs and do_build_flow methods.
+    Subclasses must implement the do_build_flow method, and list the kwargs
+    they require in required_kwargs, or override validate_kwargs.
+
+    When `parallel` is True, the flow built by the subclass is converted into
+    a graph flow so that a parallel engine can run independent tasks
+    concurrently. See _to_graph_flow for how the dependencies are derived:
+    in practice only the branches of an unordered flow, e.g. the language
+    branches of AllLanguagesGapicClientPipeline, run concurrently, as almost
+    every task depends on the files written before it.
     """
 
-    def __init__(self, remote_mode=False, **kwargs):
+    __metaclass__ = _PipelineMeta
+
+    # The kwargs which must be provided to build the pipeline.
+    required_kwargs = []
+
+    def __init__(self, remote_mode=False, parallel=False, **kwargs):
         self._kwargs = kwargs
+        self._parallel = parallel
         self._flow = self.build_flow(remote_mode, **kwargs)
 
     def build_flow(self, remote_mode=False, **kwargs):
@@ -40,13 +66,15 @@ class PipelineBase(object):
         # Do some post modification here.
         if remote_mode:
             flow.add(*self.additional_tasks_for_remote_execution(**kwargs))
+        if self._parallel:
+            flow = _to_graph_flow(flow)
         return flow
 
     def validate_kwargs(self, **kwargs):
-        """Abstract method, subclass must implement this method to validate
-        kwargs.
-        """
-        raise NotImplementedError('Subclass must implement abstract method')
+        """Validates kwargs, checking that required_kwargs are provided."""
+        for arg in self.required_kwargs:
+            if arg not in kwargs:
+                raise ValueError('{0} must be provided'.format(arg))
 
     def do_build_flow(self, **kwargs):
         """Abstract method, subclass must implment this method and return a task
@@ -71,12 +99,43 @@ class PipelineBase(object):
     def kwargs(self):
         return self._kwargs
 
+    @property
+    def parallel(self):
+        return self._parallel
+
+
+def _to_graph_flow(flow):
+    """Converts a linear flow into an equivalent graph flow.
+
+    Graph flows link tasks through the symbols they require and provide, but
+    most pipeline tasks also depend on files written by the tasks before them.
+    Therefore every task stays ordered after the previous ordered task, except
+    tasks whose `ordered` attribute is False: those only wait for the first
+    item of the flow (which prepares the workspace) and for the providers of
+    their requirements.
+
+    The requires and provides of the tasks are not enough to derive more
+    concurrency, since they do not declare the files the tasks read and
+    write. Flows nested in the linear flow, e.g. unordered flows of branches,
+    are kept as they are, so that their items run concurrently.
+    """
+    graph = graph_flow.Flow(flow.name)
+    items = list(flow)
+    graph.add(*items)
+    previous = None
+    for item in items:
+        if previous is not None:
+            if getattr(item, 'ordered', True):
+                graph.link(previous, item)
+            else:
+                graph.link(items[0], item)
+        if getattr(item, 'ordered', True):
+            previous = item
+    return graph
+
 
 class EmptyPipeline(PipelineBase):
 
     def do_build_flow(self, **kwargs):
         flow = linear_flow.Flow('empty-pipeline')
         return flow
-
-    def validate_kwargs(self, **kwargs):
-        pass
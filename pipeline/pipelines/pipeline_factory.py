@@ -15,12 +15,40 @@
 kwargs."""
 
 
+import importlib
+
 from pipeline.pipelines import pipeline_base
-# These are required to list the subclasses of pipeline_base
-from pipeline.pipelines import sample_pipeline  # noqa
-from pipeline.pipelines import gapic_generation_pipeline  # noqa
-from pipeline.pipelines import grpc_generation_pipeline  # noqa
-from pipeline.pipelines import core_generation_pipeline  # noqa
+
+# The modules defining the pipelines, keyed by pipeline name. A pipeline
+# module is only imported when one of its pipelines is made, to keep the
+# startup of the CLIs fast.
+_PIPELINE_MODULES = {
+    'EmptyPipeline': 'pipeline.pipelines.pipeline_base',
+    'SamplePipeline': 'pipeline.pipelines.sample_pipeline',
+    'GapicConfigPipeline': 'pipeline.pipelines.gapic_generation_pipeline',
+    'PythonGapicClientPipeline':
+        'pipeline.pipelines.gapic_generation_pipeline',
+    'RubyGapicClientPipeline': 'pipeline.pipelines.gapic_generation_pipeline',
+    'NodeJSGapicClientPipeline':
+        'pipeline.pipelines.gapic_generation_pipeline',
+    'JavaGapicClientPipeline': 'pipeline.pipelines.gapic_generation_pipeline',
+    'GoGapicClientPipeline': 'pipeline.pipelines.gapic_generation_pipeline',
+    'CSharpGapicClientPipeline':
+        'pipeline.pipelines.gapic_generation_pipeline',
+    'PhpGapicClientPipeline': 'pipeline.pipelines.gapic_generation_pipeline',
+    'AllLanguagesGapicClientPipeline':
+        'pipeline.pipelines.gapic_generation_pipeline',
+    'PythonGrpcClientPipeline': 'pipeline.pipelines.grpc_generation_pipeline',
+    'RubyGrpcClientPipeline': 'pipeline.pipelines.grpc_generation_pipeline',
+    'NodeJSGrpcClientPipeline': 'pipeline.pipelines.grpc_generation_pipeline',
+    'JavaGrpcClientPipeline': 'pipeline.pipelines.grpc_generation_pipeline',
+    'GoGrpcClientPipeline': 'pipeline.pipelines.grpc_generation_pipeline',
+    'CSharpGrpcClientPipeline': 'pipeline.pipelines.grpc_generation_pipeline',
+    'PhpGrpcClientPipeline': 'pipeline.pipelines.grpc_generation_pipeline',
+    'JavaCoreProtoPipeline': 'pipeline.pipelines.core_generation_pipeline',
+    'GoCoreProtoPipeline': 'pipeline.pipelines.core_generation_pipeline',
+    'CSharpCorePipeline': 'pipeline.pipelines.core_generation_pipeline',
+}
 
 
 def make_pipeline_flow(pipeline_name, remote_mode=False, **kwargs):
@@ -41,19 +69,29 @@ def make_pipeline_flow(pipeline_name, remote_mode=False, **kwargs):
 
 
 def make_pipeline(pipeline_name, remote_mode=False, **kwargs):
-    for cls in _rec_subclasses(pipeline_base.PipelineBase):
-        if cls.__name__ == pipeline_name:
-            print("Create %s instance." % pipeline_name)
-            return cls(remote_mode=remote_mode, **kwargs)
-    raise ValueError("Invalid pipeline name: %s" % pipeline_name)
-
-
-def _rec_subclasses(cls):
-    """Returns all recursive subclasses of a given class (i.e., subclasses,
-    sub-subclasses, etc.)"""
-    subclasses = []
-    if cls.__subclasses__():
-        for subcls in cls.__subclasses__():
-            subclasses.append(subcls)
-            subclasses += _rec_subclasses(subcls)
-    return subclasses
+    cls = get_pipeline_class(pipeline_name)
+    print("Create %s instance." % pipeline_name)
+    return cls(remote_mode=remote_mode, **kwargs)
+
+
+def get_pipeline_class(pipeline_name):
+    """Returns the pipeline class named pipeline_name, importing the module
+    defining it if needed."""
+    if pipeline_name not in pipeline_base.PIPELINES:
+        if pipeline_name in _PIPELINE_MODULES:
+            importlib.import_module(_PIPELINE_MODULES[pipeline_name])
+        else:
+            # Base pipelines are not listed in the table, but are registered
+            # with the pipelines deriving from them.
+            for module in set(_PIPELINE_MODULES.values()):
+                importlib.import_module(module)
+    if pipeline_name not in pipeline_base.PIPELINES:
+        raise ValueError("Invalid pipeline name: %s" % pipeline_name)
+    return pipeline_base.PIPELINES[pipeline_name]
+
+
+def list_pipelines():
+    """Returns the names of the pipelines, sorted, with the kwargs they
+    require, without building their flows."""
+    return [(name, list(get_pipeline_class(name).required_kwargs))
+            for name in sorted(_PIPELINE_MODULES)]
@@ -21,6 +21,8 @@ from taskflow.patterns import linear_flow
 
 class SamplePipeline(pipeline_base.PipelineBase):
 
+    required_kwargs = ['sleep_secs']
+
     def __init__(self, **kwargs):
         super(SamplePipeline, self).__init__(**kwargs)
 
@@ -30,7 +32,3 @@ class SamplePipeline(pipeline_base.PipelineBase):
         flow.add(sample_tasks.SampleTask('SampleTask',
                                          inject={'sleep_secs': sleep_secs}))
         return flow
-
-    def validate_kwargs(self, **kwargs):
-        if 'sleep_secs' not in kwargs:
-            raise ValueError('sleep_secs must be provided')
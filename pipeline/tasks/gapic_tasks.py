@@ -17,6 +17,7 @@ import os
 
 from pipeline.tasks import packman_tasks
 from pipeline.tasks import task_base
+from pipeline.utils import task_cache
 from pipeline.utils import task_utils
 from pipeline.tasks.requirements import gapic_requirements
 
@@ -35,8 +36,11 @@ class GapicConfigGenTask(task_base.TaskBase):
             '--output=' + os.path.abspath(config_gen_path)
         ]
         clargs = '-Pclargs=' + ','.join(args)
-        self.exec_command([os.path.join(toolkit_path, 'gradlew'), '-p',
-                           toolkit_path, 'runConfigGen', clargs])
+        self.exec_cached(
+            config_gen_path, [descriptor_set], {'api_name': api_name},
+            [task_cache.toolkit_fingerprint(toolkit_path)],
+            lambda: self.exec_toolkit_task(toolkit_path, 'runConfigGen',
+                                           clargs))
 
         return config_gen_path
 
@@ -93,8 +97,11 @@ class GapicCodeGenTask(task_base.TaskBase):
             + os.path.abspath(code_root)
         ] + service_args + gapic_args
         clargs = '-Pclargs=' + ','.join(args)
-        self.exec_command([os.path.join(toolkit_path, 'gradlew'), '-p',
-                           toolkit_path, 'runVGen', clargs])
+        self.exec_cached(
+            code_root, [descriptor_set] + service_yaml + gapic_yaml,
+            {'language': language, 'api_name': api_name},
+            [task_cache.toolkit_fingerprint(toolkit_path)],
+            lambda: self.exec_toolkit_task(toolkit_path, 'runVGen', clargs))
 
         return code_root
 
@@ -132,8 +139,7 @@ class GapicMergeTask(task_base.TaskBase):
             args.append('--ignore_base')
         clargs = '-Pclargs=' + ','.join(args)
         print 'Running synchronizer with args: ' + str(args)
-        self.exec_command([os.path.join(toolkit_path, 'gradlew'), '-p',
-                           toolkit_path, 'runSynchronizer', clargs])
+        self.exec_toolkit_task(toolkit_path, 'runSynchronizer', clargs)
         for root, subdirs, files in os.walk(final_code_root):
             for file in files:
                 if file.endswith('.orig'):
@@ -15,68 +15,125 @@
 """Tasks related to I/O."""
 
 import base64
+import json
 import os
 import shutil
-import urllib
-import zipfile
+import tempfile
 
-from gcloud import storage
 from pipeline.tasks import task_base
+from pipeline.utils import blob_store, googleapis_cache, path_resolver
 
 
 class BlobUploadTask(task_base.TaskBase):
     """A task which uploads file to Google Cloud Storage.
 
-    It requires authentication be properly configured."""
+    The file is uploaded in parallel parts (see blob_store.upload_file), to
+    the bucket_name bucket, or to the blob store named by result_store when
+    set. The object at dest_path is the index of the parts, not the file, so
+    it is read back with blob_store, e.g. by BlobDownloadTask. It requires
+    authentication be properly configured."""
 
-    default_provides = ('bucket', 'path', 'public_url')
+    default_provides = ('bucket', 'path')
 
     def execute(self,
                 bucket_name,
                 src_path,
-                dest_path):
+                dest_path,
+                result_store=None):
+        store = blob_store.get_store(result_store or 'gs://' + bucket_name)
         print "Start blob upload"
-        client = storage.Client()
-        bucket = client.get_bucket(bucket_name)
-        blob = bucket.blob(dest_path)
-        with open(src_path, 'r') as f:
-            blob.upload_from_file(f)
-        print "Uploaded to %s" % blob.public_url
+        blob_store.upload_file(store, src_path, dest_path)
+        print "Uploaded to %s in %s" % (dest_path, result_store or bucket_name)
 
-        return bucket_name, dest_path, blob.public_url
+        return bucket_name, dest_path
 
 
 class BlobDownloadTask(task_base.TaskBase):
     """A task which downloads file to Google Cloud Storage.
 
+    It downloads the files uploaded by BlobUploadTask, in parallel parts.
     It requires authentication be properly configured."""
 
-    def execute(self, bucket_name, path, output_dir):
-        client = storage.Client()
-        bucket = client.get_bucket(bucket_name)
-        blob = bucket.get_blob(path)
-        if not blob:
+    def execute(self, bucket_name, path, output_dir, result_store=None):
+        store = blob_store.get_store(result_store or 'gs://' + bucket_name)
+        if not store.exists(path):
             print 'Cannot find the output from GCS.'
             return
         filename = os.path.join(output_dir, path)
         if not os.path.exists(os.path.dirname(filename)):
-            try:
-                os.makedirs(os.path.dirname(filename))
-            except:
-                raise
-        with open(filename, "w") as f:
-            blob.download_to_file(f)
-            print 'File downloaded to %s' % f.name
+            os.makedirs(os.path.dirname(filename))
+        blob_store.download_file(store, path, filename)
+        print 'File downloaded to %s' % filename
 
 
 class PrepareUploadDirTask(task_base.TaskBase):
     """Compress pipeline dir_to_upload into a file which can be uploaded to GCS.
 
     Normally be used as the final step for pipeline job to return generated
-    content to its poster."""
-
-    def execute(self, repo_root, tarfile):
-        self.exec_command(['tar', '-C', repo_root, '-zcvf', tarfile, '.'])
+    content to its poster.
+
+    Only the outputs of the pipeline, output_dir and final_repo_dir, are
+    archived (the whole repo_root when neither is set), with their paths
+    relative to repo_root. The archive also holds a JSON manifest of the
+    archived files, with their size and SHA-256, as MANIFEST_NAME. It is
+    compressed with pigz, on all cores, when installed, and gzip otherwise.
+    The archive itself is left out when it is written under repo_root.
+    """
+
+    MANIFEST_NAME = '.artman-manifest.json'
+
+    def execute(self, repo_root, tarfile, output_dir=None,
+                final_repo_dir=None):
+        paths = _output_paths(repo_root, [output_dir, final_repo_dir])
+        manifest_dir = tempfile.mkdtemp()
+        try:
+            with open(os.path.join(manifest_dir, self.MANIFEST_NAME),
+                      'w') as f:
+                json.dump({'files': _manifest(repo_root, paths)}, f,
+                          indent=2, sort_keys=True)
+            compress_program = ('pigz' if path_resolver.which('pigz')
+                                else 'gzip')
+            self.exec_command(
+                ['tar', '-C', repo_root,
+                 '--use-compress-program=' + compress_program,
+                 '-cf', tarfile,
+                 '--exclude=' + os.path.relpath(tarfile, repo_root)] + paths +
+                ['-C', manifest_dir, self.MANIFEST_NAME])
+        finally:
+            shutil.rmtree(manifest_dir, ignore_errors=True)
+
+
+def _output_paths(repo_root, dirs):
+    """Returns the paths, relative to repo_root, of the existing dirs under
+    repo_root, without the dirs nested in another one."""
+    root = os.path.abspath(repo_root)
+    paths = set()
+    for directory in dirs:
+        if not directory or not os.path.isdir(directory):
+            continue
+        path = os.path.relpath(os.path.abspath(directory), root)
+        if path != '..' and not path.startswith('..' + os.sep):
+            paths.add(path)
+    nested = set(path for path in paths for parent in paths
+                 if parent != path and
+                 (parent == '.' or path.startswith(parent + os.sep)))
+    return sorted(paths - nested) or ['.']
+
+
+def _manifest(repo_root, paths):
+    files = []
+    for path in paths:
+        for root, _, names in os.walk(os.path.join(repo_root, path)):
+            for name in names:
+                file_path = os.path.join(root, name)
+                if os.path.islink(file_path):
+                    continue
+                files.append({
+                    'path': os.path.normpath(
+                        os.path.relpath(file_path, repo_root)),
+                    'size': os.path.getsize(file_path),
+                    'sha256': blob_store.hash_file(file_path)})
+    return sorted(files, key=lambda f: f['path'])
 
 
 class CleanupTempDirsTask(task_base.TaskBase):
@@ -88,10 +145,36 @@ class CleanupTempDirsTask(task_base.TaskBase):
 
 
 class PrepareGoogleapisDirTask(task_base.TaskBase):
+    """Prepares the googleapis directory of remote pipelines.
+
+    The googleapis archive is downloaded from googleapis_source (GitHub by
+    default). When googleapis_cache_dir (or the ARTMAN_GOOGLEAPIS_CACHE
+    environment variable) is set, the archive is extracted once per revision
+    into that host-level cache, checked for a new revision at most once per
+    googleapis_refresh_secs, and the directory of every job is cloned from
+    the cache (see pipeline.utils.googleapis_cache).
+
+    The files of the --local_repo of the poster are then written over the
+    tree: the files of files_manifest are fetched in parallel from the
+    blob_store (see pipeline.utils.blob_store), and the files of files_dict,
+    base64 encoded, are written as is.
+
+    When googleapis_sparse is True, only the files the pipeline reads are
+    materialized: the files of the src_proto_path directories, the protos
+    they transitively import, and the service and GAPIC yaml files. The
+    files of the --local_repo are fetched first, so that the protos their
+    imports need are materialized too.
+    """
 
     default_provides = ('repo_dir')
 
-    def execute(self, repo_root, files_dict={}):
+    def execute(self, repo_root, files_dict={}, files_manifest={},
+                blob_store=None, googleapis_source=None,
+                googleapis_cache_dir=None, googleapis_refresh_secs=None,
+                googleapis_hardlink=False, googleapis_sparse=False,
+                src_proto_path=None, import_proto_path=None,
+                service_yaml=None, gapic_api_yaml=None,
+                gapic_language_yaml=None):
         if os.path.exists(repo_root):
             # Do nothing if the repo_root exists. The repo_root exists if
             # artman is running locally.
@@ -101,24 +184,57 @@ class PrepareGoogleapisDirTask(task_base.TaskBase):
             os.makedirs(repo_root)
         except OSError as e:
             raise e
-        testfile = urllib.FancyURLopener()
-        tmp_repo_file = os.path.join(repo_root, "file.zip")
-        testfile.retrieve(
-            "https://github.com/googleapis/googleapis/archive/master.zip",
-            tmp_repo_file)
-        zip_ref = zipfile.ZipFile(tmp_repo_file, 'r')
-        zip_ref.extractall(repo_root)
-        zip_ref.close()
-        os.remove(tmp_repo_file)
-        shutil.move(os.path.join(repo_root, "googleapis-master"),
-                    os.path.join(repo_root, "googleapis"))
         repo_dir = os.path.join(repo_root, "googleapis")
-        # Write/overwrite the additonal files into the repo_dir so that user
-        # can include additional files which are not in the public repo.
+        overlay_dir = None
+        if files_dict or files_manifest:
+            overlay_dir = tempfile.mkdtemp(dir=repo_root)
+            self._write_files(overlay_dir, files_dict, files_manifest,
+                              blob_store)
+        select = None
+        if googleapis_sparse:
+            select = googleapis_cache.sparse_selector(
+                repo_dir, src_proto_path, import_proto_path,
+                ((service_yaml or []) + (gapic_api_yaml or []) +
+                 (gapic_language_yaml or [])), overlay_dir)
+        source = googleapis_source or googleapis_cache.DEFAULT_SOURCE
+        cache_dir = (googleapis_cache_dir or
+                     os.environ.get('ARTMAN_GOOGLEAPIS_CACHE'))
+        if cache_dir:
+            snapshot = googleapis_cache.get_snapshot(
+                cache_dir, source, googleapis_refresh_secs)
+            googleapis_cache.clone_tree(snapshot, repo_dir,
+                                        hardlink=googleapis_hardlink,
+                                        select=select)
+        else:
+            googleapis_cache.download(source, repo_dir, select)
+        if overlay_dir:
+            _move_files(overlay_dir, repo_dir)
+        return repo_dir
+
+    def _write_files(self, dest_dir, files_dict, files_manifest, store_url):
+        if files_manifest:
+            blob_store.download_tree(
+                blob_store.get_store(store_url or blob_store.DEFAULT_STORE),
+                files_manifest, dest_dir)
+        # The additional files of files_dict, which are not in the public
+        # repo, win over those of files_manifest.
         for f, content in files_dict.iteritems():
-            filename = os.path.join(repo_dir, f)
+            filename = os.path.join(dest_dir, f)
             if not os.path.exists(os.path.dirname(filename)):
                 os.makedirs(os.path.dirname(filename))
             with open(filename, "w+") as text_file:
                 text_file.write(base64.b64decode(content))
-        return repo_dir
+
+
+def _move_files(src_dir, dest_dir):
+    """Moves the files of src_dir over those of dest_dir, then removes
+    src_dir."""
+    for root, _, files in os.walk(src_dir):
+        dest_root = os.path.join(dest_dir, os.path.relpath(root, src_dir))
+        if not os.path.exists(dest_root):
+            os.makedirs(dest_root)
+        for name in files:
+            # Renaming replaces the file of dest_dir instead of writing
+            # through it, which may be a hard link into the cache.
+            os.rename(os.path.join(root, name), os.path.join(dest_root, name))
+    shutil.rmtree(src_dir)
@@ -15,27 +15,19 @@
 """Tasks related to packages of the languages."""
 
 import os
-import subprocess
 
 from pipeline.tasks import task_base
 from pipeline.tasks.requirements import ruby_requirements
 from pipeline.utils import task_utils
 
 
-def _scoped_run_command(target_dir, commands):
-    current_dir = os.getcwd()
-    os.chdir(target_dir)
-    subprocess.check_output(commands, stderr=subprocess.STDOUT)
-    os.chdir(current_dir)
-
-
 class RubyPackageGenTask(task_base.TaskBase):
     """Generates .gem file for the target directory."""
 
     def execute(self, package_dir):
         # Do not create gem if the output is a part of gcloud.
         if not task_utils.is_output_gcloud(package_dir):
-            _scoped_run_command(package_dir, ['rake', 'build'])
+            self.exec_command(['rake', 'build'], cwd=package_dir)
 
     def validate(self):
         return [ruby_requirements.RakeRequirements]
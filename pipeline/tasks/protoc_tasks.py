@@ -16,12 +16,14 @@
 
 import os
 import re
-import subprocess
 import yaml
 from pipeline.tasks import packman_tasks
 from pipeline.tasks import task_base
 from pipeline.tasks.requirements import grpc_requirements
 from pipeline.utils import lang_params
+from pipeline.utils import path_resolver
+from pipeline.utils import proto_index
+from pipeline.utils import task_cache
 from pipeline.utils import task_utils
 
 
@@ -39,9 +41,7 @@ class _SimpleProtoParams:
 
     def grpc_plugin_path(self, dummy_toolkit_path):
         if self.path is None:
-            self.path = subprocess.check_output(
-                ['which', 'grpc_{}_plugin'.format(self.language)],
-                stderr=subprocess.STDOUT)[:-1]
+            self.path = _find_plugin('grpc_{}_plugin'.format(self.language))
         return self.path
 
     def grpc_out_param(self, output_dir):
@@ -108,8 +108,7 @@ class _PhpProtoParams:
 
     def grpc_plugin_path(self, dummy_toolkit_path):
         if self.path is None:
-            self.path = subprocess.check_output(
-                ['which', 'protoc-gen-php'], stderr=subprocess.STDOUT)[:-1]
+            self.path = _find_plugin('protoc-gen-php')
         return self.path
 
     def grpc_out_param(self, output_dir):
@@ -126,6 +125,12 @@ _PROTO_PARAMS_MAP = {
 }
 
 
+def _find_plugin(name):
+    """Returns the path of the protoc plugin name along PATH, or name itself
+    if it is not installed, so that protoc reports it missing."""
+    return path_resolver.which(name) or name
+
+
 def _find_protobuf_path(toolkit_path):
     """Fetch and locate protobuf source"""
     print 'Searching for latest protobuf source'
@@ -150,8 +155,8 @@ def _group_by_dirname(protos):
     """Groups the file paths by direct parent directory.
 
     Returns:
-        A dict mapping from the directory name to the list of proto files in
-        it.
+        A list of (directory name, list of proto files in it) pairs, sorted
+        by directory name.
     """
     dirs = {}
     for proto in protos:
@@ -160,7 +165,7 @@ def _group_by_dirname(protos):
             dirs[dirname] = [proto]
         else:
             dirs[dirname].append(proto)
-    return dirs
+    return sorted(dirs.items())
 
 
 def _protoc_header_params(import_proto_path, src_proto_path,
@@ -189,102 +194,203 @@ def _protoc_grpc_params(proto_params, pkg_dir, toolkit_path):
             proto_params.grpc_out_param(pkg_dir)]
 
 
-def _prepare_pkg_dir(output_dir, api_name, language):
+def _prepare_pkg_dir(task, output_dir, api_name, language):
     proto_params = _PROTO_PARAMS_MAP[language]
     pkg_dir = os.path.join(output_dir, api_name + '-gen-' + language)
-    subprocess.check_output([
-        'mkdir', '-p', proto_params.code_root(pkg_dir)],
-        stderr=subprocess.STDOUT)
+    task.exec_command(['mkdir', '-p', proto_params.code_root(pkg_dir)])
     return pkg_dir
 
 
+def _list_files(root):
+    return [os.path.join(dirpath, name)
+            for (dirpath, _, files) in os.walk(root) for name in files]
+
+
+def _protoc_tools(plugin_path=None):
+    """Returns the fingerprints of protoc and of the plugin it runs."""
+    tools = [task_cache.executable_fingerprint('protoc')]
+    if plugin_path:
+        tools.append(task_cache.executable_fingerprint(plugin_path))
+    return tools
+
+
+def _load_proto_index(output_dir, import_proto_path, src_proto_path,
+                      incremental_protoc):
+    if not incremental_protoc:
+        return None
+    return proto_index.ProtoIndex(output_dir,
+                                  import_proto_path + src_proto_path)
+
+
 class ProtoDescGenTask(task_base.TaskBase):
     """Generates proto descriptor set"""
     default_provides = 'descriptor_set'
 
     def execute(self, src_proto_path, import_proto_path, output_dir,
-                api_name, toolkit_path):
-        print 'Compiling descriptors {0}'.format(
-            _find_protos(src_proto_path))
+                api_name, toolkit_path, incremental_protoc=False):
+        protos = _find_protos(src_proto_path)
+        print 'Compiling descriptors {0}'.format(protos)
         desc_out_file = api_name + '.desc'
+        desc_path = os.path.join(output_dir, desc_out_file)
         self.exec_command(['mkdir', '-p', output_dir])
         # DescGen don't use _group_by_dirname right now because
         #   - it doesn't have to
         #   - and multiple invocation will overwrite the desc_out_file
-        self.exec_command(
-            _protoc_header_params(
-                import_proto_path, src_proto_path, toolkit_path) +
-            _protoc_desc_params(output_dir, desc_out_file) +
-            _find_protos(src_proto_path))
-        return os.path.join(output_dir, desc_out_file)
+        command = (_protoc_header_params(
+                       import_proto_path, src_proto_path, toolkit_path) +
+                   _protoc_desc_params(output_dir, desc_out_file) +
+                   protos)
+        index = _load_proto_index(output_dir, import_proto_path,
+                                  src_proto_path, incremental_protoc)
+        if index:
+            digest = index.closure_digest(protos, command)
+            if (os.path.isfile(desc_path) and
+                    index.is_current(desc_path, digest)):
+                print 'Protos and their imports are unchanged'
+                return desc_path
+
+        self.exec_cached(desc_path,
+                         _find_protos(import_proto_path + src_proto_path +
+                                      [_find_protobuf_path(toolkit_path)]),
+                         {'command': command},
+                         _protoc_tools(),
+                         lambda: self.exec_command(command))
+        if index:
+            index.record(desc_path, digest)
+            index.save()
+        return desc_path
+
+    def validate(self):
+        return [grpc_requirements.GrpcRequirements]
+
+
+class _ProtocCodeGenTaskBase(task_base.TaskBase):
+    """Base class of the tasks which run protoc once per proto directory.
+
+    protoc-gen-go must compile all protos in a package at the same time, and
+    *only* the protos in that package. This doesn't break other languages, so
+    we do it that way for all of them. It also makes the protoc invocations
+    independent, so they run concurrently, and lets the incremental mode skip
+    the directories whose protos and imports are unchanged.
+    """
+
+    def exec_protoc(self, dir_commands, code_root, src_proto_path,
+                    import_proto_path, output_dir, protoc_workers,
+                    incremental_protoc, protobuf_path=None, plugin_path=None):
+        """Runs the (dirname, protos, command) entries of dir_commands.
+
+        The protos of protobuf_path, the include path of the protobuf
+        sources, and the grpc plugin at plugin_path are part of the task
+        cache key too.
+        """
+        index = _load_proto_index(output_dir, import_proto_path,
+                                  src_proto_path, incremental_protoc)
+        # The files generated in code_root, which must all still exist for
+        # any directory to be skipped.
+        outputs = '{0}:{1}'.format(type(self).__name__, code_root)
+        commands = []
+        targets = []
+        for (dirname, protos, command) in dir_commands:
+            if index:
+                target = '{0}:{1}'.format(outputs, dirname)
+                digest = index.closure_digest(protos, command)
+                if (index.outputs_exist(outputs) and
+                        index.is_current(target, digest)):
+                    print 'Protos in {0} are unchanged'.format(dirname)
+                    continue
+                targets.append((target, digest))
+            commands.append(command)
+        if not commands:
+            return
+
+        proto_paths = import_proto_path + src_proto_path
+        if protobuf_path:
+            proto_paths = proto_paths + [protobuf_path]
+        self.exec_cached(code_root, _find_protos(proto_paths),
+                         {'commands': commands}, _protoc_tools(plugin_path),
+                         lambda: self.exec_commands(commands, protoc_workers))
+        if index:
+            for (target, digest) in targets:
+                index.record(target, digest)
+            index.record_outputs(outputs, _list_files(code_root))
+            index.save()
 
     def validate(self):
         return [grpc_requirements.GrpcRequirements]
 
 
-class ProtoCodeGenTask(task_base.TaskBase):
+class ProtoCodeGenTask(_ProtocCodeGenTaskBase):
     """Generates protos"""
     def execute(self, language, src_proto_path, import_proto_path,
-                output_dir, api_name, toolkit_path):
+                output_dir, api_name, toolkit_path, protoc_workers=None,
+                incremental_protoc=False):
         proto_params = _PROTO_PARAMS_MAP[language]
-        pkg_dir = _prepare_pkg_dir(output_dir, api_name, language)
-        # protoc-gen-go must compile all protos in a package at the same time,
-        # and *only* the protos in that package. This doesn't break other
-        # languages, so we do it that way for all of them.
+        pkg_dir = _prepare_pkg_dir(self, output_dir, api_name, language)
+        header_params = _protoc_header_params(
+            import_proto_path, src_proto_path, toolkit_path)
+        dir_commands = []
         for (dirname, protos) in _group_by_dirname(
-                _find_protos(src_proto_path)).items():
+                _find_protos(src_proto_path)):
             print 'Generating protos {0}'.format(dirname)
-            self.exec_command(
-                _protoc_header_params(
-                    import_proto_path, src_proto_path, toolkit_path) +
+            dir_commands.append((dirname, protos, (
+                header_params +
                 _protoc_proto_params(proto_params, pkg_dir, with_grpc=False) +
-                protos)
-
-    def validate(self):
-        return [grpc_requirements.GrpcRequirements]
+                protos)))
+        self.exec_protoc(dir_commands, proto_params.code_root(pkg_dir),
+                         src_proto_path, import_proto_path, output_dir,
+                         protoc_workers, incremental_protoc,
+                         protobuf_path=_find_protobuf_path(toolkit_path))
 
 
-class GrpcCodeGenTask(task_base.TaskBase):
+class GrpcCodeGenTask(_ProtocCodeGenTaskBase):
     """Generates the gRPC client library"""
     def execute(self, language, src_proto_path, import_proto_path,
-                toolkit_path, output_dir, api_name):
+                toolkit_path, output_dir, api_name, protoc_workers=None,
+                incremental_protoc=False):
         proto_params = _PROTO_PARAMS_MAP[language]
-        pkg_dir = _prepare_pkg_dir(output_dir, api_name, language)
-        # See the comments in ProtoCodeGenTask for why this needs to group the
-        # proto files by directory.
+        pkg_dir = _prepare_pkg_dir(self, output_dir, api_name, language)
+        header_params = _protoc_header_params(
+            import_proto_path, src_proto_path, toolkit_path)
+        dir_commands = []
         for (dirname, protos) in _group_by_dirname(
-                _find_protos(src_proto_path)).items():
+                _find_protos(src_proto_path)):
             print 'Running protoc with grpc plugin on {0}'.format(dirname)
-            self.exec_command(
-                _protoc_header_params(
-                    import_proto_path, src_proto_path, toolkit_path) +
+            dir_commands.append((dirname, protos, (
+                header_params +
                 _protoc_grpc_params(proto_params, pkg_dir, toolkit_path) +
-                protos)
-
-    def validate(self):
-        return [grpc_requirements.GrpcRequirements]
+                protos)))
+        self.exec_protoc(dir_commands, proto_params.code_root(pkg_dir),
+                         src_proto_path, import_proto_path, output_dir,
+                         protoc_workers, incremental_protoc,
+                         protobuf_path=_find_protobuf_path(toolkit_path),
+                         plugin_path=proto_params.grpc_plugin_path(
+                             toolkit_path))
 
 
-class ProtoAndGrpcCodeGenTask(task_base.TaskBase):
+class ProtoAndGrpcCodeGenTask(_ProtocCodeGenTaskBase):
     """Generates protos and the gRPC client library"""
     def execute(self, language, src_proto_path, import_proto_path,
-                toolkit_path, output_dir, api_name):
+                toolkit_path, output_dir, api_name, protoc_workers=None,
+                incremental_protoc=False):
         proto_params = _PROTO_PARAMS_MAP[language]
-        pkg_dir = _prepare_pkg_dir(output_dir, api_name, language)
-        # See the comments in ProtoCodeGenTask for why this needs to group the
-        # proto files by directory.
+        pkg_dir = _prepare_pkg_dir(self, output_dir, api_name, language)
+        header_params = _protoc_header_params(
+            import_proto_path, src_proto_path, toolkit_path)
+        dir_commands = []
         for (dirname, protos) in _group_by_dirname(
-                _find_protos(src_proto_path)).items():
+                _find_protos(src_proto_path)):
             print 'Running protoc and grpc plugin on {0}'.format(dirname)
-            self.exec_command(
-                _protoc_header_params(
-                    import_proto_path, src_proto_path, toolkit_path) +
+            dir_commands.append((dirname, protos, (
+                header_params +
                 _protoc_proto_params(proto_params, pkg_dir, with_grpc=True) +
                 _protoc_grpc_params(proto_params, pkg_dir, toolkit_path) +
-                protos)
-
-    def validate(self):
-        return [grpc_requirements.GrpcRequirements]
+                protos)))
+        self.exec_protoc(dir_commands, proto_params.code_root(pkg_dir),
+                         src_proto_path, import_proto_path, output_dir,
+                         protoc_workers, incremental_protoc,
+                         protobuf_path=_find_protobuf_path(toolkit_path),
+                         plugin_path=proto_params.grpc_plugin_path(
+                             toolkit_path))
 
 
 class GoLangUpdateImportsTask(task_base.TaskBase):
@@ -300,7 +406,7 @@ class GoLangUpdateImportsTask(task_base.TaskBase):
 
     def execute(self, api_name, language, go_import_base, output_dir,
                 final_repo_dir):
-        pkg_dir = _prepare_pkg_dir(output_dir, api_name, language)
+        pkg_dir = _prepare_pkg_dir(self, output_dir, api_name, language)
         for pbfile in self.find_pb_files(pkg_dir):
             out_file = os.path.join(final_repo_dir, 'proto',
                                     os.path.relpath(pbfile, pkg_dir))
@@ -350,6 +456,7 @@ class GrpcPackmanTask(packman_tasks.PackmanTaskBase):
 
 class GoExtractImportBaseTask(task_base.TaskBase):
     default_provides = 'go_import_base'
+    ordered = False
 
     def execute(self, gapic_api_yaml):
         for yaml_file in gapic_api_yaml:
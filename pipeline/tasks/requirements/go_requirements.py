@@ -32,7 +32,7 @@ class GoPathRequirements(TaskRequirementBase):
         return []
 
     @classmethod
-    def is_installed(cls):
+    def is_installed(cls, locations=None):
         return 'GOPATH' in os.environ
 
 
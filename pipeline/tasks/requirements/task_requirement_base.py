@@ -20,7 +20,7 @@ requirements need to be installed before pipeline runs locally. One task might
 require multiple requirements, and each requirement might also be needed by
 different tasks."""
 
-import subprocess
+from pipeline.utils import path_resolver
 
 
 class TaskRequirementBase(object):
@@ -45,12 +45,16 @@ class TaskRequirementBase(object):
         raise NotImplementedError("Subclass must implement abstract method")
 
     @classmethod
-    def is_installed(cls):
-        """Return True if all requirements have been installed."""
-        for exe in cls.require():
-            # TODO(cbao): Use shutil.which() if running with Python 3.3 and
-            # above.
-            return_code = subprocess.call(["which", exe])
-            if return_code:
-                return False
-        return True
+    def is_installed(cls, locations=None):
+        """Return True if all requirements have been installed.
+
+        locations maps the executables already resolved in a batch, e.g. of
+        several requirements, to their paths, as returned by
+        path_resolver.which_all.
+        """
+        required = cls.require()
+        if locations is None or not set(required) <= set(locations):
+            # The executables are looked up in the process-wide index of
+            # PATH, without spawning `which`.
+            locations = path_resolver.which_all(required)
+        return all(locations[name] for name in required)
@@ -17,22 +17,61 @@
 This base class extends taskflow Task class, with additional methods and
 properties used by the GAPIC pipeline."""
 
+import multiprocessing
 import subprocess
+import sys
+import threading
+import time
 
-from gcloud import logging as cloud_logging
+from multiprocessing.pool import ThreadPool
+
+from pipeline.utils import command_util
+from pipeline.utils import log_sink
+from pipeline.utils import resource_usage
+from pipeline.utils import task_cache
+from pipeline.utils import task_utils
+from pipeline.utils import timeline
 from taskflow.task import Task
 
 
 class TaskBase(Task):
 
-    cloud_logger = None
+    # The name of the cloud log of remote pipelines, set from pipeline_id.
+    log_name = None
+    task_cache = None
+    resource_report = None
+
+    # Whether the output of commands is logged line by line as it is produced,
+    # instead of all at once when the command finishes. Only the last
+    # output_tail_lines lines are then kept, to be logged and raised on error.
+    stream_output = False
+    output_tail_lines = 100
+    verbose = True
+
+    # Whether the task must run after the task added before it in a pipeline.
+    # Tasks which only read their declared inputs and return a value can set
+    # this to False, so that graph flows order them by data dependencies.
+    ordered = True
 
     def __init__(self, *args, **kwargs):
-        if 'inject' in kwargs and 'pipeline_id' in kwargs['inject']:
-            pipeline_id = kwargs['inject']['pipeline_id']
-            self.log_client = cloud_logging.Client()
-            self.cloud_logger = self.log_client.logger(pipeline_id)
+        inject = kwargs.get('inject') or {}
+        if 'pipeline_id' in inject:
+            self.log_name = inject['pipeline_id']
+        if inject.get('task_cache_dir'):
+            self.task_cache = task_cache.get_cache(
+                inject['task_cache_dir'], inject.get('task_cache_max_bytes'))
+        if inject.get('resource_report'):
+            self.resource_report = resource_usage.get_report(
+                inject['resource_report'], inject.get('resource_report_id'))
+        self.stream_output = inject.get('stream_output', self.stream_output)
+        self.output_tail_lines = inject.get('output_tail_lines',
+                                            self.output_tail_lines)
         super(TaskBase, self).__init__(*args, **kwargs)
+        # The task_verbosity pipeline kwarg maps task names or task class
+        # names to 'quiet', which only logs the output of failed commands.
+        verbosity = inject.get('task_verbosity') or {}
+        self.verbose = verbosity.get(
+            self.name, verbosity.get(type(self).__name__)) != 'quiet'
 
     def validate(self):
         """Abstract method, which returns a list of task requirements.
@@ -44,23 +83,176 @@ class TaskBase(Task):
 
     def log(self, msg):
         """Do local logging, and optionally cloud logging."""
-        if self.cloud_logger:
-            # TODO(ethanbao): Do batch logging.
-            self.cloud_logger.log_text(msg)
+        if self.log_name:
+            # The shared sink writes the entries in batches, in background.
+            log_sink.get_sink().log(self.log_name, msg)
         print msg
 
-    def exec_command(self, args):
+    def post_execute(self):
+        if self.log_name:
+            log_sink.get_sink().flush()
+
+    def exec_command(self, args, cwd=None):
         """ Execute command and return output.
 
-        TODO(ethanbao): Use subprocess.Popen which is recommended."""
+        The command runs in cwd when it is given, without changing the working
+        directory of the process, which the concurrent tasks share.
+        With the stream_output pipeline kwarg, the output is logged as it is
+        produced, and only its last output_tail_lines lines are returned."""
         try:
-            output = subprocess.check_output(args, stderr=subprocess.STDOUT)
-            self.log(output)
+            output = self._run_command(args, cwd)
+            if self._log_after_run(None):
+                self.log(output)
             return output
         except subprocess.CalledProcessError as e:
-            self.log(e.output)
+            if self._log_after_run(e):
+                self.log(e.output)
             raise e
 
+    def exec_commands(self, commands, max_workers=None):
+        """Execute independent commands concurrently and return their outputs.
+
+        At most max_workers commands (by default, one per CPU) run at a time.
+        The outputs are logged in the order of the commands: once all of them
+        have finished, or, with the stream_output pipeline kwarg, as they are
+        produced, the lines of a command being held until the commands before
+        it have finished. When a command fails, the commands which have not
+        started yet are cancelled, and the error of the first failed command
+        is raised after the running ones have finished.
+        """
+        failed = threading.Event()
+        lines = _OrderedLines(self._stream_line, len(commands))
+
+        def run(command):
+            (index, args) = command
+            try:
+                if failed.is_set():
+                    return None, None
+                return self._run_command(
+                    args, stream_line=lines.callback(index)), None
+            except Exception as e:
+                failed.set()
+                # The traceback of the worker thread is kept to be raised.
+                return getattr(e, 'output', None), sys.exc_info()
+            finally:
+                lines.finish(index)
+
+        pool = ThreadPool(max_workers or multiprocessing.cpu_count())
+        try:
+            results = pool.map(run, enumerate(commands))
+        finally:
+            pool.close()
+            pool.join()
+
+        outputs = []
+        for (output, error) in results:
+            if output is not None and self._log_after_run(error):
+                self.log(output)
+            if error:
+                raise error[0], error[1], error[2]
+            outputs.append(output)
+        return outputs
+
+    def exec_cached(self, output, input_files, input_kwargs, tools,
+                    generate):
+        """Call generate, which writes output, unless output can be restored
+        from the task cache.
+
+        The cache is enabled by the task_cache_dir pipeline kwarg. Its key
+        hashes the content of input_files, input_kwargs and the fingerprints
+        of the tools run by generate (see pipeline.utils.task_cache).
+        """
+        if not self.task_cache:
+            generate()
+            return
+        key = self.task_cache.key(type(self).__name__, input_files,
+                                  input_kwargs, tools)
+        if self.task_cache.restore(key, output):
+            self.log('Restored {0} from the task cache'.format(output))
+            return
+        generate()
+        self.task_cache.save(key, output)
+
+    def exec_toolkit_task(self, toolkit_path, task_name, clargs):
+        """Run a toolkit gradle task and return its output.
+
+        gradle runs with --daemon, so that the toolkit tasks of all the
+        pipelines of the host share a warm gradle daemon.
+        """
+        return self.exec_command(
+            task_utils.gradle_command(toolkit_path, task_name, clargs))
+
+    def _log_after_run(self, error):
+        """Whether the output of a command is logged once it has finished,
+        rather than streamed or dropped."""
+        if self.stream_output:
+            return error is not None and not self.verbose
+        return self.verbose or error is not None
+
+    def _run_command(self, args, cwd=None, stream_line=None):
+        start = time.time()
+        returncode = 0
+        try:
+            if not (self.stream_output or self.resource_report):
+                kwargs = {'cwd': cwd} if cwd else {}
+                return subprocess.check_output(
+                    args, stderr=subprocess.STDOUT, **kwargs)
+            if self.stream_output:
+                stream_line = stream_line or self._stream_line
+            else:
+                stream_line = None
+            output, returncode, usage = command_util.run_command(
+                args, stream_line, self.output_tail_lines, cwd)
+            if self.resource_report:
+                self.resource_report.record(self.name, args, usage)
+            if returncode:
+                raise subprocess.CalledProcessError(returncode, args, output)
+            return output
+        except Exception as e:
+            returncode = getattr(e, 'returncode', -1)
+            raise
+        finally:
+            timeline.record_command(self, args, start, time.time(),
+                                    returncode)
+
+    def _stream_line(self, line):
+        if self.verbose:
+            self.log(line)
+
+
+class _OrderedLines(object):
+    """Passes the output lines of concurrent commands to log in the order of
+    the commands: the lines of the first unfinished command are passed as
+    they are produced, and those of the next ones are held until it has
+    finished."""
+
+    def __init__(self, log, count):
+        self._log = log
+        self._lock = threading.Lock()
+        self._held = [[] for _ in range(count)]
+        self._finished = [False] * count
+        self._current = 0
+
+    def callback(self, index):
+        def on_line(line):
+            with self._lock:
+                if index == self._current:
+                    self._log(line)
+                else:
+                    self._held[index].append(line)
+        return on_line
+
+    def finish(self, index):
+        with self._lock:
+            self._finished[index] = True
+            while (self._current < len(self._finished) and
+                   self._finished[self._current]):
+                self._current += 1
+                if self._current < len(self._held):
+                    for line in self._held[self._current]:
+                        self._log(line)
+                    self._held[self._current] = []
+
 
 class EmptyTask(TaskBase):
     """An empty task that can be used by languages when they do not need to
@@ -18,6 +18,7 @@
 
 from taskflow.jobs import backends as job_backends
 from taskflow.persistence import backends as persistence_backends
+from taskflow.utils import kazoo_utils
 
 # Default host/port of ZooKeeper service.
 ZK_HOST = '104.197.10.180:2181'
@@ -34,11 +35,17 @@ def default_persistence_backend():
     return persistence_backends.fetch(PERSISTENCE_CONF)
 
 
-def get_jobboard(name, jobboard_name):
+def zookeeper_client():
+    """Returns a new, not yet started, client of the ZooKeeper service."""
+    return kazoo_utils.make_client({'hosts': ZK_HOST})
+
+
+def get_jobboard(name, jobboard_name, persistence=None):
     config = {
         'hosts': ZK_HOST,
         'board': 'zookeeper',
         'path': '/taskflow/jobboard/zookeeper/' + jobboard_name,
     }
-    return job_backends.fetch(name, config,
-                              persistence=default_persistence_backend())
+    return job_backends.fetch(
+        name, config,
+        persistence=persistence or default_persistence_backend())
@@ -0,0 +1,409 @@
+# Copyright 2016 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Blob stores shared by the posters and the conductors of remote pipelines.
+
+A store is named by a URL: gs://<bucket>/<prefix> for Google Cloud Storage,
+or a local directory (optionally file://<path>), e.g. a shared file system or
+a test fixture.
+
+The files of --local_repo are stored by content: every file is uploaded once
+under the SHA-256 of its content, and the pipeline kwargs only carry a
+manifest mapping the relative path of every file to its hash.
+
+Large files, e.g. the result archives, are transferred in parts by
+upload_file and download_file, in parallel and with retries. The blob of
+such a file is not the file itself, but a JSON index of its parts (with the
+size and SHA-256 of the file), and the parts are stored next to it, as
+<name>.parts/<SHA-256 of the part>. An interrupted upload or download resumes
+from the parts already transferred, and every part and the whole file are
+checked against their SHA-256. open_file reads such a file as a stream
+instead, while its next parts are downloaded, and delete_file removes the
+index and the parts once the file is no longer needed.
+"""
+
+import collections
+import errno
+import hashlib
+import json
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import time
+from multiprocessing.pool import ThreadPool
+
+DEFAULT_STORE = os.environ.get('ARTMAN_BLOB_STORE', 'gs://pipeline/blobs')
+
+# Default store of local runs, which need neither network nor credentials.
+LOCAL_STORE = os.path.join(os.path.expanduser('~'), '.cache', 'artman',
+                           'blobs')
+
+# Maximum number of concurrent blob transfers.
+DEFAULT_WORKERS = 8
+
+# Size of the parts of upload_file.
+DEFAULT_CHUNK_SIZE = 8 * 1024 * 1024
+
+# Number of attempts of every blob transfer.
+_ATTEMPTS = 3
+
+_CONTENT_DIR = 'sha256'
+
+
+def get_store(url):
+    """Returns the blob store named by url."""
+    if url.startswith('gs://'):
+        bucket_name, _, prefix = url[len('gs://'):].partition('/')
+        return GcsBlobStore(bucket_name, prefix)
+    if url.startswith('file://'):
+        url = url[len('file://'):]
+    return LocalBlobStore(url)
+
+
+def hash_file(path):
+    """Returns the hex SHA-256 of the content of path."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), ''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def content_name(content_hash):
+    """Returns the blob name of the content with hash content_hash."""
+    return '{0}/{1}'.format(_CONTENT_DIR, content_hash)
+
+
+def upload_tree(store, root_dir, workers=DEFAULT_WORKERS):
+    """Uploads the files under root_dir which are not in store yet.
+
+    Returns the manifest of root_dir, mapping the slash-separated path of
+    every file, relative to root_dir, to the hash of its content.
+    """
+    manifest = {}
+    paths = {}
+    for root, _, files in os.walk(root_dir):
+        for name in files:
+            path = os.path.join(root, name)
+            rel_path = os.path.relpath(path, root_dir)
+            content_hash = hash_file(path)
+            manifest['/'.join(rel_path.split(os.sep))] = content_hash
+            paths[content_hash] = path
+
+    def upload(content_hash):
+        if not store.exists(content_name(content_hash)):
+            store.upload(paths[content_hash], content_name(content_hash))
+
+    _map(upload, paths.keys(), workers)
+    return manifest
+
+
+def download_tree(store, manifest, dest_dir, workers=DEFAULT_WORKERS):
+    """Writes the files of manifest under dest_dir, downloading every
+    distinct content once and checking its hash."""
+    paths = {}
+    for (rel_path, content_hash) in manifest.iteritems():
+        paths.setdefault(content_hash, []).append(
+            os.path.join(dest_dir, *rel_path.split('/')))
+
+    def download(content_hash):
+        fd, tmp_path = tempfile.mkstemp(dir=dest_dir)
+        os.close(fd)
+        try:
+            store.download(content_name(content_hash), tmp_path)
+            if hash_file(tmp_path) != content_hash:
+                raise IOError('Corrupted blob {0}'.format(
+                    content_name(content_hash)))
+            for path in paths[content_hash]:
+                _place(tmp_path, path)
+        finally:
+            os.remove(tmp_path)
+
+    _map(download, paths.keys(), workers)
+
+
+def upload_file(store, src_path, name, chunk_size=DEFAULT_CHUNK_SIZE,
+                workers=DEFAULT_WORKERS):
+    """Uploads src_path to store as name, in parts of chunk_size bytes.
+
+    The parts already in store, e.g. uploaded by an interrupted upload, are
+    not uploaded again.
+    """
+    def upload_part(offset):
+        with open(src_path, 'rb') as f:
+            f.seek(offset)
+            data = f.read(chunk_size)
+        part_hash = hashlib.sha256(data).hexdigest()
+        if not store.exists(_part_name(name, part_hash)):
+            _retry(store.put, _part_name(name, part_hash), data)
+        return part_hash
+
+    size = os.path.getsize(src_path)
+    parts = _map(upload_part, range(0, size, chunk_size), workers)
+    index = {'size': size, 'sha256': hash_file(src_path),
+             'chunk_size': chunk_size, 'parts': parts}
+    _retry(store.put, name, json.dumps(index))
+
+
+def download_file(store, name, dest_path, workers=DEFAULT_WORKERS):
+    """Downloads the file uploaded as name by upload_file to dest_path.
+
+    The parts are downloaded into dest_path.parts first, so that a download
+    which is interrupted resumes from the parts already downloaded.
+    """
+    index = json.loads(_retry(store.get, name))
+    parts_dir = dest_path + '.parts'
+    if not os.path.exists(parts_dir):
+        os.makedirs(parts_dir)
+
+    def download_part(part_hash):
+        path = os.path.join(parts_dir, part_hash)
+        if os.path.exists(path) and hash_file(path) == part_hash:
+            return
+        _retry(_download_part, store, name, part_hash, path)
+
+    _map(download_part, list(set(index['parts'])), workers)
+    tmp_path = dest_path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        for part_hash in index['parts']:
+            with open(os.path.join(parts_dir, part_hash), 'rb') as part:
+                shutil.copyfileobj(part, f)
+    if hash_file(tmp_path) != index['sha256']:
+        os.remove(tmp_path)
+        raise IOError('Corrupted download of {0}'.format(name))
+    os.rename(tmp_path, dest_path)
+    shutil.rmtree(parts_dir)
+
+
+def open_file(store, name, workers=DEFAULT_WORKERS):
+    """Returns a file-like object reading the file uploaded as name by
+    upload_file, which downloads up to workers parts ahead of the reads."""
+    return _PartReader(store, name, json.loads(_retry(store.get, name)),
+                       workers)
+
+
+def delete_file(store, name):
+    """Removes the file uploaded as name by upload_file, with its parts."""
+    index = json.loads(_retry(store.get, name))
+    for part_hash in set(index['parts']):
+        _retry(store.delete, _part_name(name, part_hash))
+    _retry(store.delete, name)
+
+
+def _part_name(name, part_hash):
+    return '{0}.parts/{1}'.format(name, part_hash)
+
+
+def _get_part(store, name, part_hash):
+    data = store.get(_part_name(name, part_hash))
+    if hashlib.sha256(data).hexdigest() != part_hash:
+        raise IOError('Corrupted blob {0}'.format(
+            _part_name(name, part_hash)))
+    return data
+
+
+def _download_part(store, name, part_hash, path):
+    data = _get_part(store, name, part_hash)
+    with open(path + '.tmp', 'wb') as f:
+        f.write(data)
+    os.rename(path + '.tmp', path)
+
+
+def _retry(func, *args):
+    for attempt in range(_ATTEMPTS):
+        try:
+            return func(*args)
+        except Exception:
+            if attempt == _ATTEMPTS - 1:
+                raise
+            time.sleep(2 ** attempt)
+
+
+def _place(src_path, path):
+    if not os.path.exists(os.path.dirname(path)):
+        try:
+            os.makedirs(os.path.dirname(path))
+        except OSError:
+            # Created concurrently by another download.
+            if not os.path.isdir(os.path.dirname(path)):
+                raise
+    if os.path.exists(path):
+        # Do not write through a hard link into a shared cache.
+        os.remove(path)
+    shutil.copyfile(src_path, path)
+
+
+def _map(func, items, workers):
+    """Returns the results of func on items, run on up to workers threads."""
+    if not items:
+        return []
+    pool = ThreadPool(min(workers or multiprocessing.cpu_count(), len(items)))
+    try:
+        return pool.map(func, items)
+    finally:
+        pool.close()
+        pool.join()
+
+
+class LocalBlobStore(object):
+    """A blob store in a local directory."""
+
+    def __init__(self, root_dir):
+        self.root_dir = os.path.abspath(os.path.expanduser(root_dir))
+
+    def _path(self, name):
+        return os.path.join(self.root_dir, *name.split('/'))
+
+    def exists(self, name):
+        return os.path.exists(self._path(name))
+
+    def upload(self, src_path, name):
+        with open(src_path, 'rb') as f:
+            self._write(name, lambda tmp_file: shutil.copyfileobj(f, tmp_file))
+
+    def download(self, name, dest_path):
+        shutil.copyfile(self._path(name), dest_path)
+
+    def put(self, name, data):
+        self._write(name, lambda tmp_file: tmp_file.write(data))
+
+    def get(self, name):
+        with open(self._path(name), 'rb') as f:
+            return f.read()
+
+    def delete(self, name):
+        try:
+            os.remove(self._path(name))
+        except OSError as e:
+            if e.errno != errno.ENOENT:
+                raise
+
+    def _write(self, name, write):
+        path = self._path(name)
+        if not os.path.exists(os.path.dirname(path)):
+            try:
+                os.makedirs(os.path.dirname(path))
+            except OSError:
+                if not os.path.isdir(os.path.dirname(path)):
+                    raise
+        # Write to a temporary file first, so that readers never see a
+        # partial blob.
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, 'wb') as tmp_file:
+            write(tmp_file)
+        os.rename(tmp_path, path)
+
+
+class GcsBlobStore(object):
+    """A blob store in a Google Cloud Storage bucket.
+
+    Every thread uses its own client, since the HTTP connection of a
+    gcloud client cannot be shared between threads. It requires
+    authentication be properly configured."""
+
+    def __init__(self, bucket_name, prefix=''):
+        self.bucket_name = bucket_name
+        self.prefix = prefix.strip('/')
+        self._local = threading.local()
+
+    def _blob(self, name):
+        bucket = getattr(self._local, 'bucket', None)
+        if bucket is None:
+            # gcloud is imported here, so that local runs do not pay for it.
+            from gcloud import storage
+            bucket = storage.Client().get_bucket(self.bucket_name)
+            self._local.bucket = bucket
+        if self.prefix:
+            name = self.prefix + '/' + name
+        return bucket.blob(name)
+
+    def exists(self, name):
+        return self._blob(name).exists()
+
+    def upload(self, src_path, name):
+        self._blob(name).upload_from_filename(src_path)
+
+    def download(self, name, dest_path):
+        self._blob(name).download_to_filename(dest_path)
+
+    def put(self, name, data):
+        self._blob(name).upload_from_string(
+            data, content_type='application/octet-stream')
+
+    def get(self, name):
+        return self._blob(name).download_as_string()
+
+    def delete(self, name):
+        from gcloud import exceptions
+        try:
+            self._blob(name).delete()
+        except exceptions.NotFound:
+            pass
+
+
+class _PartReader(object):
+    """Reads the parts of a file in order, from a window of parallel
+    downloads, and checks the SHA-256 of the whole file at its end."""
+
+    def __init__(self, store, name, index, workers):
+        self._store = store
+        self._name = name
+        self._index = index
+        self._workers = workers or multiprocessing.cpu_count()
+        self._pool = ThreadPool(self._workers)
+        self._downloads = collections.deque()
+        self._next_part = 0
+        self._buffer = ''
+        self._offset = 0
+        self._digest = hashlib.sha256()
+        self._start_downloads()
+
+    def read(self, size=-1):
+        chunks = []
+        while size != 0:
+            if self._offset == len(self._buffer) and not self._next_buffer():
+                break
+            end = len(self._buffer)
+            if size > 0:
+                end = min(end, self._offset + size)
+                size -= end - self._offset
+            chunks.append(self._buffer[self._offset:end])
+            self._offset = end
+        return ''.join(chunks)
+
+    def close(self):
+        self._pool.terminate()
+
+    def _start_downloads(self):
+        parts = self._index['parts']
+        while (len(self._downloads) < self._workers and
+               self._next_part < len(parts)):
+            self._downloads.append(self._pool.apply_async(
+                _retry, (_get_part, self._store, self._name,
+                         parts[self._next_part])))
+            self._next_part += 1
+
+    def _next_buffer(self):
+        if not self._downloads:
+            return False
+        self._buffer = self._downloads.popleft().get()
+        self._offset = 0
+        self._digest.update(self._buffer)
+        self._start_downloads()
+        if (not self._downloads and
+                self._digest.hexdigest() != self._index['sha256']):
+            raise IOError('Corrupted download')
+        return True
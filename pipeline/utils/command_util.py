@@ -0,0 +1,65 @@
+# Copyright 2016 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Utils to run the commands of tasks."""
+
+import collections
+import os
+import subprocess
+import time
+
+
+def run_command(args, line_callback=None, tail_lines=None, cwd=None):
+    """Runs a command in cwd and returns its output, exit code and resource
+    usage.
+
+    Stderr is merged into stdout. When line_callback is given, the output is
+    streamed: line_callback is called with every line as soon as it is read,
+    and only the last tail_lines lines are kept and returned as the output,
+    so that memory does not grow with the output of the command.
+
+    The child is reaped with os.wait4, which returns the resource usage of
+    the child alone, so that the usage of concurrent commands is not mixed.
+    """
+    start = time.time()
+    proc = subprocess.Popen(args, stdout=subprocess.PIPE,
+                            stderr=subprocess.STDOUT, cwd=cwd)
+    if line_callback:
+        tail = collections.deque(maxlen=tail_lines)
+        output_bytes = 0
+        for line in iter(proc.stdout.readline, ''):
+            output_bytes += len(line)
+            tail.append(line)
+            line_callback(line.rstrip('\n'))
+        output = ''.join(tail)
+    else:
+        output = proc.stdout.read()
+        output_bytes = len(output)
+    proc.stdout.close()
+    _, status, rusage = os.wait4(proc.pid, 0)
+    wall_secs = time.time() - start
+    if os.WIFSIGNALED(status):
+        returncode = -os.WTERMSIG(status)
+    else:
+        returncode = os.WEXITSTATUS(status)
+    # The child is reaped, so Popen must not wait for it again.
+    proc.returncode = returncode
+    usage = {'wall_secs': round(wall_secs, 3),
+             'user_secs': round(rusage.ru_utime, 3),
+             'sys_secs': round(rusage.ru_stime, 3),
+             # ru_maxrss is in kilobytes on Linux.
+             'max_rss_kb': rusage.ru_maxrss,
+             'returncode': returncode,
+             'output_bytes': output_bytes}
+    return output, returncode, usage
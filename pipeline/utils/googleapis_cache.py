@@ -0,0 +1,364 @@
+# Copyright 2016 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Host-level cache of the googleapis tree used by remote pipelines.
+
+The googleapis archive is downloaded and extracted once into a snapshot of
+the cache directory, keyed by the revision of the archive (its ETag, or the
+modification time and size of a local archive). The revision is checked
+again at most once per refresh interval, with a conditional request, and
+jobs get their googleapis directory by cloning the snapshot.
+
+The source of the archive is a URL, a local zip file or a local directory,
+so that a local file server or checkout can stand in for GitHub.
+
+The tree can also be materialized sparsely, with only the files a job reads:
+the files of its source proto directories, the protos they transitively
+import, and its config files (see sparse_selector).
+"""
+
+import contextlib
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+import urllib2
+import zipfile
+
+from pipeline.utils import proto_index
+
+DEFAULT_SOURCE = os.environ.get(
+    'ARTMAN_GOOGLEAPIS_SOURCE',
+    'https://github.com/googleapis/googleapis/archive/master.zip')
+
+# Minimum number of seconds between two checks of the archive revision.
+DEFAULT_REFRESH_SECS = 600
+
+_META_FILE = 'meta.json'
+_SNAPSHOTS_DIR = 'snapshots'
+
+
+def local_path(source):
+    """Returns the local path of source, or None if source is remote."""
+    if source.startswith('file://'):
+        return source[len('file://'):]
+    if '://' not in source:
+        return source
+    return None
+
+
+def sparse_selector(repo_dir, src_proto_path, import_proto_path,
+                    config_files, overlay_dir=None):
+    """Returns a function selecting the files of a googleapis tree a job
+    reads, for the select argument of download, extract_archive and
+    clone_tree.
+
+    The selected files are the files under the src_proto_path directories,
+    the protos they transitively import, resolved along import_proto_path
+    and src_proto_path as protoc does, and the config_files. The paths are
+    those the job uses, and only those under repo_dir are considered.
+
+    overlay_dir holds the files which will be written over the tree, e.g.
+    the --local_repo of the job. They take the place of the files of the
+    tree with the same path when walking the imports, so that the protos
+    their imports need are selected too.
+    """
+    def relative(paths):
+        rel_paths = [os.path.relpath(os.path.abspath(path), repo_dir)
+                     for path in paths or []]
+        return [path for path in rel_paths if not path.startswith('..')]
+
+    repo_dir = os.path.abspath(repo_dir)
+    src_dirs = relative(src_proto_path)
+    proto_dirs = src_dirs + relative(import_proto_path)
+    configs = relative(config_files)
+
+    overlay_names = set(_list_files(overlay_dir) if overlay_dir else [])
+
+    def select(names, read):
+        """Returns the selected files among names, the relative paths of the
+        files of the tree, reading their content with read."""
+        tree_names = set(names)
+        names = tree_names | overlay_names
+
+        def read_file(name):
+            if name in overlay_names:
+                with open(os.path.join(overlay_dir, name)) as f:
+                    return f.read()
+            return read(name)
+
+        pending = [name for name in names
+                   if any(_is_under(name, src_dir) for src_dir in src_dirs)]
+        selected = set(config for config in configs if config in names)
+        while pending:
+            name = pending.pop()
+            if name in selected:
+                continue
+            selected.add(name)
+            if name.endswith('.proto'):
+                pending.extend(_resolve_imports(
+                    proto_index.parse_imports(read_file(name)), proto_dirs,
+                    names))
+        return selected & tree_names
+
+    return select
+
+
+def _list_files(root):
+    return [os.path.relpath(os.path.join(dirpath, name), root)
+            for (dirpath, _, files) in os.walk(root) for name in files]
+
+
+def _is_under(name, directory):
+    return directory == '.' or name.startswith(directory.rstrip('/') + '/')
+
+
+def _resolve_imports(imports, proto_dirs, names):
+    resolved = []
+    for import_path in imports:
+        for proto_dir in proto_dirs:
+            candidate = os.path.normpath(os.path.join(proto_dir, import_path))
+            if candidate in names:
+                resolved.append(candidate)
+                break
+    return resolved
+
+
+def extract_archive(archive, dest_dir, select=None):
+    """Extracts the googleapis tree of a zip archive into dest_dir.
+
+    The archives of GitHub hold the tree in a single top-level directory
+    (e.g. googleapis-master), which becomes dest_dir. When select is given,
+    only the files it selects are extracted (see sparse_selector).
+    """
+    parent = os.path.dirname(os.path.abspath(dest_dir))
+    tmp_dir = tempfile.mkdtemp(dir=parent)
+    try:
+        with contextlib.closing(zipfile.ZipFile(archive, 'r')) as zip_ref:
+            prefix = _archive_prefix(zip_ref)
+            if select:
+                _extract_selected(zip_ref, prefix, tmp_dir, select)
+            else:
+                zip_ref.extractall(tmp_dir)
+        tree_dir = os.path.join(tmp_dir, prefix)
+        if not os.path.exists(tree_dir):
+            os.makedirs(tree_dir)
+        os.rename(tree_dir, dest_dir)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def _archive_prefix(zip_ref):
+    """Returns the top-level directory holding all the entries of zip_ref,
+    with a trailing slash, or '' if there is none."""
+    filenames = zip_ref.namelist()
+    roots = set(filename.split('/', 1)[0] for filename in filenames)
+    if len(roots) == 1 and all('/' in filename for filename in filenames):
+        return roots.pop() + '/'
+    return ''
+
+
+def _extract_selected(zip_ref, prefix, dest_dir, select):
+    """Extracts the entries of zip_ref selected by select, skipping the
+    others without decompressing them."""
+    infos = [info for info in zip_ref.infolist()
+             if not info.filename.endswith('/')]
+    names = dict((info.filename[len(prefix):], info) for info in infos)
+    selected = select(names.keys(), lambda name: zip_ref.read(names[name]))
+    for name in selected:
+        path = os.path.join(dest_dir, prefix, name)
+        if not os.path.exists(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, 'wb') as f:
+            f.write(zip_ref.read(names[name]))
+
+
+def download(source, dest_dir, select=None):
+    """Materializes the googleapis tree of source into dest_dir, without
+    using the cache. When select is given, only the files it selects are
+    materialized."""
+    path = local_path(source)
+    if path and os.path.isdir(path):
+        clone_tree(path, dest_dir, select=select)
+        return
+    if path:
+        extract_archive(path, dest_dir, select)
+        return
+    fd, archive = tempfile.mkstemp(
+        suffix='.zip', dir=os.path.dirname(os.path.abspath(dest_dir)))
+    os.close(fd)
+    try:
+        _fetch_url(source, archive, None)
+        extract_archive(archive, dest_dir, select)
+    finally:
+        os.remove(archive)
+
+
+def clone_tree(src_dir, dest_dir, hardlink=False, select=None):
+    """Copies src_dir to dest_dir, using copy-on-write clones where the file
+    system supports them, or hard links if hardlink is True. When select is
+    given, only the files it selects are copied.
+
+    Hard links are the cheapest, but share the files with src_dir, so they
+    must only be used when the files of dest_dir are not modified in place.
+    """
+    if select:
+        _clone_selected(src_dir, dest_dir, hardlink, select)
+    elif hardlink:
+        subprocess.check_call(['cp', '-al', src_dir, dest_dir])
+    else:
+        subprocess.check_call(['cp', '-a', '--reflink=auto', src_dir,
+                               dest_dir])
+
+
+def _clone_selected(src_dir, dest_dir, hardlink, select):
+    names = _list_files(src_dir)
+
+    def read(name):
+        with open(os.path.join(src_dir, name)) as f:
+            return f.read()
+
+    for name in select(names, read):
+        dest = os.path.join(dest_dir, name)
+        if not os.path.exists(os.path.dirname(dest)):
+            os.makedirs(os.path.dirname(dest))
+        if hardlink:
+            os.link(os.path.join(src_dir, name), dest)
+        else:
+            shutil.copy2(os.path.join(src_dir, name), dest)
+
+
+def get_snapshot(cache_dir, source=None, refresh_secs=None):
+    """Returns the directory of the cached googleapis tree of source,
+    downloading it if the cached revision is missing or out of date."""
+    source = source or DEFAULT_SOURCE
+    if refresh_secs is None:
+        refresh_secs = DEFAULT_REFRESH_SECS
+    path = local_path(source)
+    if path and os.path.isdir(path):
+        # A local directory is used as is.
+        return path
+    cache_dir = os.path.abspath(os.path.expanduser(cache_dir))
+    with _locked(cache_dir):
+        meta = _read_meta(cache_dir)
+        snapshot = None
+        if meta.get('source') == source and meta.get('snapshot'):
+            snapshot = os.path.join(cache_dir, _SNAPSHOTS_DIR,
+                                    meta['snapshot'])
+            if not os.path.isdir(snapshot):
+                snapshot = None
+        if snapshot and time.time() - meta['checked'] < refresh_secs:
+            return snapshot
+        meta = _refresh(cache_dir, source, meta if snapshot else {})
+        return os.path.join(cache_dir, _SNAPSHOTS_DIR, meta['snapshot'])
+
+
+def _refresh(cache_dir, source, meta):
+    """Checks the revision of source, and extracts it into a new snapshot if
+    it has changed. Returns the new metadata of the cache."""
+    path = local_path(source)
+    archive = None
+    if path:
+        stat = os.stat(path)
+        revision = '{0}:{1}'.format(stat.st_mtime, stat.st_size)
+        if revision != meta.get('revision'):
+            archive = path
+    else:
+        archive = os.path.join(cache_dir, 'download.zip')
+        revision = _fetch_url(source, archive, meta.get('revision'))
+        if revision is None:
+            # Not modified since the last check.
+            revision = meta['revision']
+            archive = None
+
+    if archive:
+        snapshot_name = hashlib.sha1(source + '\0' + revision).hexdigest()
+        snapshot = os.path.join(cache_dir, _SNAPSHOTS_DIR, snapshot_name)
+        if not os.path.isdir(snapshot):
+            extract_archive(archive, snapshot)
+        if archive != path:
+            os.remove(archive)
+        _prune(cache_dir, [snapshot_name, meta.get('snapshot')])
+        meta = {'source': source, 'revision': revision,
+                'snapshot': snapshot_name}
+    meta['checked'] = time.time()
+    _write_meta(cache_dir, meta)
+    return meta
+
+
+def _fetch_url(url, archive, etag):
+    """Downloads url to archive unless its ETag is etag.
+
+    Returns the revision of the downloaded archive, or None if it was not
+    modified.
+    """
+    request = urllib2.Request(url)
+    if etag:
+        request.add_header('If-None-Match', etag)
+    try:
+        response = urllib2.urlopen(request)
+    except urllib2.HTTPError as e:
+        if e.code == 304:
+            return None
+        raise
+    digest = hashlib.sha1()
+    with contextlib.closing(response), open(archive, 'wb') as f:
+        for chunk in iter(lambda: response.read(1024 * 1024), ''):
+            digest.update(chunk)
+            f.write(chunk)
+    return response.info().getheader('ETag') or digest.hexdigest()
+
+
+def _prune(cache_dir, keep):
+    """Removes the snapshots not listed in keep. The previous snapshot is
+    kept, as jobs may still be cloning it."""
+    snapshots_dir = os.path.join(cache_dir, _SNAPSHOTS_DIR)
+    for name in os.listdir(snapshots_dir):
+        if name not in keep:
+            shutil.rmtree(os.path.join(snapshots_dir, name),
+                          ignore_errors=True)
+
+
+@contextlib.contextmanager
+def _locked(cache_dir):
+    """Holds a lock on cache_dir which excludes other processes, so that
+    the archive is downloaded once when many jobs start together."""
+    snapshots_dir = os.path.join(cache_dir, _SNAPSHOTS_DIR)
+    if not os.path.exists(snapshots_dir):
+        os.makedirs(snapshots_dir)
+    with open(os.path.join(cache_dir, '.lock'), 'w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _read_meta(cache_dir):
+    try:
+        with open(os.path.join(cache_dir, _META_FILE)) as f:
+            return json.load(f)
+    except (IOError, ValueError):
+        return {}
+
+
+def _write_meta(cache_dir, meta):
+    tmp_path = os.path.join(cache_dir, _META_FILE + '.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(meta, f)
+    os.rename(tmp_path, os.path.join(cache_dir, _META_FILE))
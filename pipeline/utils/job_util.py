@@ -14,11 +14,13 @@
 """Util class for job-related operations.
 """
 
-import contextlib
+import json
 import os
+import threading
 import time
 
 from taskflow import engines
+from taskflow import exceptions
 from taskflow import states
 from taskflow.persistence import logbook
 from oslo_utils import uuidutils
@@ -28,60 +30,210 @@ from pipeline.utils import backend_helper
 # TODO(cbao): Include machine name
 POSTER_NAME = "poster-%s" % os.getpid()
 
+# ZooKeeper paths of the flow and atom details of the persistence backend.
+_FLOW_DETAILS_PATH = backend_helper.PERSISTENCE_CONF['path'] + '/flow_details'
+_ATOM_DETAILS_PATH = backend_helper.PERSISTENCE_CONF['path'] + '/atom_details'
 
-def post_remote_pipeline_job_and_wait(pipeline, jobboard_name):
-    """Post a pipeline job and wait until it is finished."""
-    my_name = POSTER_NAME
-    print("Starting poster with name: %s" % my_name)
-    persist_backend = backend_helper.default_persistence_backend()
-    with contextlib.closing(persist_backend):
-        with contextlib.closing(persist_backend.get_connection()) as conn:
-            conn.upgrade()
-        jobboard = backend_helper.get_jobboard(my_name, jobboard_name)
-        jobboard.connect()
-        with contextlib.closing(jobboard):
-            # Create information in the persistence backend about the
-            # unit of work we want to complete and the factory that
-            # can be called to create the tasks that the work unit needs
-            # to be done.
-            lb = logbook.LogBook("post-from-%s" % my_name)
-            flow_uuid = uuidutils.generate_uuid()
-            fd = logbook.FlowDetail("flow-of-%s" % my_name, flow_uuid)
-            lb.add(fd)
-            with contextlib.closing(persist_backend.get_connection()) as conn:
-                conn.save_logbook(lb)
-
-            engines.save_factory_details(fd,
-                                         pipeline_factory.make_pipeline_flow,
-                                         [pipeline.name, True],
-                                         pipeline.kwargs,
-                                         backend=persist_backend)
-            # Post, and be done with it!
-            jb = jobboard.post("job-from-%s" % my_name, book=lb)
-            print("Posted: %s" % jb)
-            # TODO(cbao): Move wait until into a seperate method.
-            state = states.UNCLAIMED
-            print 'Job status: %s' % state
-            while state != states.COMPLETE:
-                if (jb.state != state):
-                    state = jb.state
-                    print 'Job status: %s' % state
-                time.sleep(1)
-            return jb
+
+def post_remote_pipeline_job_and_wait(pipeline, jobboard_name, timeout=None,
+                                      progress=None):
+    """Post a pipeline job and wait until it is finished.
+
+    See wait_for_job for timeout and progress.
+    """
+    with JobSession(jobboard_name) as session:
+        jb = session.post(pipeline)
+        session.wait(jb, timeout=timeout, progress=progress)
+        return jb
 
 
 def fetch_job_status(jb, jobboard_name):
-    result = []
-    my_name = POSTER_NAME
-    persist_backend = backend_helper.default_persistence_backend()
-    with contextlib.closing(persist_backend):
-        with contextlib.closing(persist_backend.get_connection()) as conn:
-            conn.upgrade()
-        jobboard = backend_helper.get_jobboard(my_name, jobboard_name)
-        jobboard.connect()
-        with contextlib.closing(jobboard):
-            with contextlib.closing(persist_backend.get_connection()) as conn:
-                for flow in jb.book:
-                    flow_detail = conn.get_flow_details(flow.uuid)
-                    result += flow_detail
-    return result, flow_detail
+    with JobSession(jobboard_name) as session:
+        return session.result(jb)
+
+
+class JobSession(object):
+    """A connection to the persistence backend and to a jobboard, shared by
+    all the jobs a process posts and checks.
+
+    The connections are set up, and the persistence schema upgraded, once
+    for the lifetime of the session (only the watches of wait use a
+    connection of their own), e.g.
+
+        with job_util.JobSession(jobboard_name) as session:
+            jb = session.post(pipeline)
+            session.wait(jb)
+            task_details, flow_detail = session.result(jb)
+    """
+
+    def __init__(self, jobboard_name, name=POSTER_NAME):
+        self.name = name
+        print("Starting poster with name: %s" % name)
+        self._persist_backend = backend_helper.default_persistence_backend()
+        self._conn = self._persist_backend.get_connection()
+        self._conn.upgrade()
+        self._jobboard = backend_helper.get_jobboard(
+            name, jobboard_name, persistence=self._persist_backend)
+        self._jobboard.connect()
+        # Flow uuids of the jobs posted by the session, keyed by job uuid.
+        self._flow_uuids = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        self._jobboard.close()
+        self._conn.close()
+        self._persist_backend.close()
+
+    def post(self, pipeline):
+        """Posts a job running pipeline remotely, and returns the job."""
+        # Create information in the persistence backend about the
+        # unit of work we want to complete and the factory that
+        # can be called to create the tasks that the work unit needs
+        # to be done.
+        lb = logbook.LogBook("post-from-%s" % self.name)
+        flow_uuid = uuidutils.generate_uuid()
+        fd = logbook.FlowDetail("flow-of-%s" % self.name, flow_uuid)
+        lb.add(fd)
+        self._conn.save_logbook(lb)
+
+        engines.save_factory_details(fd,
+                                     pipeline_factory.make_pipeline_flow,
+                                     [pipeline.name, True],
+                                     pipeline.kwargs,
+                                     backend=self._persist_backend)
+        # Post, and be done with it!
+        jb = self._jobboard.post("job-from-%s" % self.name, book=lb)
+        print("Posted: %s" % jb)
+        self._flow_uuids[jb.uuid] = flow_uuid
+        return jb
+
+    def wait(self, jb, timeout=None, progress=None):
+        """Waits until jb is complete (see wait_for_job). The task
+        transitions are printed unless progress is given."""
+        flow_uuid = self._flow_uuids.get(jb.uuid)
+        if flow_uuid is None and jb.book:
+            flow_uuid = next(iter(jb.book)).uuid
+        wait_for_job(jb, flow_uuid, timeout=timeout,
+                     progress=progress or _print_progress)
+
+    def status(self, jb):
+        """Returns the state of jb: UNCLAIMED, CLAIMED or COMPLETE."""
+        return jb.state
+
+    def result(self, jb):
+        """Returns the details of the tasks of jb, and of its flow."""
+        result = []
+        flow_detail = None
+        for flow in jb.book:
+            flow_detail = self._conn.get_flow_details(flow.uuid)
+            result += flow_detail
+        return result, flow_detail
+
+
+def wait_for_job(jb, flow_uuid=None, timeout=None, progress=None):
+    """Waits until jb is complete.
+
+    Instead of polling the job, the poster is woken up by ZooKeeper watches
+    on the job and on its lock. If progress is given, it is called with the
+    name and the new state of every task of the flow flow_uuid when the task
+    changes state. Raises JobFailure if the job is not complete after
+    timeout seconds.
+    """
+    # The watches are set on a client of their own, which is closed once the
+    # job is complete: the watches of a completed job would otherwise never
+    # fire again, and so never be removed from a long-lived client.
+    client = backend_helper.zookeeper_client()
+    client.start()
+    try:
+        _wait_for_job(jb, _JobWatcher(client, jb, flow_uuid, progress),
+                      timeout)
+    finally:
+        client.stop()
+        client.close()
+
+
+def _wait_for_job(jb, watcher, timeout):
+    deadline = time.time() + timeout if timeout is not None else None
+    state = None
+    try:
+        while True:
+            version = watcher.version
+            new_state = jb.state
+            if new_state != state:
+                state = new_state
+                print 'Job status: %s' % state
+            if state == states.COMPLETE:
+                return
+            if deadline is not None and time.time() >= deadline:
+                raise exceptions.JobFailure(
+                    'Job %s is not complete after %s secs' % (jb, timeout))
+            watcher.wait(version, deadline)
+    finally:
+        watcher.stop()
+
+
+def _print_progress(task_name, state):
+    print "Task '%s' transition to state %s" % (task_name, state)
+
+
+class _JobWatcher(object):
+    """Watches the nodes of a job, and of the tasks of its flow, counting
+    the changes of the job and reporting the task transitions."""
+
+    def __init__(self, client, jb, flow_uuid, progress):
+        self._client = client
+        self._progress = progress
+        self._cond = threading.Condition()
+        self._stopped = False
+        self._atom_states = {}
+        self.version = 0
+        client.DataWatch(jb.path, self._on_job_change)
+        client.DataWatch(jb.lock_path, self._on_job_change)
+        if progress and flow_uuid:
+            client.ChildrenWatch(_FLOW_DETAILS_PATH + '/' + flow_uuid,
+                                 self._on_atoms)
+
+    def wait(self, version, deadline):
+        """Waits until the job changed since version, or until deadline."""
+        with self._cond:
+            while self.version == version:
+                remaining = 1.0
+                if deadline is not None:
+                    remaining = min(remaining, deadline - time.time())
+                    if remaining <= 0:
+                        return
+                # Wait in slices, so that the poster can be interrupted.
+                self._cond.wait(remaining)
+
+    def stop(self):
+        # The watches stop at their next firing, or when the client is closed.
+        self._stopped = True
+
+    def _on_job_change(self, data, stat):
+        with self._cond:
+            self.version += 1
+            self._cond.notify_all()
+        return not self._stopped
+
+    def _on_atoms(self, children):
+        for atom_uuid in children:
+            if atom_uuid not in self._atom_states:
+                self._atom_states[atom_uuid] = None
+                self._client.DataWatch(_ATOM_DETAILS_PATH + '/' + atom_uuid,
+                                       self._atom_watch(atom_uuid))
+        return not self._stopped
+
+    def _atom_watch(self, atom_uuid):
+        def on_atom_change(data, stat):
+            if data:
+                atom = json.loads(data)['atom']
+                if atom['state'] != self._atom_states[atom_uuid]:
+                    self._atom_states[atom_uuid] = atom['state']
+                    self._progress(atom['name'], atom['state'])
+            return not self._stopped
+        return on_atom_change
@@ -0,0 +1,167 @@
+# Copyright 2016 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Batched, asynchronous sink of the remote pipeline logs.
+
+Tasks queue their log entries in the process-wide sink, which returns
+immediately. A background thread writes the queued entries in batches, when
+max_entries or max_bytes are queued or flush_interval seconds have passed,
+and tasks flush the sink when they finish. The entries are written to Cloud
+Logging, or to a local file when ARTMAN_LOG_SINK is set to file:<path>, e.g.
+to benchmark the sink offline.
+"""
+
+import atexit
+import json
+import os
+import threading
+import time
+import traceback
+
+_sink = None
+_sink_lock = threading.Lock()
+
+
+def get_sink():
+    """Returns the sink shared by all the tasks of the process."""
+    global _sink
+    with _sink_lock:
+        if _sink is None:
+            _sink = BatchingSink(_default_writer())
+            atexit.register(_sink.flush)
+        return _sink
+
+
+def set_sink(sink):
+    """Replaces the shared sink, flushing the previous one."""
+    global _sink
+    with _sink_lock:
+        previous, _sink = _sink, sink
+    if previous:
+        previous.flush()
+
+
+def _default_writer():
+    target = os.environ.get('ARTMAN_LOG_SINK', '')
+    if target.startswith('file:'):
+        return FileWriter(target[len('file:'):])
+    return CloudLoggingWriter()
+
+
+class CloudLoggingWriter(object):
+    """Writes log entries to Cloud Logging, one API call per batch."""
+
+    def __init__(self):
+        self._client = None
+
+    def write(self, logger_name, texts):
+        if self._client is None:
+            from gcloud import logging as cloud_logging
+            self._client = cloud_logging.Client()
+        batch = self._client.logger(logger_name).batch()
+        for text in texts:
+            batch.log_text(text)
+        batch.commit()
+
+
+class FileWriter(object):
+    """Appends log entries to a local file, as JSON lines."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def write(self, logger_name, texts):
+        with open(self.path, 'a') as f:
+            for text in texts:
+                f.write(json.dumps({'logger': logger_name, 'text': text}))
+                f.write('\n')
+
+
+class BatchingSink(object):
+
+    def __init__(self, writer, max_entries=500, max_bytes=1024 * 1024,
+                 flush_interval=2.0):
+        self.writer = writer
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.flush_interval = flush_interval
+        self._cond = threading.Condition()
+        # Entries queued but not yet taken by the flusher, as
+        # (logger name, text) pairs, and their total size.
+        self._pending = []
+        self._pending_bytes = 0
+        # Number of entries queued, and written (or dropped on error).
+        self._queued = 0
+        self._written = 0
+        self._flush_requested = False
+        self._thread = threading.Thread(target=self._run,
+                                        name='log-sink-flusher')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def log(self, logger_name, text):
+        """Queues a log entry, without waiting for it to be written."""
+        with self._cond:
+            self._pending.append((logger_name, text))
+            self._pending_bytes += len(text)
+            self._queued += 1
+            if (len(self._pending) >= self.max_entries or
+                    self._pending_bytes >= self.max_bytes):
+                self._cond.notify_all()
+
+    def flush(self):
+        """Waits until the entries queued so far are written."""
+        with self._cond:
+            target = self._queued
+            self._flush_requested = True
+            self._cond.notify_all()
+            while self._written < target:
+                self._cond.wait()
+
+    def _take_batch(self):
+        """Waits until a batch is due, then takes the pending entries."""
+        with self._cond:
+            deadline = time.time() + self.flush_interval
+            while not self._batch_due() and time.time() < deadline:
+                self._cond.wait(max(deadline - time.time(), 0))
+            entries, self._pending = self._pending, []
+            self._pending_bytes = 0
+            self._flush_requested = False
+            return entries
+
+    def _batch_due(self):
+        return (self._flush_requested or
+                len(self._pending) >= self.max_entries or
+                self._pending_bytes >= self.max_bytes)
+
+    def _run(self):
+        while True:
+            entries = self._take_batch()
+            if entries:
+                self._write(entries)
+            with self._cond:
+                self._written += len(entries)
+                self._cond.notify_all()
+
+    def _write(self, entries):
+        batches = {}
+        for (logger_name, text) in entries:
+            batches.setdefault(logger_name, []).append(text)
+        for (logger_name, texts) in batches.iteritems():
+            try:
+                self.writer.write(logger_name, texts)
+            except Exception:
+                # Logging must never fail the pipeline; the entries are
+                # still printed locally by the tasks.
+                traceback.print_exc()
@@ -0,0 +1,132 @@
+# Copyright 2016 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Process-wide resolution of executables along PATH.
+
+The directories of PATH are listed once, and the locations of the
+executables are cached for the whole process instead
+of spawning `which` for every lookup. The index is rebuilt when PATH
+changes, and a directory is listed again when an executable is not found
+and the directory changed since it was listed, e.g. after a requirement was
+installed.
+"""
+
+import os
+import threading
+
+_lock = threading.Lock()
+
+# The PATH the index was built for, the modification time of its
+# directories when they were listed, and the directories holding each name,
+# in PATH order.
+_indexed_path = None
+_dir_mtimes = {}
+_index = {}
+
+# Resolved locations keyed by name.
+_locations = {}
+
+
+def which(name):
+    """Returns the path of the executable name along PATH, or None if there
+    is none."""
+    return which_all([name])[name]
+
+
+def which_all(names):
+    """Returns a dict mapping each of names to the path of the executable
+    along PATH, or None, resolving them in one batch."""
+    with _lock:
+        _check_path()
+        result = dict((name, _resolve(name)) for name in names)
+        missing = [name for name in names if result[name] is None]
+        if missing and _rescan_changed_dirs():
+            result.update((name, _resolve(name)) for name in missing)
+        return result
+
+
+def _check_path():
+    global _indexed_path
+    path = os.environ.get('PATH', os.defpath)
+    if path != _indexed_path:
+        _indexed_path = path
+        _dir_mtimes.clear()
+        _index.clear()
+        _locations.clear()
+        for directory in _path_dirs():
+            _list_dir(directory)
+
+
+def _path_dirs():
+    dirs = []
+    for directory in _indexed_path.split(os.pathsep):
+        directory = directory or os.curdir
+        if directory not in dirs:
+            dirs.append(directory)
+    return dirs
+
+
+def _list_dir(directory):
+    try:
+        _dir_mtimes[directory] = os.stat(directory).st_mtime
+        names = os.listdir(directory)
+    except OSError:
+        _dir_mtimes[directory] = None
+        return
+    for name in names:
+        dirs = _index.setdefault(name, [])
+        if directory not in dirs:
+            dirs.append(directory)
+
+
+def _rescan_changed_dirs():
+    """Lists the directories of PATH which changed again. Returns whether
+    any did."""
+    changed = False
+    for directory in _path_dirs():
+        try:
+            mtime = os.stat(directory).st_mtime
+        except OSError:
+            mtime = None
+        if mtime != _dir_mtimes.get(directory):
+            _list_dir(directory)
+            changed = True
+    if changed:
+        # The order of the directories of a name may have changed.
+        order = dict((d, i) for (i, d) in enumerate(_path_dirs()))
+        for dirs in _index.itervalues():
+            dirs.sort(key=order.get)
+        _locations.clear()
+    return changed
+
+
+def _resolve(name):
+    if os.sep in name:
+        return name if _is_executable(name) else None
+    location = _locations.get(name)
+    if location is not None and not _is_executable(location):
+        # Removed since it was resolved.
+        del _locations[name]
+    if name not in _locations:
+        _locations[name] = None
+        for directory in _index.get(name, []):
+            path = os.path.join(directory, name)
+            if _is_executable(path):
+                _locations[name] = path
+                break
+    return _locations[name]
+
+
+def _is_executable(path):
+    return os.path.isfile(path) and os.access(path, os.X_OK)
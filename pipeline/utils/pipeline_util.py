@@ -13,13 +13,18 @@
 # limitations under the License.
 """Utils related to pipeline"""
 
+import contextlib
+import hashlib
 import os
+import shutil
+import StringIO
 import subprocess
+import tarfile
+import tempfile
 import urlparse
 
 from pipeline.tasks import io_tasks
-from taskflow import engines
-from taskflow.patterns import linear_flow
+from pipeline.utils import blob_store
 
 
 def validate_exists(required, **kwargs):
@@ -41,9 +46,104 @@ def task_transition(state, details):
     print("Task '%s' transition to state %s" % (details['task_name'], state))
 
 
-def download_from_gcs(bucket_name, path, output_dir):
-    flow = linear_flow.Flow('download_from_gcs')
-    args = {'bucket_name': bucket_name, 'path': path, 'output_dir': output_dir}
-    flow.add(io_tasks.BlobDownloadTask('BlobDownload'))
-    engine = engines.load(flow, engine="serial", store=args)
-    engine.run()
+def download_results(bucket_name, path, output_dir, result_store=None):
+    """Extracts the result archive uploaded by BlobUploadTask into
+    output_dir, while it is downloaded, and then removes it from the store.
+
+    Returns the number of files written and of files left unchanged.
+    """
+    store = blob_store.get_store(result_store or 'gs://' + bucket_name)
+    reader = blob_store.open_file(store, path)
+    try:
+        counts = extract_results(reader, output_dir)
+    finally:
+        reader.close()
+    blob_store.delete_file(store, path)
+    return counts
+
+
+def extract_results(fileobj, output_dir):
+    """Extracts the result archive read from fileobj into output_dir, in one
+    pass. The files whose content is already in output_dir are not written
+    again.
+
+    The members which would be written outside of output_dir, through their
+    name or through a link already extracted, are skipped, as well as the
+    links to a target outside of output_dir and the special files.
+
+    Returns the number of files written and of files left unchanged.
+    """
+    output_dir = os.path.realpath(output_dir)
+    written = unchanged = 0
+    with contextlib.closing(tarfile.open(fileobj=fileobj, mode='r|gz')) as tar:
+        for member in tar:
+            path = _resolve_member_path(output_dir, member.name)
+            if (member.name == io_tasks.PrepareUploadDirTask.MANIFEST_NAME or
+                    path is None):
+                continue
+            if member.isfile():
+                if _write_if_changed(tar.extractfile(member), member, path):
+                    written += 1
+                else:
+                    unchanged += 1
+            elif member.isdir():
+                if not os.path.isdir(path):
+                    os.makedirs(path)
+            elif member.issym() or member.islnk():
+                _extract_link(output_dir, member, path)
+    return written, unchanged
+
+
+def _is_within(output_dir, path):
+    return path == output_dir or path.startswith(output_dir + os.sep)
+
+
+def _resolve_member_path(output_dir, name):
+    """Returns the path where the member name is extracted, with the links
+    in its directory resolved, or None if it is not within output_dir."""
+    path = os.path.normpath(os.path.join(output_dir, name))
+    parent = os.path.realpath(os.path.dirname(path))
+    if path == output_dir or not _is_within(output_dir, parent):
+        return None
+    return os.path.join(parent, os.path.basename(path))
+
+
+def _extract_link(output_dir, member, path):
+    """Extracts the symbolic or hard link member at path, unless its target
+    is outside of output_dir."""
+    if member.issym():
+        target = os.path.join(os.path.dirname(path), member.linkname)
+    else:
+        target = _resolve_member_path(output_dir, member.linkname)
+    if (os.path.isabs(member.linkname) or target is None or
+            not _is_within(output_dir, os.path.realpath(target))):
+        print 'Skipped the link %s to %s outside of %s' % (
+            member.name, member.linkname, output_dir)
+        return
+    if not os.path.isdir(os.path.dirname(path)):
+        os.makedirs(os.path.dirname(path))
+    if os.path.lexists(path):
+        os.remove(path)
+    if member.issym():
+        os.symlink(member.linkname, path)
+    else:
+        os.link(target, path)
+
+
+def _write_if_changed(src, member, path):
+    """Writes the content of member, read from src, to path unless path has
+    the same content already. Returns whether path was written."""
+    if os.path.isfile(path) and os.path.getsize(path) == member.size:
+        # Only a file of the same size can have the same content.
+        data = src.read()
+        if blob_store.hash_file(path) == hashlib.sha256(data).hexdigest():
+            return False
+        src = StringIO.StringIO(data)
+    if not os.path.isdir(os.path.dirname(path)):
+        os.makedirs(os.path.dirname(path))
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+    with os.fdopen(fd, 'wb') as f:
+        shutil.copyfileobj(src, f)
+    os.chmod(tmp_path, member.mode)
+    os.rename(tmp_path, path)
+    return True
@@ -0,0 +1,157 @@
+# Copyright 2016 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Index of the import graph of proto files.
+
+The index records the content hash and the imports of every proto file it has
+read, and is persisted in the output directory of the pipeline. From it, the
+digest of the transitive closure of a set of protos tells whether any of them,
+or any proto they import, has changed since a protoc target was generated. The
+index also records the files generated in an output directory, so that
+targets whose outputs were removed are generated again.
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+
+INDEX_FILE = '.proto_index.json'
+
+_IMPORT_RE = re.compile(
+    r'^\s*import\s+(?:public\s+|weak\s+)?"([^"]+)"\s*;', re.MULTILINE)
+
+# Serializes the updates of the index files written by this process.
+_save_lock = threading.Lock()
+
+
+def parse_imports(content):
+    """Returns the import paths declared in the content of a proto file."""
+    return _IMPORT_RE.findall(content)
+
+
+class ProtoIndex(object):
+
+    def __init__(self, output_dir, proto_paths):
+        """Loads the index of output_dir.
+
+        Args:
+            output_dir: the directory the index is persisted in.
+            proto_paths: the proto search paths, in the order given to protoc,
+                which are used to resolve imports.
+        """
+        self.path = os.path.join(output_dir, INDEX_FILE)
+        self._proto_paths = proto_paths
+        data = self._read()
+        self._files = data['files']
+        self._targets = data['targets']
+        self._outputs = data.get('outputs', {})
+        self._recorded = {}
+        self._recorded_outputs = {}
+
+    def _read(self):
+        if os.path.isfile(self.path):
+            try:
+                with open(self.path) as f:
+                    return json.load(f)
+            except ValueError:
+                # A corrupt index is rebuilt from scratch.
+                pass
+        return {'files': {}, 'targets': {}, 'outputs': {}}
+
+    def _entry(self, proto):
+        """Returns the hash and imports of a proto, reading it only if it has
+        changed since it was indexed."""
+        stat = os.stat(proto)
+        entry = self._files.get(proto)
+        if (entry and entry['mtime'] == stat.st_mtime and
+                entry['size'] == stat.st_size):
+            return entry
+        with open(proto) as f:
+            content = f.read()
+        entry = {'mtime': stat.st_mtime,
+                 'size': stat.st_size,
+                 'hash': hashlib.sha1(content).hexdigest(),
+                 'imports': parse_imports(content)}
+        self._files[proto] = entry
+        return entry
+
+    def resolve(self, import_path):
+        """Returns the file an import refers to, or None if it is not found
+        along the proto paths."""
+        for proto_path in self._proto_paths:
+            candidate = os.path.normpath(os.path.join(proto_path, import_path))
+            if os.path.isfile(candidate):
+                return candidate
+        return None
+
+    def imports(self, proto):
+        """Returns the files directly imported by a proto."""
+        resolved = [self.resolve(imp) for imp in self._entry(proto)['imports']]
+        return [imp for imp in resolved if imp]
+
+    def closure(self, protos):
+        """Returns the protos and all the files they transitively import."""
+        result = set()
+        pending = [os.path.normpath(proto) for proto in protos]
+        while pending:
+            proto = pending.pop()
+            if proto not in result:
+                result.add(proto)
+                pending.extend(self.imports(proto))
+        return result
+
+    def closure_digest(self, protos, params=None):
+        """Returns a digest of the content of the transitive closure of protos,
+        combined with the protoc params used to compile them."""
+        digest = hashlib.sha1(json.dumps(params))
+        for proto in sorted(self.closure(protos)):
+            digest.update(proto + '\0' + self._entry(proto)['hash'] + '\0')
+        return digest.hexdigest()
+
+    def is_current(self, target, digest):
+        """Returns True if target was last generated from the same digest."""
+        return self._targets.get(target) == digest
+
+    def record(self, target, digest):
+        self._targets[target] = digest
+        self._recorded[target] = digest
+
+    def record_outputs(self, name, paths):
+        """Records the files generated under name, e.g. an output
+        directory."""
+        self._outputs[name] = sorted(paths)
+        self._recorded_outputs[name] = self._outputs[name]
+
+    def outputs_exist(self, name):
+        """Returns True if the files recorded under name all still exist."""
+        return (name in self._outputs and
+                all(os.path.exists(path) for path in self._outputs[name]))
+
+    def save(self):
+        """Writes the index, merged with the targets recorded by other tasks
+        since it was loaded."""
+        with _save_lock:
+            data = self._read()
+            data['files'].update(self._files)
+            data['targets'].update(self._recorded)
+            data.setdefault('outputs', {}).update(self._recorded_outputs)
+            index_dir = os.path.dirname(self.path)
+            if not os.path.exists(index_dir):
+                os.makedirs(index_dir)
+            tmp_path = '{0}.{1}.tmp'.format(self.path, os.getpid())
+            with open(tmp_path, 'w') as f:
+                json.dump(data, f)
+            os.rename(tmp_path, self.path)
@@ -0,0 +1,96 @@
+# Copyright 2016 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Resource accounting of the commands run by tasks.
+
+A ResourceReport records, for every command run by the tasks of a pipeline,
+the wall time, the user and system CPU time, the maximum resident set size,
+the exit code and the output size of the child process, as measured by
+command_util.run_command. Every record is appended to the report file as one
+JSON line, tagged with the id of the pipeline, so that several pipelines can
+share a report file. read_report aggregates the records per pipeline and per
+task. A report keeps no record in memory, so that a long-running conductor
+does not accumulate the usage of the pipelines it has run.
+"""
+
+import json
+import os
+import threading
+
+# Serializes the appends of this process to the report files.
+_write_lock = threading.Lock()
+
+
+def get_report(report_path, pipeline_id=None):
+    """Returns a ResourceReport of the pipeline pipeline_id writing
+    report_path."""
+    return ResourceReport(os.path.abspath(os.path.expanduser(report_path)),
+                          pipeline_id)
+
+
+def read_report(report_path):
+    """Returns the records of report_path aggregated per pipeline id: the
+    usage per task and in total, and the records of every command."""
+    pipelines = {}
+    with open(report_path) as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                pipelines.setdefault(record['pipeline'], []).append(record)
+    return dict((pipeline_id, _summarize(records))
+                for (pipeline_id, records) in pipelines.iteritems())
+
+
+def _aggregate(records):
+    return {'commands': len(records),
+            'wall_secs': round(sum(r['wall_secs'] for r in records), 3),
+            'user_secs': round(sum(r['user_secs'] for r in records), 3),
+            'sys_secs': round(sum(r['sys_secs'] for r in records), 3),
+            'max_rss_kb': max([r['max_rss_kb'] for r in records] or [0]),
+            'output_bytes': sum(r['output_bytes'] for r in records),
+            'failed': len([r for r in records if r['returncode']])}
+
+
+def _summarize(records):
+    tasks = {}
+    for record in records:
+        tasks.setdefault(record['task'], []).append(record)
+    return {'total': _aggregate(records),
+            'tasks': dict((name, _aggregate(task_records))
+                          for (name, task_records) in tasks.iteritems()),
+            'commands': records}
+
+
+class ResourceReport(object):
+
+    def __init__(self, path, pipeline_id=None):
+        self.path = path
+        self.pipeline_id = pipeline_id
+
+    def record(self, task_name, args, usage):
+        """Records the resource usage of a command run by task_name."""
+        record = dict(usage, pipeline=self.pipeline_id, task=task_name,
+                      command=' '.join(args))
+        self._append(record)
+
+    def _append(self, record):
+        line = json.dumps(record, sort_keys=True) + '\n'
+        with _write_lock:
+            report_dir = os.path.dirname(self.path)
+            if not os.path.exists(report_dir):
+                os.makedirs(report_dir)
+            # A single write in append mode, so that the lines of processes
+            # sharing the report are not interleaved.
+            with open(self.path, 'a') as f:
+                f.write(line)
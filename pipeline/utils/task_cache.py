@@ -0,0 +1,294 @@
+# Copyright 2016 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Content-addressed cache of task outputs.
+
+A task result is stored under a key which hashes the content of the task's
+input files, its input kwargs and the fingerprints of the tools it runs. When
+a task runs again with the same key, its output file or directory is copied
+back from the cache instead of being generated again. The least recently used
+entries are evicted when the cache grows beyond its maximum size.
+"""
+
+import errno
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import uuid
+
+from pipeline.utils import path_resolver
+
+# Default maximum size of a cache directory, in bytes.
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+
+_OUTPUT_NAME = 'output'
+
+# TaskCache instances keyed by cache directory.
+_caches = {}
+_caches_lock = threading.Lock()
+
+# The directories of the toolkit which are not sources: its git metadata and
+# its build outputs.
+_TOOLKIT_SKIPPED_DIRS = ['.git', '.gradle', 'build']
+
+# The fingerprints of the toolkits, keyed by path, with the size and
+# modification time of their files when they were hashed.
+_toolkit_fingerprints = {}
+
+
+def get_cache(cache_dir, max_bytes=None):
+    """Returns the TaskCache shared by all tasks using cache_dir."""
+    cache_dir = os.path.abspath(os.path.expanduser(cache_dir))
+    with _caches_lock:
+        if cache_dir not in _caches:
+            _caches[cache_dir] = TaskCache(cache_dir, max_bytes)
+        return _caches[cache_dir]
+
+
+def executable_fingerprint(name):
+    """Fingerprints an executable on the PATH by its location, size and
+    modification time, without running it."""
+    path = path_resolver.which(name)
+    if not path:
+        return '%s:missing' % name
+    stat = os.stat(os.path.realpath(path))
+    return '%s:%s:%d:%d' % (name, path, stat.st_size, int(stat.st_mtime))
+
+
+def toolkit_fingerprint(toolkit_path):
+    """Fingerprints the toolkit by the content of its sources and build
+    files, committed or not.
+
+    The files are hashed again only when the size or modification time of
+    one of them changed since the last fingerprint of the same toolkit.
+    """
+    toolkit_path = os.path.abspath(toolkit_path)
+    files = []
+    for root, dirs, names in os.walk(toolkit_path):
+        dirs[:] = sorted(d for d in dirs if not (
+            root == toolkit_path and d in _TOOLKIT_SKIPPED_DIRS))
+        for name in sorted(names):
+            stat = os.stat(os.path.join(root, name))
+            files.append((os.path.relpath(os.path.join(root, name),
+                                          toolkit_path),
+                          stat.st_size, stat.st_mtime))
+    with _caches_lock:
+        cached = _toolkit_fingerprints.get(toolkit_path)
+    if cached and cached[0] == files:
+        return cached[1]
+    fingerprint = 'toolkit:' + hash_paths(
+        [os.path.join(toolkit_path, path) for (path, _, _) in files])
+    with _caches_lock:
+        _toolkit_fingerprints[toolkit_path] = (files, fingerprint)
+    return fingerprint
+
+
+def hash_paths(paths, suffix=None):
+    """Hashes the content of the given files and directories.
+
+    Directories are walked in a stable order. When suffix is given, only the
+    files whose name ends with it are hashed.
+    """
+    digest = hashlib.sha1()
+    for path in paths:
+        digest.update(path + '\0')
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for name in sorted(files):
+                    if suffix and not name.endswith(suffix):
+                        continue
+                    file_path = os.path.join(root, name)
+                    digest.update(os.path.relpath(file_path, path) + '\0')
+                    _update_with_file(digest, file_path)
+        else:
+            _update_with_file(digest, path)
+    return digest.hexdigest()
+
+
+def _update_with_file(digest, path):
+    if not os.path.isfile(path):
+        digest.update('missing\0')
+        return
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), ''):
+            digest.update(chunk)
+    digest.update('\0')
+
+
+def _copy(src, dest):
+    """Copies a file, or merges a directory tree into dest."""
+    if not os.path.isdir(src):
+        dest_dir = os.path.dirname(dest)
+        if dest_dir and not os.path.exists(dest_dir):
+            os.makedirs(dest_dir)
+        shutil.copy2(src, dest)
+        return
+    for root, _, files in os.walk(src):
+        dest_root = os.path.join(dest, os.path.relpath(root, src))
+        if not os.path.exists(dest_root):
+            os.makedirs(dest_root)
+        for name in files:
+            shutil.copy2(os.path.join(root, name),
+                         os.path.join(dest_root, name))
+
+
+def _replace(src, dest):
+    """Replaces dest with a copy of src. The copy is made aside and renamed,
+    so that no file of a previous dest survives."""
+    parent = os.path.dirname(os.path.abspath(dest))
+    if not os.path.exists(parent):
+        os.makedirs(parent)
+    if not os.path.isdir(src):
+        fd, tmp_path = tempfile.mkstemp(dir=parent)
+        os.close(fd)
+        try:
+            shutil.copy2(src, tmp_path)
+            os.rename(tmp_path, dest)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return
+    tmp_dir = tempfile.mkdtemp(dir=parent)
+    trash = '{0}.old-{1}'.format(dest, uuid.uuid4().hex)
+    try:
+        _copy(src, tmp_dir)
+        shutil.copystat(src, tmp_dir)
+        if os.path.lexists(dest):
+            os.rename(dest, trash)
+        os.rename(tmp_dir, dest)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        shutil.rmtree(trash, ignore_errors=True)
+
+
+def _size(path):
+    if not os.path.isdir(path):
+        return os.path.getsize(path)
+    total = 0
+    for root, _, files in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(root, name))
+                     for name in files)
+    return total
+
+
+class TaskCache(object):
+
+    def __init__(self, cache_dir, max_bytes=None):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes or DEFAULT_MAX_BYTES
+        self._lock = threading.Lock()
+
+    def key(self, task_kind, input_files, input_kwargs, tools):
+        """Returns the cache key of a task run.
+
+        Args:
+            task_kind: the name of the task class.
+            input_files: the files and directories the task reads.
+            input_kwargs: a JSON serializable dict of the other inputs.
+            tools: the fingerprints of the tools the task runs.
+        """
+        digest = hashlib.sha1()
+        digest.update(json.dumps([task_kind, sorted(tools), input_kwargs],
+                                 sort_keys=True))
+        digest.update(hash_paths(sorted(input_files)))
+        return digest.hexdigest()
+
+    def restore(self, key, output):
+        """Replaces output with the cached output of key.
+
+        Returns True if the key was found in the cache.
+        """
+        entry = self._entry_dir(key)
+        cached = os.path.join(entry, _OUTPUT_NAME)
+        if not os.path.exists(cached):
+            return False
+        try:
+            # The modification time of the entry records its last use.
+            os.utime(entry, None)
+            _replace(cached, output)
+        except (IOError, OSError):
+            # The entry was evicted while being restored.
+            return False
+        return True
+
+    def save(self, key, output):
+        """Stores output in the cache under key, then evicts the least
+        recently used entries if the cache is too large."""
+        entry = self._entry_dir(key)
+        if os.path.exists(entry) or not os.path.exists(output):
+            return
+        if not os.path.exists(self.cache_dir):
+            os.makedirs(self.cache_dir)
+        # Build the entry aside and rename it, so that concurrent tasks never
+        # see a partial entry.
+        tmp_entry = tempfile.mkdtemp(dir=self.cache_dir)
+        try:
+            _copy(output, os.path.join(tmp_entry, _OUTPUT_NAME))
+            if not os.path.exists(os.path.dirname(entry)):
+                os.makedirs(os.path.dirname(entry))
+            os.rename(tmp_entry, entry)
+        except OSError:
+            # Another task stored the same key first.
+            shutil.rmtree(tmp_entry, ignore_errors=True)
+        self.evict()
+
+    def evict(self):
+        """Removes the least recently used entries until the cache fits in
+        max_bytes."""
+        with self._lock:
+            entries = self._list_entries()
+            total = sum(size for (_, size, _) in entries)
+            for (_, size, entry) in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                total -= size
+                self._remove_entry(entry)
+
+    def _list_entries(self):
+        """Returns the (last use, size, path) of every entry."""
+        entries = []
+        for prefix in os.listdir(self.cache_dir):
+            prefix_dir = os.path.join(self.cache_dir, prefix)
+            if len(prefix) != 2 or not os.path.isdir(prefix_dir):
+                continue
+            for name in os.listdir(prefix_dir):
+                entry = os.path.join(prefix_dir, name)
+                try:
+                    entries.append((os.path.getmtime(entry), _size(entry),
+                                    entry))
+                except OSError as e:
+                    # Evicted by another process meanwhile.
+                    if e.errno != errno.ENOENT:
+                        raise
+        return entries
+
+    def _remove_entry(self, entry):
+        # Rename before removing, so that a concurrent restore never copies a
+        # half-removed entry.
+        trash = os.path.join(self.cache_dir, 'trash-' + uuid.uuid4().hex)
+        try:
+            os.rename(entry, trash)
+        except OSError as e:
+            # Evicted by another process meanwhile.
+            if e.errno != errno.ENOENT:
+                raise
+            return
+        shutil.rmtree(trash, ignore_errors=True)
+
+    def _entry_dir(self, key):
+        return os.path.join(self.cache_dir, key[:2], key)
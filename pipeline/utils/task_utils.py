@@ -13,12 +13,116 @@
 # limitations under the License.
 """Utility functions related to tasks"""
 
-import os.path
+import contextlib
+import fcntl
+import hashlib
+import json
+import os
 import re
 import subprocess
 
+# File caching the results of gradle tasks across processes. The cached
+# results are keyed by task name, toolkit path and hash of the build files.
+GRADLE_CACHE_FILE = os.environ.get(
+    'ARTMAN_GRADLE_CACHE',
+    os.path.join(os.path.expanduser('~'), '.cache', 'artman',
+                 'gradle_tasks.json'))
+
+_GRADLE_BUILD_FILES = ['build.gradle', 'settings.gradle', 'gradle.properties']
+
+# Results of gradle tasks run by this process, keyed by task name and path.
+_gradle_task_outputs = {}
+
+
+def gradle_command(toolkit_path, task_name, *args):
+    """Returns the gradlew command line running a toolkit task on the gradle
+    daemon, which stays warm for the following tasks."""
+    return ([os.path.join(toolkit_path, 'gradlew'), '-p', toolkit_path,
+             '--daemon', task_name] + list(args))
+
 
 def run_gradle_task(task_name, task_path):
+    """Runs a gradle task which prints its result, and returns the result.
+
+    The results are kept for the lifetime of the process, and in the
+    GRADLE_CACHE_FILE shared by all processes, so that gradle only starts
+    again once the build files of the toolkit change, or once the cache is
+    cleared with clear_gradle_task_cache.
+    """
+    key = (task_name, os.path.abspath(task_path))
+    if key not in _gradle_task_outputs:
+        _gradle_task_outputs[key] = _cached_gradle_task(task_name, task_path)
+    return _gradle_task_outputs[key]
+
+
+def clear_gradle_task_cache(task_path=None):
+    """Removes the cached gradle task results of the toolkit at task_path, or
+    of all toolkits if task_path is None."""
+    prefix = None
+    if task_path:
+        prefix = os.path.abspath(task_path) + ':'
+    with _locked_gradle_cache() as cache:
+        for key in cache.keys():
+            if prefix is None or key.startswith(prefix):
+                del cache[key]
+    for key in _gradle_task_outputs.keys():
+        if task_path is None or key[1] == os.path.abspath(task_path):
+            del _gradle_task_outputs[key]
+
+
+def _gradle_cache_key(task_name, task_path):
+    digest = hashlib.sha1()
+    for build_file in _GRADLE_BUILD_FILES:
+        path = os.path.join(task_path, build_file)
+        if os.path.isfile(path):
+            with open(path) as f:
+                digest.update(build_file + '\0' + f.read())
+    return '{0}:{1}:{2}'.format(
+        os.path.abspath(task_path), task_name, digest.hexdigest())
+
+
+@contextlib.contextmanager
+def _locked_gradle_cache():
+    """Yields the content of the GRADLE_CACHE_FILE, and writes it back when
+    done, holding a lock which excludes other processes."""
+    cache_dir = os.path.dirname(GRADLE_CACHE_FILE)
+    if not os.path.exists(cache_dir):
+        os.makedirs(cache_dir)
+    with open(GRADLE_CACHE_FILE + '.lock', 'w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        cache = _read_gradle_cache()
+        yield cache
+        tmp_file = GRADLE_CACHE_FILE + '.tmp'
+        with open(tmp_file, 'w') as f:
+            json.dump(cache, f, indent=2, sort_keys=True)
+        os.rename(tmp_file, GRADLE_CACHE_FILE)
+
+
+def _read_gradle_cache():
+    # The file is replaced atomically, so it can be read without the lock.
+    if os.path.isfile(GRADLE_CACHE_FILE):
+        with open(GRADLE_CACHE_FILE) as f:
+            try:
+                return json.load(f)
+            except ValueError:
+                pass
+    return {}
+
+
+def _cached_gradle_task(task_name, task_path):
+    key = _gradle_cache_key(task_name, task_path)
+    output = _read_gradle_cache().get(key)
+    # The results are paths into the gradle caches, which can be removed.
+    if output and os.path.exists(output):
+        return output
+    output = _run_gradle_task(task_name, task_path)
+    if output:
+        with _locked_gradle_cache() as cache:
+            cache[key] = output
+    return output
+
+
+def _run_gradle_task(task_name, task_path):
     output = subprocess.check_output(
         ['./gradlew', task_name], cwd=task_path)
     # It is a convention that gradle task uses 'output: ' as
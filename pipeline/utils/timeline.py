@@ -0,0 +1,154 @@
+# Copyright 2016 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Timing trace of pipeline runs.
+
+A TimelineListener attached to an engine records a span for every task of the
+pipeline, and TaskBase records a span for every command the task runs. The
+commands are recorded in the timelines of the engines running the task
+itself, so that the engines running in one process, e.g. the jobs of a
+conductor or of a batch, do not get the commands of each other's tasks of the
+same name. When the listener is deregistered, the spans are written as a
+Chrome trace file, which can be opened in chrome://tracing or
+https://ui.perfetto.dev.
+"""
+
+import json
+import os
+import threading
+import time
+
+from taskflow import states
+from taskflow.listeners import base
+
+# Timelines of the engines currently running in this process.
+_active = []
+_active_lock = threading.Lock()
+
+_FINISHED_STATES = [states.SUCCESS, states.FAILURE, states.REVERTED]
+
+
+def record_command(task, args, start, end, returncode=0):
+    """Records a command run by task in the timelines running the task."""
+    with _active_lock:
+        timelines = [t for t in _active if t.is_running(task)]
+    for timeline in timelines:
+        timeline.add_command(task.name, args, start, end, returncode)
+
+
+class Timeline(object):
+
+    def __init__(self, name):
+        self.name = name
+        self._lock = threading.Lock()
+        self._events = []
+        self._lanes = {}
+        self._running = {}
+        self._tasks = set()
+
+    def _lane(self, lane_name):
+        """Returns the id of a lane of the trace, creating it if needed."""
+        if lane_name not in self._lanes:
+            lane = len(self._lanes) + 1
+            self._lanes[lane_name] = lane
+            self._events.append({'name': 'thread_name', 'ph': 'M', 'pid': 1,
+                                 'tid': lane, 'args': {'name': lane_name}})
+            self._events.append({'name': 'thread_sort_index', 'ph': 'M',
+                                 'pid': 1, 'tid': lane,
+                                 'args': {'sort_index': lane}})
+        return self._lanes[lane_name]
+
+    def _add_span(self, name, category, lane_name, start, end, args):
+        self._events.append({'name': name, 'cat': category, 'ph': 'X',
+                             'pid': 1, 'tid': self._lane(lane_name),
+                             'ts': int(start * 1e6),
+                             'dur': int((end - start) * 1e6),
+                             'args': args})
+
+    def track(self, tasks):
+        """Adds the tasks of the engine whose timeline this is."""
+        with self._lock:
+            self._tasks.update(tasks)
+
+    def is_running(self, task):
+        with self._lock:
+            return task in self._tasks and task.name in self._running
+
+    def task_started(self, task_name):
+        with self._lock:
+            self._running[task_name] = time.time()
+            self._lane(task_name)
+
+    def task_finished(self, task_name, state):
+        with self._lock:
+            start = self._running.pop(task_name, None)
+            if start is not None:
+                self._add_span(task_name, 'task', task_name, start,
+                               time.time(), {'state': state})
+
+    def add_command(self, task_name, args, start, end, returncode):
+        # Commands run concurrently by a task (see TaskBase.exec_commands)
+        # get one lane per thread, so that their spans do not overlap.
+        lane_name = '{0} ({1})'.format(task_name,
+                                       threading.current_thread().name)
+        with self._lock:
+            self._add_span(os.path.basename(args[0]), 'command', lane_name,
+                           start, end, {'args': ' '.join(args),
+                                        'returncode': returncode})
+
+    def write(self, path):
+        with self._lock:
+            trace = {'traceEvents': list(self._events),
+                     'displayTimeUnit': 'ms',
+                     'otherData': {'pipeline': self.name}}
+        trace_dir = os.path.dirname(path)
+        if trace_dir and not os.path.exists(trace_dir):
+            os.makedirs(trace_dir)
+        with open(path, 'w') as f:
+            json.dump(trace, f)
+
+
+class TimelineListener(base.Listener):
+    """Records the timeline of an engine run and writes it to trace_path
+    when deregistered."""
+
+    def __init__(self, engine, trace_path, name=''):
+        super(TimelineListener, self).__init__(engine)
+        self.trace_path = trace_path
+        self.timeline = Timeline(name)
+
+    def _task_receiver(self, state, details):
+        if state == states.RUNNING:
+            self.timeline.task_started(details['task_name'])
+        elif state in _FINISHED_STATES:
+            self.timeline.task_finished(details['task_name'], state)
+
+    def register(self):
+        super(TimelineListener, self).register()
+        # The tasks of the engine are only known once it is compiled.
+        self._engine.compile()
+        graph = self._engine.compilation.execution_graph
+        self.timeline.track(node for (node, data) in
+                            graph.nodes_iter(data=True)
+                            if data.get('kind') == 'task')
+        with _active_lock:
+            _active.append(self.timeline)
+
+    def deregister(self):
+        super(TimelineListener, self).deregister()
+        with _active_lock:
+            if self.timeline in _active:
+                _active.remove(self.timeline)
+        self.timeline.write(self.trace_path)
+        print 'Wrote the pipeline trace to {0}'.format(self.trace_path)
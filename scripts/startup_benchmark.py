@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+
+# Copyright 2016 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Benchmark of the startup time of execute_pipeline.py.
+
+Usage: startup_benchmark.py [-h] [--runs RUNS] [--max_secs MAX_SECS]
+
+Runs `execute_pipeline.py SamplePipeline` several times, and measures the time
+from the start of the process to the start of its first task, i.e. the cost of
+the imports and of the pipeline construction paid by every run. Exits with an
+error if the median time exceeds --max_secs.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+_ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Printed by SampleTask when it starts.
+_FIRST_TASK_OUTPUT = 'Sleep '
+
+
+def time_to_first_task():
+    """Returns the seconds from the start of execute_pipeline.py to the start
+    of its first task."""
+    start = time.time()
+    proc = subprocess.Popen(
+        [sys.executable, '-u', 'execute_pipeline.py',
+         '--pipeline_kwargs', "{'sleep_secs': 0}", 'SamplePipeline'],
+        cwd=_ROOT_DIR, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    elapsed = None
+    for line in iter(proc.stdout.readline, ''):
+        if elapsed is None and line.startswith(_FIRST_TASK_OUTPUT):
+            elapsed = time.time() - start
+    if proc.wait() or elapsed is None:
+        raise RuntimeError('SamplePipeline failed')
+    return elapsed
+
+
+def main(args):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=5,
+                        help='Number of runs to measure')
+    parser.add_argument('--max_secs', type=float, default=None,
+                        help='Maximum median time to first task')
+    flags = parser.parse_args(args=args)
+
+    times = sorted(time_to_first_task() for _ in range(flags.runs))
+    median = times[len(times) / 2]
+    print 'Time to first task over %d runs: min %.3fs, median %.3fs, ' \
+          'max %.3fs' % (len(times), times[0], median, times[-1])
+    if flags.max_secs is not None and median > flags.max_secs:
+        print 'Median time to first task exceeds %.3fs' % flags.max_secs
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
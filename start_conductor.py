@@ -24,13 +24,17 @@ from pipeline.conductors import gapic_conductor
 
 
 def main():
-  jobboard_name = _parse_args()
-  gapic_conductor.run(jobboard_name)
+  flags = _parse_args()
+  gapic_conductor.run(flags.jobboard_name.lower(),
+                      trace_dir=flags.trace_dir, max_jobs=flags.max_jobs,
+                      warm_up=not flags.skip_warmup,
+                      install_requirements=flags.install_requirements,
+                      pipeline_names=flags.pipelines,
+                      strict_requirements=flags.strict_requirements)
 
 def _parse_args():
   parser = _CreateArgumentParser()
-  flags = parser.parse_args()
-  return flags.jobboard_name.lower()
+  return parser.parse_args()
 
 def _CreateArgumentParser():
   parser = argparse.ArgumentParser()
@@ -39,6 +43,39 @@ def _CreateArgumentParser():
       type=str,
       default="remote",
       help="The name of the jobboard to monitor.")
+  parser.add_argument(
+      "--trace_dir",
+      type=str,
+      default=None,
+      help="Directory to write the timing trace of every job to.")
+  parser.add_argument(
+      "--max_jobs",
+      type=int,
+      default=1,
+      help="Maximum number of jobs the conductor runs concurrently. The "
+           "conductor stops claiming jobs while it runs that many.")
+  parser.add_argument(
+      "--install_requirements",
+      action="store_true",
+      help="Install the missing task requirements of the pipelines before "
+           "claiming jobs.")
+  parser.add_argument(
+      "--skip_warmup",
+      action="store_true",
+      help="Claim jobs without checking the task requirements and priming "
+           "the toolkit and googleapis caches first.")
+  parser.add_argument(
+      "--pipelines",
+      type=lambda names: names.split(","),
+      default=None,
+      help="Comma-separated names of the pipelines posted to the jobboard, "
+           "whose task requirements the warm-up checks. All the registered "
+           "pipelines by default.")
+  parser.add_argument(
+      "--strict_requirements",
+      action="store_true",
+      help="Refuse to start when task requirements of the pipelines are "
+           "still missing after the warm-up, instead of warning about them.")
   return parser
 
 if __name__ == '__main__':
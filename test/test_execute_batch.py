@@ -0,0 +1,99 @@
+# Copyright 2016 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import os
+import mock
+import pytest
+
+import execute_batch
+
+_MANIFEST = """
+- name: python
+  pipeline_name: PythonGapicClientPipeline
+  config: api.yaml:common|python,
+          lang.yaml:default|python
+  pipeline_kwargs: {auto_merge: false}
+- pipeline_name: AllLanguagesGapicClientPipeline
+  languages: java,go
+  engine: parallel
+"""
+
+
+def test_job_args():
+    job = {'pipeline_name': 'SamplePipeline',
+           'pipeline_kwargs': {'sleep_secs': 1},
+           'engine': 'parallel',
+           'workers': 2}
+    assert execute_batch._job_args(job) == [
+        '--pipeline_kwargs', "{'sleep_secs': 1}",
+        '--engine', 'parallel', '--workers', '2', 'SamplePipeline']
+
+
+@mock.patch('execute_pipeline.main')
+def test_batch_report(mock_main, tmpdir):
+    manifest = tmpdir.join('manifest.yaml')
+    manifest.write(_MANIFEST)
+    report = tmpdir.join('report.json')
+    mock_main.side_effect = [None, ValueError('Invalid pipeline')]
+
+    with pytest.raises(SystemExit):
+        execute_batch.main(['--workers', '1', '--report', str(report),
+                            str(manifest)])
+
+    mock_main.assert_any_call([
+        '--pipeline_kwargs', "{'auto_merge': False}",
+        '--config', 'api.yaml:common|python, lang.yaml:default|python',
+        'PythonGapicClientPipeline'])
+    results = json.loads(report.read())
+    assert [(r['name'], r['status']) for r in results] == [
+        ('python', 'SUCCESS'),
+        ('AllLanguagesGapicClientPipeline', 'FAILURE')]
+    assert results[1]['error'] == 'ValueError: Invalid pipeline'
+
+
+@mock.patch('pipeline.utils.path_resolver.which')
+@mock.patch('pipeline.utils.task_utils.run_gradle_task')
+@mock.patch('subprocess.call')
+@mock.patch('subprocess.check_output')
+@mock.patch('os.chdir')
+def test_concurrent_jobs_keep_working_directory(
+        mock_chdir, mock_check_output, mock_call, mock_gradle_task,
+        mock_which, tmpdir):
+    config = ('test/testdata/googleapis_test/gapic/api/'
+              'artman_library.yaml:common|ruby,'
+              'test/testdata/googleapis_test/gapic/lang/'
+              'common.yaml:default|ruby')
+    manifest = tmpdir.join('manifest.yaml')
+    manifest.write(json.dumps([
+        {'pipeline_name': pipeline_name, 'config': config,
+         'reporoot': '.'}
+        for pipeline_name in ['RubyGrpcClientPipeline',
+                              'RubyGapicClientPipeline']]))
+    mock_check_output.return_value = ''
+    mock_call.return_value = 0
+    mock_gradle_task.return_value = 'MOCK_GRADLE_TASK_OUTPUT'
+    mock_which.return_value = None
+
+    execute_batch.main(['--workers', '2', str(manifest)])
+
+    # The jobs share the working directory, so no task may change it.
+    assert not mock_chdir.called
+    rake_dirs = sorted(
+        os.path.abspath(kwargs['cwd'])
+        for (_, args, kwargs) in mock_check_output.mock_calls
+        if args[0] == ['rake', 'build'])
+    output_dir = os.path.abspath('test/testdata/test_output')
+    assert rake_dirs == [os.path.join(output_dir, 'final-ruby'),
+                         os.path.join(output_dir, 'ruby')]
@@ -0,0 +1,49 @@
+# Copyright 2016 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import mock
+import pytest
+
+import execute_pipeline
+from pipeline.utils import blob_store
+
+
+def test_load_local_repo_stays_local(tmpdir, monkeypatch):
+    local_repo = tmpdir.mkdir('local_repo')
+    local_repo.join('a.proto').write('a')
+    monkeypatch.setattr(blob_store, 'LOCAL_STORE', str(tmpdir.join('blobs')))
+    kwargs = execute_pipeline._load_local_repo(str(local_repo), False)
+    assert kwargs['blob_store'] == str(tmpdir.join('blobs'))
+    store = blob_store.get_store(kwargs['blob_store'])
+    assert store.exists(blob_store.content_name(
+        kwargs['files_manifest']['a.proto']))
+
+
+@mock.patch('pipeline.utils.blob_store.upload_tree')
+def test_load_local_repo_remote(mock_upload_tree, tmpdir):
+    kwargs = execute_pipeline._load_local_repo(str(tmpdir), True)
+    assert kwargs['blob_store'] == blob_store.DEFAULT_STORE
+    kwargs = execute_pipeline._load_local_repo(
+        str(tmpdir), False, blob_store='gs://bucket/blobs')
+    assert kwargs['blob_store'] == 'gs://bucket/blobs'
+
+
+def test_load_language_configs_missing_section(tmpdir):
+    config = tmpdir.join('lang.yaml')
+    config.write('default: {}\njava:\n  gapic_language_yaml: java.yaml\n')
+    with pytest.raises(ValueError) as e:
+        execute_pipeline._load_language_configs(
+            str(config) + ':default', ['java', 'go'], {}, {})
+    assert str(e.value) == 'Config %s has no section go' % config
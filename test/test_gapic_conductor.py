@@ -12,13 +12,24 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import os
 import uuid
 from multiprocessing import Process
 import unittest
 
+import mock
+import pytest
+from taskflow.conductors.backends import impl_nonblocking
+from taskflow.persistence import logbook
+
 from pipeline.pipelines import pipeline_factory
 from pipeline.utils import job_util
 from pipeline.conductors import gapic_conductor
+from pipeline.conductors import warmup
+from pipeline.tasks import prerequesites
+from pipeline.tasks.requirements import sample_requirement
+from pipeline.tasks.requirements import task_requirement_base
+from pipeline.utils import timeline
 
 
 class ConductorE2ETest(unittest.TestCase):
@@ -46,4 +57,143 @@ class ConductorE2ETest(unittest.TestCase):
 
 
 def _start_conductor(test_jobboard_name):
-    gapic_conductor.run(test_jobboard_name)
+    # The sample pipeline does not need the requirements of the others.
+    gapic_conductor.run(test_jobboard_name, warm_up=False)
+
+
+class _FakeJob(object):
+
+    def __init__(self, repo_root):
+        flow_detail = logbook.FlowDetail('flow', 'flow-uuid')
+        flow_detail.meta = {'factory': {'kwargs': {'repo_root': repo_root}}}
+        self.book = [flow_detail]
+
+
+def test_concurrent_conductor():
+    cond = gapic_conductor._make_conductor(
+        'conductor', object(), None, max_jobs=4, executor_factory=None)
+    assert isinstance(cond, impl_nonblocking.NonBlockingConductor)
+    assert cond._max_simultaneous_jobs == 4
+
+
+def test_conductor_traces_jobs(tmpdir):
+    cond = gapic_conductor._make_conductor(
+        'conductor', object(), None, max_jobs=1, executor_factory=None,
+        trace_dir=str(tmpdir))
+    job = mock.Mock(uuid='job-uuid')
+    job.name = 'job'
+    listener = cond._listeners_from_job(job, mock.Mock())[-1]
+    assert isinstance(listener, timeline.TimelineListener)
+    assert listener.trace_path == str(tmpdir.join('job-uuid.json'))
+
+
+def test_cleanup_workspace(tmpdir, monkeypatch):
+    monkeypatch.setattr(gapic_conductor, 'WORKSPACE_ROOT', str(tmpdir))
+    workspace = tmpdir.mkdir('pipeline-id')
+    other_dir = tmpdir.mkdir('other')
+    gapic_conductor._cleanup_workspace(
+        'job_abandoned', {'job': _FakeJob(str(workspace))})
+    assert not os.path.exists(str(workspace))
+    # Directories outside of WORKSPACE_ROOT are left alone.
+    monkeypatch.setattr(gapic_conductor, 'WORKSPACE_ROOT', str(workspace))
+    gapic_conductor._cleanup_workspace(
+        'job_consumed', {'job': _FakeJob(str(other_dir))})
+    assert os.path.exists(str(other_dir))
+
+
+class _Requirement(object):
+    installed = False
+    installable = False
+
+    @classmethod
+    def require(cls):
+        return []
+
+    @classmethod
+    def is_installed(cls, locations=None):
+        return cls.installed
+
+    @classmethod
+    def install(cls):
+        if not cls.installable:
+            raise Exception('Cannot install')
+        cls.installed = True
+
+
+class _InstalledRequirement(_Requirement):
+    installed = True
+
+
+class _InstallableRequirement(_Requirement):
+    installable = True
+
+
+def test_pipeline_requirements():
+    assert (sample_requirement.SampleRequirement in
+            warmup.pipeline_requirements())
+    assert warmup.pipeline_requirements(['SamplePipeline']) == [
+        sample_requirement.SampleRequirement]
+
+
+def test_warm_up(monkeypatch):
+    requirements = [_InstalledRequirement, _InstallableRequirement,
+                    _Requirement]
+    monkeypatch.setattr(warmup, 'pipeline_requirements',
+                        lambda names: requirements)
+    primed = []
+    monkeypatch.setattr(warmup, 'prime_toolkit', primed.append)
+    monkeypatch.setattr(warmup.googleapis_cache, 'get_snapshot',
+                        primed.append)
+    assert warmup.check_requirements() == ['_InstallableRequirement',
+                                           '_Requirement']
+    assert warmup.warm_up(install=True, toolkit_path='toolkit',
+                          googleapis_cache_dir='cache') == ['_Requirement']
+    assert primed == ['toolkit', 'cache']
+
+
+class _ToolRequirement(task_requirement_base.TaskRequirementBase):
+
+    @classmethod
+    def require(cls):
+        return ['tool', 'other-tool']
+
+
+class _OtherToolRequirement(task_requirement_base.TaskRequirementBase):
+
+    @classmethod
+    def require(cls):
+        return ['other-tool', 'missing-tool']
+
+
+def test_check_requirements_in_one_batch(monkeypatch):
+    requirements = [_ToolRequirement, _OtherToolRequirement]
+    monkeypatch.setattr(warmup, 'pipeline_requirements',
+                        lambda names: requirements)
+    which_all = mock.Mock(return_value={
+        'tool': '/bin/tool', 'other-tool': '/bin/other-tool',
+        'missing-tool': None})
+    monkeypatch.setattr(warmup.path_resolver, 'which_all', which_all)
+    assert warmup.check_requirements() == ['_OtherToolRequirement']
+    which_all.assert_called_once_with(['missing-tool', 'other-tool', 'tool'])
+
+
+class _ClaimedJobs(Exception):
+    pass
+
+
+def test_conductor_missing_requirements(monkeypatch):
+    warm_up = mock.Mock(return_value=['_Requirement'])
+    monkeypatch.setattr(warmup, 'warm_up', warm_up)
+    backend = mock.Mock(side_effect=_ClaimedJobs)
+    monkeypatch.setattr(gapic_conductor.backend_helper,
+                        'default_persistence_backend', backend)
+    # The missing requirements are only reported by default.
+    with pytest.raises(_ClaimedJobs):
+        gapic_conductor.run('jobboard', pipeline_names=['SamplePipeline'])
+    warm_up.assert_called_once_with(install=False,
+                                    pipeline_names=['SamplePipeline'])
+    backend.reset_mock()
+    with pytest.raises(prerequesites.PrerequesiteError) as e:
+        gapic_conductor.run('jobboard', strict_requirements=True)
+    assert e.value.prerequesite == '_Requirement'
+    assert not backend.called
@@ -0,0 +1,88 @@
+# Copyright 2016 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import json
+import os
+import subprocess
+import tarfile
+
+from pipeline.tasks import io_tasks
+
+
+def _write(path, content):
+    if not os.path.exists(os.path.dirname(path)):
+        os.makedirs(os.path.dirname(path))
+    with open(path, 'w') as f:
+        f.write(content)
+
+
+def test_prepare_upload_dir_outputs_only(tmpdir):
+    repo_root = str(tmpdir.join('repo_root'))
+    output_dir = os.path.join(repo_root, 'artman-genfiles')
+    final_repo_dir = os.path.join(output_dir, 'python')
+    _write(os.path.join(repo_root, 'googleapis', 'google', 'a.proto'), 'a')
+    _write(os.path.join(output_dir, 'python', 'client.py'), 'client')
+    _write(os.path.join(output_dir, 'descriptor.desc'), 'desc')
+    archive = str(tmpdir.join('output.tar.gz'))
+
+    task = io_tasks.PrepareUploadDirTask('PrepareUploadDirTask')
+    task.execute(repo_root, archive, output_dir=output_dir,
+                 final_repo_dir=final_repo_dir)
+
+    with tarfile.open(archive, 'r:gz') as tar:
+        names = sorted(member.name for member in tar.getmembers()
+                       if member.isfile())
+        manifest = json.load(tar.extractfile(
+            io_tasks.PrepareUploadDirTask.MANIFEST_NAME))
+    assert names == [io_tasks.PrepareUploadDirTask.MANIFEST_NAME,
+                     'artman-genfiles/descriptor.desc',
+                     'artman-genfiles/python/client.py']
+    assert [(f['path'], f['size']) for f in manifest['files']] == [
+        ('artman-genfiles/descriptor.desc', 4),
+        ('artman-genfiles/python/client.py', 6)]
+    assert manifest['files'][0]['sha256'] == subprocess.check_output(
+        ['sha256sum', os.path.join(output_dir, 'descriptor.desc')]).split()[0]
+
+
+def test_blob_upload_download_local_store(tmpdir):
+    src_path = str(tmpdir.join('output.tar.gz'))
+    _write(src_path, 'archive')
+    store_url = str(tmpdir.join('store'))
+
+    upload_task = io_tasks.BlobUploadTask('BlobUploadTask')
+    (bucket, path) = upload_task.execute(
+        'pipeline', src_path, '2016/01/01/output.tar.gz',
+        result_store=store_url)
+    assert (bucket, path) == ('pipeline', '2016/01/01/output.tar.gz')
+
+    output_dir = str(tmpdir.join('artman-remote'))
+    download_task = io_tasks.BlobDownloadTask('BlobDownloadTask')
+    download_task.execute(bucket, path, output_dir, result_store=store_url)
+    assert open(os.path.join(output_dir, path)).read() == 'archive'
+
+
+def test_prepare_upload_dir_in_repo_root(tmpdir):
+    repo_root = str(tmpdir.join('repo_root'))
+    _write(os.path.join(repo_root, 'python', 'client.py'), 'client')
+    archive = os.path.join(repo_root, 'output.tar.gz')
+
+    task = io_tasks.PrepareUploadDirTask('PrepareUploadDirTask')
+    task.execute(repo_root, archive)
+
+    with tarfile.open(archive, 'r:gz') as tar:
+        names = sorted(os.path.normpath(member.name)
+                       for member in tar.getmembers() if member.isfile())
+    assert names == [io_tasks.PrepareUploadDirTask.MANIFEST_NAME,
+                     'python/client.py']
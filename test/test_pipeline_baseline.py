@@ -25,7 +25,8 @@ def get_expected_calls(baseline, binding, stderr=False):
     The expected commandlines are listed in the baseline files located
     under test/testdata, with placeholders of {OUTPUT} for the output dir and
     {CWD} for the current working directory. Those values are supplied from
-    binding parameter.
+    binding parameter. A commandline starting with 'cd <dir> &&' is expected
+    to run in <dir>.
     """
     commands = []
     filename = os.path.join('test', 'testdata', baseline + '.baseline')
@@ -33,17 +34,21 @@ def get_expected_calls(baseline, binding, stderr=False):
         return commands
     with open(filename) as f:
         for line in f:
-            tokens = line.strip().split()
+            tokens = [token.format(**binding) for token in line.split()]
+            kwargs = {}
             if stderr:
-                commands.append(mock.call([
-                    token.format(**binding) for token in tokens], stderr=-2))
-            else:
-                commands.append(mock.call([
-                    token.format(**binding) for token in tokens]))
+                kwargs['stderr'] = -2
+            if tokens[:1] == ['cd'] and tokens[2:3] == ['&&']:
+                kwargs['cwd'] = tokens[1]
+                tokens = tokens[3:]
+            commands.append(mock.call(tokens, **kwargs))
     return commands
 
 
-def check_calls_match(expected_calls, actual_calls):
+def check_calls_match(expected_calls, actual_calls, ordered=True):
+    if not ordered:
+        expected_calls = sorted(expected_calls, key=str)
+        actual_calls = sorted(actual_calls, key=str)
     err_str = 'Mismatch between expected and actual subprocess calls.\r\
         Expected: {}\rActual: {}'
     assert expected_calls == actual_calls, err_str.format(
@@ -60,22 +65,26 @@ def make_fake_python_output(output_dir):
         pass
 
 
+@mock.patch('pipeline.utils.path_resolver.which')
 @mock.patch('pipeline.utils.task_utils.run_gradle_task')
 @mock.patch('subprocess.call')
 @mock.patch('subprocess.check_call')
 @mock.patch('subprocess.check_output')
 @mock.patch('os.chdir')
 def _test_baseline(pipeline_name, config, pipeline_kwargs, baseline,
-                   setup_output, mock_chdir, mock_check_output,
-                   mock_check_call, mock_call, mock_gradle_task):
+                   setup_output, extra_args, ordered, mock_chdir,
+                   mock_check_output, mock_check_call, mock_call,
+                   mock_gradle_task, mock_which):
     reporoot = os.path.abspath('.')
 
     # Execute pipeline args
     args = ['--config', config, '--pipeline_kwargs', pipeline_kwargs,
-            '--reporoot', reporoot, pipeline_name]
+            '--reporoot', reporoot] + extra_args + [pipeline_name]
 
     # Mock output value of gradle tasks
     mock_gradle_task.return_value = 'MOCK_GRADLE_TASK_OUTPUT'
+    # No protoc plugin is installed, so that the plugins are run by name.
+    mock_which.return_value = None
     mock_call.return_value = 0
     mock_check_output.return_value = ''
 
@@ -89,16 +98,21 @@ def _test_baseline(pipeline_name, config, pipeline_kwargs, baseline,
     # Run pipeline
     execute_pipeline.main(args)
 
+    # The working directory is shared by the tasks which run concurrently.
+    assert not mock_chdir.called
+
     # Compare with the expected subprocess calls.
     expected_checked_calls = get_expected_calls(
         baseline, {'CWD': os.getcwd(), 'OUTPUT': output_dir}, True)
-    check_calls_match(expected_checked_calls, mock_check_output.mock_calls)
+    check_calls_match(expected_checked_calls, mock_check_output.mock_calls,
+                      ordered)
 
     # Some tasks can use subprocess.call() instead of check_call(), they are
     # tracked separately.
     expected_subprocess_call = get_expected_calls(
         baseline + '.call', {'CWD': os.getcwd(), 'OUTPUT': output_dir})
-    check_calls_match(expected_subprocess_call, mock_call.mock_calls)
+    check_calls_match(expected_subprocess_call, mock_call.mock_calls,
+                      ordered)
 
 
 python_pub_kwargs = {
@@ -155,6 +169,35 @@ java_pub_kwargs = {
     ])
 def test_generator(pipeline_name, language, extra_kwargs, baseline,
                    setup_output):
+    pipeline_kwargs = str(extra_kwargs)
+    _test_baseline(pipeline_name, _make_config(language), pipeline_kwargs,
+                   baseline, setup_output, [], True)
+
+
+# The baselines of these pipelines do not depend on the order in which
+# independent tasks run, so the parallel engine must reproduce them exactly.
+@pytest.mark.parametrize(
+    'pipeline_name, language, baseline',
+    [
+        ('GoGrpcClientPipeline', 'go', 'go_grpc_client_pipeline'),
+        ('GoGapicClientPipeline', 'go', 'go_gapic_client_pipeline'),
+        ('JavaGapicClientPipeline', 'java', 'java_gapic_client_pipeline'),
+    ])
+def test_parallel_engine(pipeline_name, language, baseline):
+    _test_baseline(pipeline_name, _make_config(language), '{}', baseline,
+                   None, ['--engine', 'parallel', '--workers', '4'], True)
+
+
+# The language branches run in no particular order, even with the serial
+# engine, so the calls are compared regardless of their order.
+@pytest.mark.parametrize('engine', ['serial', 'parallel'])
+def test_all_languages_pipeline(engine):
+    _test_baseline('AllLanguagesGapicClientPipeline', _make_config(None),
+                   '{}', 'all_languages_gapic_client_pipeline', None,
+                   ['--engine', engine, '--languages', 'java,go'], False)
+
+
+def _make_config(language):
     artman_api_yaml = 'test/testdata/googleapis_test/gapic/api/' \
                       'artman_library.yaml:common'
     artman_language_yaml = 'test/testdata/googleapis_test/gapic/lang/' \
@@ -162,8 +205,4 @@ def test_generator(pipeline_name, language, extra_kwargs, baseline,
     if language is not None:
         artman_api_yaml += '|' + language
         artman_language_yaml += '|' + language
-
-    config = ','.join([artman_api_yaml, artman_language_yaml])
-    pipeline_kwargs = str(extra_kwargs)
-    _test_baseline(pipeline_name, config, pipeline_kwargs, baseline,
-                   setup_output)
+    return ','.join([artman_api_yaml, artman_language_yaml])
@@ -0,0 +1,72 @@
+# Copyright 2016 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import importlib
+import os
+
+import pytest
+
+from pipeline.pipelines import code_generation_pipeline
+from pipeline.pipelines import pipeline_base
+from pipeline.pipelines import pipeline_factory
+
+
+def test_pipeline_modules_table():
+    for (name, module) in pipeline_factory._PIPELINE_MODULES.items():
+        importlib.import_module(module)
+        assert pipeline_base.PIPELINES[name].__module__ == module
+
+
+def test_get_pipeline_class():
+    cls = pipeline_factory.get_pipeline_class('SamplePipeline')
+    assert cls.__name__ == 'SamplePipeline'
+    base = pipeline_factory.get_pipeline_class('GapicClientPipelineBase')
+    assert base.__name__ == 'GapicClientPipelineBase'
+    with pytest.raises(ValueError):
+        pipeline_factory.get_pipeline_class('UnknownPipeline')
+
+
+def test_list_pipelines():
+    pipelines = dict(pipeline_factory.list_pipelines())
+    assert pipelines['SamplePipeline'] == ['sleep_secs']
+    assert 'final_repo_dir' in pipelines['JavaGapicClientPipeline']
+    assert 'language' not in pipelines['JavaGapicClientPipeline']
+    assert 'language_kwargs' in pipelines['AllLanguagesGapicClientPipeline']
+
+
+def test_validate_required_kwargs():
+    with pytest.raises(ValueError) as e:
+        pipeline_factory.make_pipeline('SamplePipeline')
+    assert str(e.value) == 'sleep_secs must be provided'
+
+
+def test_remote_archive_in_repo_root():
+    kwargs = code_generation_pipeline._load_remote_parameters(
+        {'repo_root': '/tmp/artman/pipeline-id'})
+    assert kwargs['tarfile'] == kwargs['src_path']
+    assert os.path.dirname(kwargs['tarfile']) == '/tmp/artman/pipeline-id'
+    assert kwargs['dest_path'].endswith(os.path.basename(kwargs['tarfile']))
+
+
+def test_all_languages_distinct_final_repo_dirs():
+    kwargs = dict((arg, 'arg') for arg in [
+        'src_proto_path', 'import_proto_path', 'toolkit_path', 'output_dir',
+        'api_name', 'service_yaml', 'gapic_api_yaml', 'auto_merge',
+        'auto_resolve', 'ignore_base', 'final_repo_dir'])
+    kwargs['language_kwargs'] = {'java': {'gapic_language_yaml': 'java'},
+                                 'go': {'gapic_language_yaml': 'go'}}
+    with pytest.raises(ValueError) as e:
+        pipeline_factory.make_pipeline('AllLanguagesGapicClientPipeline',
+                                       **kwargs)
+    assert str(e.value) == 'Languages go and java share the final_repo_dir arg'
@@ -0,0 +1,89 @@
+# Copyright 2016 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import os
+import shutil
+
+import mock
+
+from pipeline.tasks import protoc_tasks
+
+
+class _FakeProtocTask(protoc_tasks._ProtocCodeGenTaskBase):
+
+    def execute(self):
+        pass
+
+
+def test_incremental_protoc_regenerates_removed_outputs(tmpdir):
+    proto_dir = tmpdir.mkdir('protos')
+    proto = proto_dir.join('a.proto')
+    proto.write('syntax = "proto3";\n')
+    output_dir = str(tmpdir.join('out'))
+    code_root = os.path.join(output_dir, 'gen')
+    runs = tmpdir.join('runs')
+    command = ['sh', '-c', 'echo run >> {0}; touch {1}/a_pb2.py'.format(
+        runs, code_root)]
+    task = _FakeProtocTask('test')
+
+    def run():
+        # Like _prepare_pkg_dir, which creates code_root before protoc runs.
+        if not os.path.exists(code_root):
+            os.makedirs(code_root)
+        task.exec_protoc([(str(proto_dir), [str(proto)], command)],
+                         code_root, [str(proto_dir)], [], output_dir, 1,
+                         True)
+
+    run()
+    run()
+    assert runs.read() == 'run\n'
+
+    shutil.rmtree(code_root)
+    run()
+    assert runs.read() == 'run\nrun\n'
+    assert os.path.exists(os.path.join(code_root, 'a_pb2.py'))
+
+
+@mock.patch('pipeline.utils.task_utils.run_gradle_task')
+def test_grpc_plugin_in_cache_key(mock_gradle, tmpdir, monkeypatch):
+    protobuf_path = tmpdir.mkdir('protobuf')
+    mock_gradle.return_value = str(protobuf_path)
+    src_dir = tmpdir.mkdir('src')
+    src_dir.join('a.proto').write('syntax = "proto3";\n')
+    bin_dir = tmpdir.mkdir('bin')
+    runs = tmpdir.join('runs')
+    for name in ['protoc', 'grpc_python_plugin']:
+        bin_dir.join(name).write(
+            '#!/bin/sh\necho {0} >> {1}\n'.format(name, runs))
+        bin_dir.join(name).chmod(0755)
+    monkeypatch.setenv('PATH', str(bin_dir) + os.pathsep + os.environ['PATH'])
+    task = protoc_tasks.GrpcCodeGenTask(
+        'GrpcCodeGenTask',
+        inject={'task_cache_dir': str(tmpdir.join('cache'))})
+
+    def run():
+        task.execute('python', [str(src_dir)], [], 'toolkit',
+                     str(tmpdir.join('out')), 'api')
+
+    run()
+    run()
+    assert runs.read() == 'protoc\n'
+    # Upgrading the plugin, or the protobuf protos, invalidates the cache.
+    bin_dir.join('grpc_python_plugin').write('#!/bin/sh\n# 2.0\n', 'a')
+    run()
+    assert runs.read() == 'protoc\nprotoc\n'
+    protobuf_path.join('any.proto').write('syntax = "proto3";\n')
+    run()
+    assert runs.read() == 'protoc\nprotoc\nprotoc\n'
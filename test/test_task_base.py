@@ -0,0 +1,88 @@
+# Copyright 2016 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import subprocess
+
+import pytest
+
+from pipeline.tasks import task_base
+
+
+def test_exec_commands_output_order():
+    task = task_base.EmptyTask('test')
+    outputs = task.exec_commands(
+        [['sh', '-c', 'sleep 0.2; echo first'], ['echo', 'second']],
+        max_workers=2)
+    assert outputs == ['first\n', 'second\n']
+
+
+def test_exec_commands_cancels_after_failure(tmpdir):
+    task = task_base.EmptyTask('test')
+    marker = tmpdir.join('marker')
+    with pytest.raises(subprocess.CalledProcessError) as e:
+        task.exec_commands(
+            [['sh', '-c', 'echo failed; exit 3'],
+             ['touch', str(marker)]],
+            max_workers=1)
+    assert e.value.returncode == 3
+    assert e.value.output == 'failed\n'
+    assert not marker.check()
+
+
+def test_exec_command_streaming():
+    task = task_base.EmptyTask(
+        'test', inject={'stream_output': True, 'output_tail_lines': 2})
+    logged = []
+    task.log = logged.append
+    assert task.exec_command(['seq', '5']) == '4\n5\n'
+    assert logged == ['1', '2', '3', '4', '5']
+
+    with pytest.raises(subprocess.CalledProcessError) as e:
+        task.exec_command(['sh', '-c', 'seq 5; exit 1'])
+    assert e.value.output == '4\n5\n'
+
+
+def test_exec_command_quiet():
+    task = task_base.EmptyTask(
+        'test', inject={'stream_output': True, 'output_tail_lines': 2,
+                        'task_verbosity': {'EmptyTask': 'quiet'}})
+    logged = []
+    task.log = logged.append
+    task.exec_command(['seq', '5'])
+    assert logged == []
+
+    # The tail of the output of a failed command is still logged.
+    with pytest.raises(subprocess.CalledProcessError):
+        task.exec_command(['sh', '-c', 'seq 5; exit 1'])
+    assert logged == ['4\n5\n']
+
+
+def test_exec_commands_streaming_order():
+    task = task_base.EmptyTask('test', inject={'stream_output': True})
+    logged = []
+    task.log = logged.append
+    task.exec_commands(
+        [['sh', '-c', 'echo first; sleep 0.2; echo second'],
+         ['seq', '3'],
+         ['sh', '-c', 'sleep 0.1; echo last']],
+        max_workers=3)
+    assert logged == ['first', 'second', '1', '2', '3', 'last']
+
+
+def test_exec_commands_keeps_worker_traceback():
+    task = task_base.EmptyTask('test')
+    with pytest.raises(subprocess.CalledProcessError) as e:
+        task.exec_commands([['false']])
+    # The traceback goes down to the worker thread running the command.
+    assert e.traceback[-1].name == 'check_output'
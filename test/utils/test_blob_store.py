@@ -0,0 +1,148 @@
+# Copyright 2016 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import hashlib
+import os
+import threading
+
+import mock
+import pytest
+
+from pipeline.tasks import io_tasks
+from pipeline.utils import blob_store
+
+
+class _CountingStore(blob_store.LocalBlobStore):
+
+    def __init__(self, root_dir):
+        super(_CountingStore, self).__init__(root_dir)
+        self.uploads = []
+
+    def upload(self, src_path, name):
+        self.uploads.append(name)
+        super(_CountingStore, self).upload(src_path, name)
+
+
+def _write(path, content):
+    if not os.path.exists(os.path.dirname(path)):
+        os.makedirs(os.path.dirname(path))
+    with open(path, 'w') as f:
+        f.write(content)
+
+
+def test_upload_tree_once(tmpdir):
+    local_repo = str(tmpdir.join('local_repo'))
+    _write(os.path.join(local_repo, 'google', 'a.proto'), 'same')
+    _write(os.path.join(local_repo, 'google', 'b.proto'), 'same')
+    _write(os.path.join(local_repo, 'c.yaml'), 'other')
+    store = _CountingStore(str(tmpdir.join('store')))
+
+    manifest = blob_store.upload_tree(store, local_repo)
+    assert sorted(manifest) == ['c.yaml', 'google/a.proto', 'google/b.proto']
+    assert manifest['google/a.proto'] == manifest['google/b.proto']
+    assert len(store.uploads) == 2
+
+    # The contents already stored are not uploaded again.
+    assert blob_store.upload_tree(store, local_repo) == manifest
+    assert len(store.uploads) == 2
+
+
+def test_prepare_googleapis_dir_from_manifest(tmpdir):
+    local_repo = str(tmpdir.join('local_repo'))
+    _write(os.path.join(local_repo, 'google', 'api', 'http.proto'), 'private')
+    store_url = 'file://' + str(tmpdir.join('store'))
+    manifest = blob_store.upload_tree(blob_store.get_store(store_url),
+                                      local_repo)
+    googleapis = str(tmpdir.join('googleapis'))
+    _write(os.path.join(googleapis, 'google', 'api', 'http.proto'), 'public')
+
+    task = io_tasks.PrepareGoogleapisDirTask('PrepareGoogleapisDirTask')
+    repo_dir = task.execute(
+        str(tmpdir.join('job')), googleapis_source=googleapis,
+        files_manifest=manifest, blob_store=store_url)
+    assert open(os.path.join(
+        repo_dir, 'google', 'api', 'http.proto')).read() == 'private'
+
+
+def test_download_tree_checks_hash(tmpdir):
+    store = blob_store.LocalBlobStore(str(tmpdir.join('store')))
+    _write(str(tmpdir.join('store', 'sha256', '0' * 64)), 'corrupted')
+    dest_dir = str(tmpdir.mkdir('dest'))
+    with pytest.raises(IOError):
+        blob_store.download_tree(store, {'a.proto': '0' * 64}, dest_dir)
+    assert os.listdir(dest_dir) == []
+
+
+def test_upload_download_file_in_parts(tmpdir):
+    src_path = str(tmpdir.join('output.tar.gz'))
+    _write(src_path, 'abcdabcdxy')
+    store = _CountingStore(str(tmpdir.join('store')))
+
+    blob_store.upload_file(store, src_path, 'results/output.tar.gz',
+                           chunk_size=4)
+    # The parts are stored by content, once, next to the index.
+    store_parts_dir = str(
+        tmpdir.join('store', 'results', 'output.tar.gz.parts'))
+    assert sorted(os.listdir(store_parts_dir)) == sorted(
+        [hashlib.sha256('abcd').hexdigest(), hashlib.sha256('xy').hexdigest()])
+
+    # A download resumes from the valid parts already downloaded.
+    dest_path = str(tmpdir.join('dest', 'output.tar.gz'))
+    parts_dir = dest_path + '.parts'
+    for name in os.listdir(store_parts_dir):
+        _write(os.path.join(parts_dir, name), 'corrupted')
+    blob_store.download_file(store, 'results/output.tar.gz', dest_path)
+    assert open(dest_path).read() == 'abcdabcdxy'
+    assert not os.path.exists(parts_dir)
+
+    # Deleting the file removes its parts too.
+    blob_store.delete_file(store, 'results/output.tar.gz')
+    assert not store.exists('results/output.tar.gz')
+    assert os.listdir(store_parts_dir) == []
+
+
+def test_open_file(tmpdir):
+    src_path = str(tmpdir.join('output.tar.gz'))
+    _write(src_path, 'abcdefghij')
+    store = blob_store.LocalBlobStore(str(tmpdir.join('store')))
+    blob_store.upload_file(store, src_path, 'output.tar.gz', chunk_size=3)
+
+    reader = blob_store.open_file(store, 'output.tar.gz', workers=2)
+    try:
+        assert reader.read(2) == 'ab'
+        assert reader.read(5) == 'cdefg'
+        assert reader.read() == 'hij'
+        assert reader.read(1) == ''
+    finally:
+        reader.close()
+
+
+def test_gcs_store_client_per_thread(monkeypatch):
+    from gcloud import storage
+    clients = []
+
+    def make_client():
+        clients.append(mock.Mock())
+        return clients[-1]
+    monkeypatch.setattr(storage, 'Client', make_client)
+    store = blob_store.GcsBlobStore('bucket', 'blobs')
+    store.exists('a')
+    store.exists('b')
+    thread = threading.Thread(target=store.exists, args=('c',))
+    thread.start()
+    thread.join()
+    assert len(clients) == 2
+    clients[0].get_bucket.return_value.blob.assert_called_with('blobs/b')
+    clients[1].get_bucket.return_value.blob.assert_called_with('blobs/c')
@@ -0,0 +1,36 @@
+# Copyright 2016 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from pipeline.utils import command_util
+
+
+def test_run_command():
+    output, returncode, usage = command_util.run_command(
+        ['sh', '-c', 'echo out; echo err >&2; exit 3'])
+    assert output == 'out\nerr\n'
+    assert returncode == 3
+    assert usage['returncode'] == 3
+    assert usage['output_bytes'] == 8
+    assert usage['max_rss_kb'] > 0
+
+
+def test_run_command_streaming():
+    lines = []
+    output, returncode, usage = command_util.run_command(
+        ['seq', '1000'], lines.append, 3)
+    assert lines == [str(i) for i in range(1, 1001)]
+    assert output == '998\n999\n1000\n'
+    assert returncode == 0
+    assert usage['output_bytes'] == len(''.join(
+        str(i) + '\n' for i in range(1, 1001)))
@@ -0,0 +1,129 @@
+# Copyright 2016 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import base64
+import os
+import zipfile
+
+from pipeline.tasks import io_tasks
+from pipeline.utils import googleapis_cache
+
+
+def _make_archive(path, content):
+    with zipfile.ZipFile(path, 'w') as zip_file:
+        zip_file.writestr('googleapis-master/google/api/http.proto', content)
+
+
+def test_get_snapshot(tmpdir):
+    archive = str(tmpdir.join('master.zip'))
+    cache_dir = str(tmpdir.join('cache'))
+    _make_archive(archive, 'v1')
+
+    snapshot = googleapis_cache.get_snapshot(cache_dir, archive)
+    proto = os.path.join(snapshot, 'google', 'api', 'http.proto')
+    assert open(proto).read() == 'v1'
+
+    # A new revision is only picked up once the refresh interval passed.
+    _make_archive(archive, 'v2')
+    os.utime(archive, (0, 0))
+    assert googleapis_cache.get_snapshot(cache_dir, archive) == snapshot
+    new_snapshot = googleapis_cache.get_snapshot(cache_dir, archive, 0)
+    assert new_snapshot != snapshot
+    assert open(os.path.join(
+        new_snapshot, 'google', 'api', 'http.proto')).read() == 'v2'
+
+
+def test_prepare_googleapis_dir_from_cache(tmpdir):
+    archive = str(tmpdir.join('master.zip'))
+    cache_dir = str(tmpdir.join('cache'))
+    _make_archive(archive, 'public')
+    task = io_tasks.PrepareGoogleapisDirTask('PrepareGoogleapisDirTask')
+
+    for job in ['job1', 'job2']:
+        repo_dir = task.execute(
+            str(tmpdir.join(job)),
+            files_dict={'google/api/http.proto': base64.b64encode(job)},
+            googleapis_source=archive, googleapis_cache_dir=cache_dir,
+            googleapis_hardlink=True)
+        assert repo_dir == str(tmpdir.join(job, 'googleapis'))
+        assert open(os.path.join(
+            repo_dir, 'google', 'api', 'http.proto')).read() == job
+
+    # The overlays of the jobs did not write through into the cache.
+    snapshot = googleapis_cache.get_snapshot(cache_dir, archive)
+    assert open(os.path.join(
+        snapshot, 'google', 'api', 'http.proto')).read() == 'public'
+
+
+def _make_googleapis_archive(path):
+    with zipfile.ZipFile(path, 'w') as zip_file:
+        for (name, content) in [
+                ('google/example/v1/example.proto',
+                 'import "google/api/annotations.proto";'),
+                ('google/example/v1/example.yaml', ''),
+                ('google/api/annotations.proto',
+                 'import public "google/api/http.proto";'),
+                ('google/api/http.proto', ''),
+                ('google/api/unused.proto', ''),
+                ('google/other/v1/other.proto', '')]:
+            zip_file.writestr('googleapis-master/' + name, content)
+
+
+def _list_files(root):
+    return sorted(os.path.relpath(os.path.join(dirpath, name), root)
+                  for (dirpath, _, files) in os.walk(root)
+                  for name in files)
+
+
+def test_sparse_materialization(tmpdir):
+    archive = str(tmpdir.join('master.zip'))
+    _make_googleapis_archive(archive)
+    expected = ['google/api/annotations.proto', 'google/api/http.proto',
+                'google/example/v1/example.proto',
+                'google/example/v1/example.yaml']
+
+    for cache_dir in [None, str(tmpdir.join('cache'))]:
+        repo_root = str(tmpdir.mkdtemp())
+        os.rmdir(repo_root)
+        repo_dir = os.path.join(repo_root, 'googleapis')
+        task = io_tasks.PrepareGoogleapisDirTask('PrepareGoogleapisDirTask')
+        task.execute(
+            repo_root, googleapis_source=archive,
+            googleapis_cache_dir=cache_dir, googleapis_sparse=True,
+            src_proto_path=[os.path.join(repo_dir, 'google/example/v1')],
+            import_proto_path=[repo_dir],
+            service_yaml=[os.path.join(
+                repo_dir, 'google/example/v1/example.yaml')])
+        assert _list_files(repo_dir) == expected
+
+
+def test_sparse_materialization_with_local_repo(tmpdir):
+    archive = str(tmpdir.join('master.zip'))
+    _make_googleapis_archive(archive)
+    repo_root = str(tmpdir.join('job'))
+    repo_dir = os.path.join(repo_root, 'googleapis')
+    task = io_tasks.PrepareGoogleapisDirTask('PrepareGoogleapisDirTask')
+    # The local proto imports a proto which the public one does not.
+    local_proto = base64.b64encode('import "google/api/unused.proto";')
+    task.execute(
+        repo_root,
+        files_dict={'google/example/v1/example.proto': local_proto},
+        googleapis_source=archive, googleapis_sparse=True,
+        src_proto_path=[os.path.join(repo_dir, 'google/example/v1')],
+        import_proto_path=[repo_dir])
+    assert _list_files(repo_dir) == [
+        'google/api/unused.proto', 'google/example/v1/example.proto',
+        'google/example/v1/example.yaml']
+    assert _list_files(repo_root) == [
+        os.path.join('googleapis', name) for name in _list_files(repo_dir)]
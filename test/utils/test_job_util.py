@@ -0,0 +1,151 @@
+# Copyright 2016 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import json
+import threading
+
+import pytest
+from taskflow import exceptions
+from taskflow import states
+from taskflow.persistence import backends as persistence_backends
+
+from pipeline.pipelines import pipeline_factory
+from pipeline.utils import backend_helper, job_util
+
+
+class _FakeClient(object):
+    """Records the watches set on ZooKeeper nodes, and fires them."""
+
+    def __init__(self):
+        self.watches = {}
+        self.started = False
+        self.closed = False
+
+    def start(self):
+        self.started = True
+
+    def stop(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def DataWatch(self, path, func):
+        self.watches.setdefault(path, []).append(func)
+
+    def ChildrenWatch(self, path, func):
+        self.watches.setdefault(path, []).append(func)
+
+    def fire(self, path, *args):
+        for func in list(self.watches.get(path, [])):
+            func(*args)
+
+
+class _FakeJob(object):
+    path = '/jobboard/job-1'
+    lock_path = '/jobboard/job-1.lock'
+    state = states.UNCLAIMED
+
+
+@pytest.fixture
+def client(monkeypatch):
+    client = _FakeClient()
+    monkeypatch.setattr(backend_helper, 'zookeeper_client', lambda: client)
+    return client
+
+
+def test_wait_for_job_progress(client):
+    job = _FakeJob()
+    transitions = []
+
+    def run_job():
+        flow_path = job_util._FLOW_DETAILS_PATH + '/flow-1'
+        atom_path = job_util._ATOM_DETAILS_PATH + '/atom-1'
+        job.state = states.CLAIMED
+        client.fire(job.lock_path, 'owner', None)
+        client.fire(flow_path, ['atom-1'])
+        for state in [states.RUNNING, states.SUCCESS]:
+            client.fire(atom_path, json.dumps(
+                {'atom': {'name': 'SampleTask', 'state': state}}), None)
+        job.state = states.COMPLETE
+        client.fire(job.path, None, None)
+
+    thread = threading.Timer(0.1, run_job)
+    thread.start()
+    job_util.wait_for_job(job, 'flow-1', timeout=10,
+                          progress=lambda *t: transitions.append(t))
+    thread.join()
+    assert transitions == [('SampleTask', states.RUNNING),
+                           ('SampleTask', states.SUCCESS)]
+    assert client.started and client.closed
+
+
+def test_wait_for_job_timeout(client):
+    with pytest.raises(exceptions.JobFailure):
+        job_util.wait_for_job(_FakeJob(), timeout=0.1)
+    assert client.closed
+
+
+class _PostedJob(_FakeJob):
+
+    def __init__(self, name, book):
+        self.uuid = name + '-uuid'
+        self.name = name
+        self.book = book
+        self.state = states.COMPLETE
+
+
+class _PostingJobboard(object):
+
+    def __init__(self):
+        self.connections = 0
+
+    def connect(self):
+        self.connections += 1
+
+    def close(self):
+        pass
+
+    def post(self, name, book=None):
+        return _PostedJob(name, book)
+
+
+def test_job_session_reuses_connections(monkeypatch, client):
+    backends = []
+    jobboards = []
+
+    def persistence_backend():
+        backends.append(persistence_backends.fetch({'connection': 'memory'}))
+        return backends[-1]
+
+    def get_jobboard(name, jobboard_name, persistence=None):
+        assert persistence is backends[0]
+        jobboards.append(_PostingJobboard())
+        return jobboards[-1]
+
+    monkeypatch.setattr(backend_helper, 'default_persistence_backend',
+                        persistence_backend)
+    monkeypatch.setattr(backend_helper, 'get_jobboard', get_jobboard)
+    pipeline = pipeline_factory.make_pipeline('SamplePipeline', True,
+                                              sleep_secs=0)
+    with job_util.JobSession('remote') as session:
+        for _ in range(2):
+            jb = session.post(pipeline)
+            session.wait(jb)
+            assert session.status(jb) == states.COMPLETE
+            task_details, flow_detail = session.result(jb)
+            assert flow_detail.uuid == session._flow_uuids[jb.uuid]
+    assert len(backends) == 1
+    assert len(jobboards) == 1 and jobboards[0].connections == 1
@@ -0,0 +1,72 @@
+# Copyright 2016 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+
+from pipeline.tasks import task_base
+from pipeline.utils import log_sink
+
+
+class _RecordingWriter(object):
+
+    def __init__(self):
+        self.batches = []
+
+    def write(self, logger_name, texts):
+        self.batches.append((logger_name, texts))
+
+
+def test_batching_sink_flush():
+    writer = _RecordingWriter()
+    sink = log_sink.BatchingSink(writer, flush_interval=60)
+    sink.log('pipeline-1', 'first')
+    sink.log('pipeline-1', 'second')
+    sink.log('pipeline-2', 'third')
+    sink.flush()
+    assert sorted(writer.batches) == [('pipeline-1', ['first', 'second']),
+                                      ('pipeline-2', ['third'])]
+    sink.flush()
+    assert len(writer.batches) == 2
+
+
+def test_batching_sink_max_entries():
+    writer = _RecordingWriter()
+    sink = log_sink.BatchingSink(writer, max_entries=2, flush_interval=60)
+    for i in range(4):
+        sink.log('pipeline', str(i))
+    sink.flush()
+    assert [text for (_, texts) in writer.batches for text in texts] == [
+        '0', '1', '2', '3']
+
+
+def test_file_writer(tmpdir):
+    path = str(tmpdir.join('log.jsonl'))
+    sink = log_sink.BatchingSink(log_sink.FileWriter(path))
+    sink.log('pipeline', 'hello')
+    sink.flush()
+    with open(path) as f:
+        assert json.loads(f.readline()) == {'logger': 'pipeline',
+                                            'text': 'hello'}
+
+
+def test_task_flushes_at_end():
+    writer = _RecordingWriter()
+    log_sink.set_sink(log_sink.BatchingSink(writer, flush_interval=60))
+    try:
+        task = task_base.EmptyTask('test', inject={'pipeline_id': 'id'})
+        task.log('message')
+        task.post_execute()
+        assert writer.batches == [('id', ['message'])]
+    finally:
+        log_sink.set_sink(None)
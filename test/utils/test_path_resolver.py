@@ -0,0 +1,59 @@
+# Copyright 2016 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import os
+
+from pipeline.utils import path_resolver
+
+
+def _make_exe(directory, name, mode=0755):
+    path = os.path.join(str(directory), name)
+    with open(path, 'w') as f:
+        f.write('#!/bin/sh\necho "{0} 1.0"\n'.format(name))
+    os.chmod(path, mode)
+    return path
+
+
+def test_which_follows_path_order(tmpdir, monkeypatch):
+    first, second = tmpdir.mkdir('first'), tmpdir.mkdir('second')
+    _make_exe(second, 'tool')
+    expected = _make_exe(first, 'tool')
+    _make_exe(first, 'data', mode=0644)
+    monkeypatch.setenv('PATH', os.pathsep.join([str(first), str(second)]))
+    assert path_resolver.which('tool') == expected
+    assert path_resolver.which('data') is None
+    assert path_resolver.which_all(['tool', 'missing']) == {
+        'tool': expected, 'missing': None}
+
+
+def test_which_rebuilds_index_on_path_change(tmpdir, monkeypatch):
+    first, second = tmpdir.mkdir('first'), tmpdir.mkdir('second')
+    first_tool = _make_exe(first, 'tool')
+    second_tool = _make_exe(second, 'tool')
+    monkeypatch.setenv('PATH', str(first))
+    assert path_resolver.which('tool') == first_tool
+    monkeypatch.setenv('PATH', str(second))
+    assert path_resolver.which('tool') == second_tool
+
+
+def test_which_finds_installed_executable(tmpdir, monkeypatch):
+    bin_dir = tmpdir.mkdir('bin')
+    monkeypatch.setenv('PATH', str(bin_dir))
+    assert path_resolver.which('tool') is None
+    path = _make_exe(bin_dir, 'tool')
+    # Make sure the modification time of the directory changes.
+    stat = os.stat(str(bin_dir))
+    os.utime(str(bin_dir), (stat.st_atime, stat.st_mtime + 1))
+    assert path_resolver.which('tool') == path
@@ -0,0 +1,105 @@
+# Copyright 2016 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import contextlib
+import os
+import StringIO
+import tarfile
+
+from pipeline.tasks import io_tasks
+from pipeline.utils import blob_store, pipeline_util
+
+
+def _write(path, content):
+    if not os.path.exists(os.path.dirname(path)):
+        os.makedirs(os.path.dirname(path))
+    with open(path, 'w') as f:
+        f.write(content)
+
+
+def _upload_results(tmpdir, repo_root, store_url):
+    archive = str(tmpdir.join('output.tar.gz'))
+    io_tasks.PrepareUploadDirTask('PrepareUploadDirTask').execute(
+        repo_root, archive, output_dir=os.path.join(repo_root, 'genfiles'))
+    blob_store.upload_file(blob_store.get_store(store_url), archive,
+                           'output.tar.gz', chunk_size=64)
+
+
+def test_download_results(tmpdir):
+    repo_root = str(tmpdir.join('remote'))
+    _write(os.path.join(repo_root, 'genfiles', 'python', 'a.py'), 'a' * 100)
+    _write(os.path.join(repo_root, 'genfiles', 'python', 'b.py'), 'b')
+    store_url = str(tmpdir.join('store'))
+    output_root = str(tmpdir.join('local'))
+
+    _upload_results(tmpdir, repo_root, store_url)
+    assert pipeline_util.download_results(
+        'pipeline', 'output.tar.gz', output_root, store_url) == (2, 0)
+    assert open(os.path.join(
+        output_root, 'genfiles', 'python', 'a.py')).read() == 'a' * 100
+    assert not os.path.exists(os.path.join(
+        output_root, io_tasks.PrepareUploadDirTask.MANIFEST_NAME))
+    # The archive is removed from the store once extracted.
+    assert not blob_store.get_store(store_url).exists('output.tar.gz')
+
+    # Only the files which changed are written again.
+    _write(os.path.join(repo_root, 'genfiles', 'python', 'b.py'), 'c')
+    _upload_results(tmpdir, repo_root, store_url)
+    assert pipeline_util.download_results(
+        'pipeline', 'output.tar.gz', output_root, store_url) == (1, 1)
+    assert open(os.path.join(
+        output_root, 'genfiles', 'python', 'b.py')).read() == 'c'
+
+
+def _link_member(name, linkname, type=tarfile.SYMTYPE):
+    member = tarfile.TarInfo(name)
+    member.type = type
+    member.linkname = linkname
+    return member
+
+
+def _file_member(name, content):
+    member = tarfile.TarInfo(name)
+    member.size = len(content)
+    return member, StringIO.StringIO(content)
+
+
+def test_extract_results_stays_in_output_dir(tmpdir):
+    output_dir = str(tmpdir.join('local'))
+    outside_dir = str(tmpdir.join('outside'))
+    _write(os.path.join(outside_dir, 'secret'), 'secret')
+    archive = StringIO.StringIO()
+    with contextlib.closing(tarfile.open(fileobj=archive, mode='w:gz')) as tar:
+        tar.addfile(*_file_member('python/a.py', 'a'))
+        tar.addfile(_link_member('python/link.py', 'a.py'))
+        tar.addfile(_link_member('python/hard.py', 'python/a.py',
+                                 tarfile.LNKTYPE))
+        tar.addfile(*_file_member('../escaped', 'x'))
+        tar.addfile(_link_member('up', '../outside'))
+        tar.addfile(_link_member('abs', outside_dir))
+        tar.addfile(_link_member('hard', '../outside/secret',
+                                 tarfile.LNKTYPE))
+        # A link created outside of the archive is not followed either.
+        os.makedirs(output_dir)
+        os.symlink(outside_dir, os.path.join(output_dir, 'planted'))
+        tar.addfile(*_file_member('planted/secret', 'overwritten'))
+    archive.seek(0)
+
+    assert pipeline_util.extract_results(archive, output_dir) == (1, 0)
+    assert os.readlink(os.path.join(output_dir, 'python', 'link.py')) == 'a.py'
+    assert open(os.path.join(output_dir, 'python', 'hard.py')).read() == 'a'
+    assert sorted(os.listdir(output_dir)) == ['planted', 'python']
+    assert sorted(os.listdir(str(tmpdir))) == ['local', 'outside']
+    assert open(os.path.join(outside_dir, 'secret')).read() == 'secret'
@@ -0,0 +1,83 @@
+# Copyright 2016 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+
+from pipeline.utils import proto_index
+
+
+def _write_proto(root, path, imports):
+    full_path = os.path.join(root, path)
+    if not os.path.exists(os.path.dirname(full_path)):
+        os.makedirs(os.path.dirname(full_path))
+    with open(full_path, 'w') as f:
+        f.write('syntax = "proto3";\n')
+        for imp in imports:
+            f.write('import "{0}";\n'.format(imp))
+    return full_path
+
+
+def test_parse_imports():
+    content = ('syntax = "proto3";\n'
+               'import "google/api/annotations.proto";\n'
+               'import public "a/b.proto";\n'
+               '// import "commented.proto";\n')
+    assert proto_index.parse_imports(content) == [
+        'google/api/annotations.proto', 'a/b.proto']
+
+
+def test_closure(tmpdir):
+    root = str(tmpdir)
+    base = _write_proto(root, 'google/base.proto', [])
+    api = _write_proto(root, 'google/api/api.proto', ['google/base.proto'])
+    _write_proto(root, 'google/other/other.proto', [])
+    index = proto_index.ProtoIndex(str(tmpdir.join('out')), [root])
+
+    assert index.closure([api]) == set([api, base])
+
+
+def test_digest_tracks_imports_and_persists(tmpdir):
+    root = str(tmpdir.join('protos'))
+    output_dir = str(tmpdir.join('out'))
+    base = _write_proto(root, 'google/base.proto', [])
+    api = _write_proto(root, 'google/api/api.proto', ['google/base.proto'])
+
+    index = proto_index.ProtoIndex(output_dir, [root])
+    digest = index.closure_digest([api], ['protoc'])
+    index.record('api', digest)
+    index.save()
+
+    index = proto_index.ProtoIndex(output_dir, [root])
+    assert index.is_current('api', index.closure_digest([api], ['protoc']))
+    assert not index.is_current('api', index.closure_digest([api], ['x']))
+
+    with open(base, 'a') as f:
+        f.write('message Base {}\n')
+    index = proto_index.ProtoIndex(output_dir, [root])
+    assert not index.is_current('api',
+                                index.closure_digest([api], ['protoc']))
+
+
+def test_outputs_exist(tmpdir):
+    output_dir = str(tmpdir.join('out'))
+    generated = _write_proto(output_dir, 'gen/api_pb2.py', [])
+    index = proto_index.ProtoIndex(output_dir, [])
+    assert not index.outputs_exist('gen')
+    index.record_outputs('gen', [generated])
+    index.save()
+
+    index = proto_index.ProtoIndex(output_dir, [])
+    assert index.outputs_exist('gen')
+    os.remove(generated)
+    assert not index.outputs_exist('gen')
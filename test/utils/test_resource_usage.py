@@ -0,0 +1,45 @@
+# Copyright 2016 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from pipeline.utils import command_util
+from pipeline.utils import resource_usage
+
+
+def test_resource_report(tmpdir):
+    report_path = str(tmpdir.join('report', 'usage.jsonl'))
+    report = resource_usage.get_report(report_path, 'first')
+    other = resource_usage.get_report(report_path, 'second')
+
+    for (task_name, args) in [('Echo', ['echo', 'hello']),
+                              ('Fail', ['sh', '-c', 'echo failed; exit 3'])]:
+        _, _, usage = command_util.run_command(args)
+        report.record(task_name, args, usage)
+    _, _, usage = command_util.run_command(['echo', 'other'])
+    other.record('Echo', ['echo', 'other'], usage)
+
+    with open(report_path) as f:
+        assert len(f.readlines()) == 3
+    summaries = resource_usage.read_report(report_path)
+    assert sorted(summaries) == ['first', 'second']
+    summary = summaries['first']
+    assert summary['total']['commands'] == 2
+    assert summary['total']['failed'] == 1
+    assert summary['total']['output_bytes'] == 13
+    assert summary['tasks']['Echo']['commands'] == 1
+    assert summary['tasks']['Fail']['failed'] == 1
+    echo = summary['commands'][0]
+    assert echo['command'] == 'echo hello'
+    assert echo['returncode'] == 0
+    assert echo['max_rss_kb'] > 0
+    assert summaries['second']['total']['commands'] == 1
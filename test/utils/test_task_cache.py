@@ -0,0 +1,121 @@
+# Copyright 2016 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import errno
+import os
+import shutil
+
+from pipeline.utils import task_cache
+
+
+def _write(path, content):
+    if not os.path.exists(os.path.dirname(path)):
+        os.makedirs(os.path.dirname(path))
+    with open(path, 'w') as f:
+        f.write(content)
+
+
+def test_key_depends_on_input_content(tmpdir):
+    cache = task_cache.TaskCache(str(tmpdir.join('cache')))
+    proto = str(tmpdir.join('protos', 'a.proto'))
+    _write(proto, 'syntax = "proto3";')
+    key = cache.key('ProtoDescGenTask', [proto], {'api': 'a'}, ['protoc'])
+    assert key == cache.key('ProtoDescGenTask', [proto], {'api': 'a'},
+                            ['protoc'])
+    assert key != cache.key('ProtoDescGenTask', [proto], {'api': 'b'},
+                            ['protoc'])
+    _write(proto, 'syntax = "proto2";')
+    assert key != cache.key('ProtoDescGenTask', [proto], {'api': 'a'},
+                            ['protoc'])
+
+
+def test_save_and_restore_directory(tmpdir):
+    cache = task_cache.TaskCache(str(tmpdir.join('cache')))
+    output = str(tmpdir.join('out'))
+    _write(os.path.join(output, 'pkg', 'a.py'), 'a')
+    assert not cache.restore('abcd', output)
+    cache.save('abcd', output)
+
+    restored = str(tmpdir.join('restored'))
+    assert cache.restore('abcd', restored)
+    with open(os.path.join(restored, 'pkg', 'a.py')) as f:
+        assert f.read() == 'a'
+
+
+def test_evicts_least_recently_used(tmpdir):
+    cache = task_cache.TaskCache(str(tmpdir.join('cache')), max_bytes=15)
+    for key in ['aa01', 'bb02']:
+        output = str(tmpdir.join(key))
+        _write(output, '0123456789')
+        cache.save(key, output)
+    assert not cache.restore('aa01', str(tmpdir.join('restored')))
+    assert cache.restore('bb02', str(tmpdir.join('restored')))
+
+
+def test_restore_replaces_previous_output(tmpdir):
+    cache = task_cache.TaskCache(str(tmpdir.join('cache')))
+    output = str(tmpdir.join('out'))
+    _write(os.path.join(output, 'pkg', 'a.py'), 'a')
+    cache.save('abcd', output)
+    _write(os.path.join(output, 'pkg', 'stale.py'), 'stale')
+
+    assert cache.restore('abcd', output)
+    assert os.listdir(os.path.join(output, 'pkg')) == ['a.py']
+    assert sorted(os.listdir(str(tmpdir))) == ['cache', 'out']
+
+
+def test_evict_skips_entries_evicted_concurrently(tmpdir, monkeypatch):
+    cache = task_cache.TaskCache(str(tmpdir.join('cache')), max_bytes=5)
+    for key in ['aa01', 'bb02']:
+        output = str(tmpdir.join(key))
+        _write(output, '0123456789')
+        cache.save(key, output)
+
+    def evicted_rename(src, dest):
+        # Another process evicts the entry first.
+        shutil.rmtree(src)
+        raise OSError(errno.ENOENT, 'No such file or directory', src)
+
+    monkeypatch.setattr(os, 'rename', evicted_rename)
+    cache.evict()
+    assert not os.path.exists(str(tmpdir.join('cache', 'aa')) + '/aa01')
+
+
+def test_executable_fingerprint(tmpdir, monkeypatch):
+    path = tmpdir.join('tool')
+    path.write('#!/bin/sh\n')
+    path.chmod(0755)
+    monkeypatch.setenv('PATH', str(tmpdir))
+    fingerprint = task_cache.executable_fingerprint('tool')
+    assert fingerprint.startswith('tool:%s:10:' % path)
+    assert task_cache.executable_fingerprint('missing') == 'missing:missing'
+
+
+def test_toolkit_fingerprint_covers_sources(tmpdir):
+    toolkit = tmpdir.mkdir('toolkit')
+    toolkit.join('build.gradle').write('build')
+    source = toolkit.mkdir('src').join('Main.java')
+    source.write('class Main {}')
+    toolkit.mkdir('.git').join('packed-refs').write('abc refs/heads/master')
+    fingerprint = task_cache.toolkit_fingerprint(str(toolkit))
+    assert task_cache.toolkit_fingerprint(str(toolkit)) == fingerprint
+
+    # Build outputs and git metadata are not sources.
+    toolkit.mkdir('build').join('Main.class').write('class')
+    toolkit.join('.git', 'packed-refs').write('def refs/heads/master')
+    assert task_cache.toolkit_fingerprint(str(toolkit)) == fingerprint
+
+    # An uncommitted edit of the sources changes the fingerprint.
+    source.write('class Main { int x; }')
+    assert task_cache.toolkit_fingerprint(str(toolkit)) != fingerprint
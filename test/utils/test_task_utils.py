@@ -0,0 +1,45 @@
+# Copyright 2016 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import mock
+
+from pipeline.utils import task_utils
+
+
+@mock.patch('pipeline.utils.task_utils._run_gradle_task')
+def test_run_gradle_task_is_cached_across_processes(mock_run, tmpdir):
+    toolkit = tmpdir.mkdir('toolkit')
+    toolkit.join('build.gradle').write('apply plugin: "java"')
+    result = str(tmpdir.mkdir('protobuf'))
+    mock_run.return_value = result
+
+    with mock.patch.object(task_utils, 'GRADLE_CACHE_FILE',
+                           str(tmpdir.join('cache', 'gradle.json'))):
+        assert task_utils.run_gradle_task(
+            'showProtobufPath', str(toolkit)) == result
+        # Forget the in-process results, as a new process would.
+        task_utils._gradle_task_outputs.clear()
+        assert task_utils.run_gradle_task(
+            'showProtobufPath', str(toolkit)) == result
+        assert mock_run.call_count == 1
+
+        # Changing the build files invalidates the cached result.
+        task_utils._gradle_task_outputs.clear()
+        toolkit.join('build.gradle').write('apply plugin: "groovy"')
+        task_utils.run_gradle_task('showProtobufPath', str(toolkit))
+        assert mock_run.call_count == 2
+
+        task_utils.clear_gradle_task_cache(str(toolkit))
+        task_utils.run_gradle_task('showProtobufPath', str(toolkit))
+        assert mock_run.call_count == 3
@@ -0,0 +1,102 @@
+# Copyright 2016 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import threading
+
+from taskflow import engines
+from taskflow.patterns import linear_flow
+
+from pipeline.tasks import task_base
+from pipeline.utils import timeline
+
+
+class _EchoTask(task_base.TaskBase):
+
+    def execute(self):
+        self.exec_command(['echo', self.name])
+
+    def validate(self):
+        return []
+
+
+def test_timeline_listener(tmpdir):
+    flow = linear_flow.Flow('test')
+    flow.add(_EchoTask('First'), _EchoTask('Second'))
+    engine = engines.load(flow, engine='serial')
+    trace_path = str(tmpdir.join('trace.json'))
+    with timeline.TimelineListener(engine, trace_path, 'test'):
+        engine.run()
+
+    with open(trace_path) as f:
+        events = json.load(f)['traceEvents']
+    spans = [(e['cat'], e['name']) for e in events if e['ph'] == 'X']
+    assert sorted(spans) == [('command', 'echo'), ('command', 'echo'),
+                             ('task', 'First'), ('task', 'Second')]
+    first = [e for e in events if e['ph'] == 'X' and e['name'] == 'First'][0]
+    command = [e for e in events if e['ph'] == 'X' and
+               e['args'].get('args') == 'echo First'][0]
+    assert first['ts'] <= command['ts']
+    assert command['ts'] + command['dur'] <= first['ts'] + first['dur']
+
+    # Commands run outside of a traced engine are not recorded.
+    timeline.record_command(_EchoTask('First'), ['echo'], 0, 1)
+    assert not timeline._active
+
+
+class _WaitingTask(task_base.TaskBase):
+    """Runs its command once the task of the same name of the other engine
+    is running too."""
+
+    def __init__(self, name, started, other_started):
+        super(_WaitingTask, self).__init__(name)
+        self.started = started
+        self.other_started = other_started
+
+    def execute(self):
+        self.started.set()
+        self.other_started.wait(5)
+        self.exec_command(['echo', str(id(self))])
+
+    def validate(self):
+        return []
+
+
+def test_engines_with_tasks_of_same_name(tmpdir):
+    events = [threading.Event(), threading.Event()]
+    tasks = [_WaitingTask('ProtoDesc', events[0], events[1]),
+             _WaitingTask('ProtoDesc', events[1], events[0])]
+    listeners = []
+    for (i, task) in enumerate(tasks):
+        flow = linear_flow.Flow('test')
+        flow.add(task)
+        engine = engines.load(flow, engine='serial')
+        listeners.append(timeline.TimelineListener(
+            engine, str(tmpdir.join('{0}.json'.format(i)))))
+        listeners[-1].register()
+    threads = [threading.Thread(target=listener._engine.run)
+               for listener in listeners]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for listener in listeners:
+        listener.deregister()
+
+    for (i, task) in enumerate(tasks):
+        with open(str(tmpdir.join('{0}.json'.format(i)))) as f:
+            events = json.load(f)['traceEvents']
+        commands = [e['args']['args'] for e in events
+                    if e.get('cat') == 'command']
+        assert commands == ['echo {0}'.format(id(task))]